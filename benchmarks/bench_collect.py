@@ -0,0 +1,335 @@
+"""Synthetic-fleet benchmark for the collection pipeline, run against moto.
+
+Builds a fleet of EC2 instances, S3 buckets and RDS instances across several mocked accounts and
+regions, runs the full `show_inventory` path against it and records wall time, API call counts, peak
+RSS and cumulative per-stage timings as JSON. Timings are also given relative to a fixed calibration
+workload timed in the same process, and peak RSS relative to the process's size before the fleet is
+built, so runs on different hosts can be compared. With `--baseline`, those relative figures and the
+API call counts are compared with a stored run of the same fleet shape, and the exit status is
+non-zero on a regression. The baseline holds only these host-independent figures.
+
+    python -m benchmarks.bench_collect --accounts 50 --regions 10 --instances 10000 --output results.json
+    python -m benchmarks.bench_collect --baseline benchmarks/baseline.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from unittest.mock import patch
+import boto3
+import yaml
+from moto import mock_aws
+from cloudylist.clients import ClientPool
+from cloudylist.plugins import PluginIndex
+
+ALL_REGIONS = [
+    "us-east-1",
+    "us-west-2",
+    "eu-west-1",
+    "eu-central-1",
+    "ap-southeast-1",
+    "ap-northeast-1",
+    "us-east-2",
+    "us-west-1",
+    "eu-west-2",
+    "ap-south-1",
+    "ca-central-1",
+    "sa-east-1",
+    "eu-north-1",
+    "ap-southeast-2",
+    "ap-northeast-2",
+    "eu-west-3",
+    "ap-northeast-3",
+]
+ROLE_NAME = "BenchmarkRole"
+PLUGINS = {
+    "ec2": "cloudylist.resources.ec2:list_resources",
+    "s3": "cloudylist.resources.s3:list_resources",
+    "rds": "cloudylist.resources.rds:list_resources",
+}
+# Relative slowdown (or growth) tolerated before a metric counts as a regression. Scaling by the
+# calibration run removes most of the difference between hosts, but not all of it: moto and botocore
+# don't speed up exactly like the calibration workload, so leave room for that too.
+DEFAULT_TOLERANCE = 0.25
+# The calibration workload: build and serialize this many records, keeping the fastest of several rounds
+CALIBRATION_RECORDS = 20000
+CALIBRATION_ROUNDS = 5
+
+
+class Recorder:
+    """Thread-safe API call counter and cumulative stage timer."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.api_calls: Counter = Counter()
+        self.stages: Dict[str, float] = {}
+
+    def count_call(self, model: Any = None, **kwargs) -> None:
+        with self._lock:
+            self.api_calls[f"{model.service_model.service_name}.{model.name}"] += 1
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def timed(self, name: str, func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with self.stage(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+
+def timed_plugin(recorder: Recorder, name: str, plugin: Callable) -> Callable:
+    """Time a plugin including consuming its pages, since generator plugins do their work lazily."""
+
+    @wraps(plugin)
+    def wrapper(client):
+        with recorder.stage(f"plugin.{name}"):
+            return list(plugin(client))
+
+    return wrapper
+
+
+def account_ids(count: int) -> List[str]:
+    return [f"{100000000000 + index:012d}" for index in range(count)]
+
+
+def build_fleet(accounts: List[str], regions: List[str], instances: int, buckets: int, databases: int) -> None:
+    """Create the synthetic fleet inside the active moto mock."""
+    sts = boto3.client("sts", region_name=regions[0])
+    for account_id in accounts:
+        credentials = sts.assume_role(RoleArn=f"arn:aws:iam::{account_id}:role/{ROLE_NAME}", RoleSessionName="setup")
+        session = boto3.Session(
+            aws_access_key_id=credentials["Credentials"]["AccessKeyId"],
+            aws_secret_access_key=credentials["Credentials"]["SecretAccessKey"],
+            aws_session_token=credentials["Credentials"]["SessionToken"],
+        )
+        s3 = session.client("s3", region_name="us-east-1")
+        for index in range(buckets):
+            s3.create_bucket(Bucket=f"bench-{account_id}-{index}")
+        for region in regions:
+            if instances:
+                session.client("ec2", region_name=region).run_instances(
+                    ImageId="ami-12345678", MinCount=instances, MaxCount=instances, InstanceType="t3.micro"
+                )
+            rds = session.client("rds", region_name=region)
+            for index in range(databases):
+                rds.create_db_instance(
+                    DBInstanceIdentifier=f"bench-db-{index}",
+                    DBInstanceClass="db.t3.micro",
+                    Engine="mysql",
+                    AllocatedStorage=20,
+                    MasterUsername="admin",
+                    MasterUserPassword="password",
+                )
+
+
+def calibrate() -> float:
+    """Time a fixed pure-Python workload, building, serializing and parsing records like collection does.
+
+    Benchmark timings divided by this are comparable across hosts of different speeds.
+    """
+    best = float("inf")
+    for _ in range(CALIBRATION_ROUNDS):
+        start = time.perf_counter()
+        records = [
+            {"InstanceId": f"i-{index:017x}", "State": ("running", "stopped")[index % 2], "Tags": {"Team": "core"}}
+            for index in range(CALIBRATION_RECORDS)
+        ]
+        parsed = json.loads(json.dumps(records))
+        sorted(parsed, key=lambda record: (record["State"], record["InstanceId"]))
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def run_benchmark(
+    accounts: int = 3,
+    regions: int = 2,
+    instances: int = 100,
+    buckets: int = 5,
+    databases: int = 1,
+    format: str = "json",
+    concurrency: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Build a fleet in moto, run `show_inventory` over it and return the measurements."""
+    from cloudylist import main, utils
+
+    initial_rss = peak_rss_mb()
+    calibration = calibrate()
+    recorder = Recorder()
+    ids = account_ids(accounts)
+    region_names = ALL_REGIONS[:regions]
+    config = {
+        "accounts": [{"account_id": account_id, "role_name": ROLE_NAME} for account_id in ids],
+        "regions": region_names,
+        "concurrency": concurrency or {},
+    }
+    plugins = PluginIndex(PLUGINS)
+    for name in plugins.names():
+        plugins[name]._plugin = timed_plugin(recorder, name, plugins[name].plugin)
+    original_get_client = ClientPool.get_client
+
+    def get_client(self, service, credentials, region):
+        client = original_get_client(self, service, credentials, region)
+        client.meta.events.register("before-call", recorder.count_call, unique_id="benchmark-api-calls")
+        return client
+
+    with (
+        mock_aws(),
+        tempfile.TemporaryDirectory() as workdir,
+        patch.dict(os.environ, {"CLOUDYLIST_CACHE_DIR": workdir, "AWS_DEFAULT_REGION": region_names[0]}),
+    ):
+        with recorder.stage("fleet_setup"):
+            build_fleet(ids, region_names, instances, buckets, databases)
+        config_file = os.path.join(workdir, "config.yml")
+        with open(config_file, "w") as f:
+            yaml.safe_dump(config, f)
+
+        boto3.setup_default_session()
+        boto3.DEFAULT_SESSION.events.register("before-call", recorder.count_call, unique_id="benchmark-api-calls")
+        with (
+            patch.object(ClientPool, "get_client", get_client),
+            patch.object(main, "load_plugins", return_value=plugins),
+            patch.object(utils, "assume_role", recorder.timed("assume_role", utils.assume_role)),
+            patch.object(utils, "get_boto3_client", recorder.timed("get_client", utils.get_boto3_client)),
+            patch.object(main, "stream_inventory", recorder.timed("output", main.stream_inventory)),
+        ):
+            utils.get_client_pool().close()
+            start = time.perf_counter()
+            main.show_inventory(config_file=config_file, format=format, output=os.devnull)
+            wall = time.perf_counter() - start
+        boto3.DEFAULT_SESSION = None
+
+    return {
+        "fleet": {
+            "accounts": accounts,
+            "regions": regions,
+            "instances": instances,
+            "buckets": buckets,
+            "databases": databases,
+            "format": format,
+        },
+        "wall_seconds": round(wall, 4),
+        "api_calls": sum(recorder.api_calls.values()),
+        "api_calls_by_operation": dict(sorted(recorder.api_calls.items())),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "stage_seconds": {name: round(seconds, 4) for name, seconds in sorted(recorder.stages.items())},
+        "calibration_seconds": round(calibration, 4),
+        "relative": {
+            "wall": round(wall / calibration, 2),
+            "peak_rss": round(peak_rss_mb() / initial_rss, 2),
+            "stages": {name: round(seconds / calibration, 2) for name, seconds in sorted(recorder.stages.items())},
+        },
+    }
+
+
+def portable(results: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the figures of a run that hold on any host, for storing as a baseline."""
+    return {key: results[key] for key in ("fleet", "api_calls", "api_calls_by_operation", "relative")}
+
+
+def fleet_key(results: Dict[str, Any]) -> str:
+    fleet = results["fleet"]
+    return "{accounts}x{regions}x{instances}/{buckets}b/{databases}db/{format}".format(**fleet)
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = DEFAULT_TOLERANCE) -> List[str]:
+    """Return a description of each metric that regressed against the baseline, comparing relative figures."""
+    regressions = []
+    for metric in ("wall", "peak_rss"):
+        value, reference = results["relative"][metric], baseline["relative"][metric]
+        if value > reference * (1 + tolerance):
+            regressions.append(f"relative {metric}: {value} vs baseline {reference}")
+    # API calls are deterministic for a fleet shape, so any increase is a regression
+    if results["api_calls"] > baseline["api_calls"]:
+        regressions.append(f"api_calls: {results['api_calls']} vs baseline {baseline['api_calls']}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=3)
+    parser.add_argument("--regions", type=int, default=2, help=f"Up to {len(ALL_REGIONS)}")
+    parser.add_argument("--instances", type=int, default=100, help="EC2 instances per account and region")
+    parser.add_argument("--buckets", type=int, default=5, help="S3 buckets per account")
+    parser.add_argument("--databases", type=int, default=1, help="RDS instances per account and region")
+    parser.add_argument("--format", default="json", help="show_inventory output format")
+    parser.add_argument("--max-workers", type=int, default=None)
+    parser.add_argument("--output", help="Write results JSON here as well as to stdout")
+    parser.add_argument("--baseline", help="Baseline JSON file to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--update-baseline", action="store_true", help="Store these results in --baseline")
+    parser.add_argument("--verbose", action="store_true", help="Keep cloudylist's per-task logging")
+    args = parser.parse_args(argv)
+
+    if not args.verbose:
+        from cloudylist import utils  # noqa: F401 - creates the cloudylist loggers so they can be quietened
+
+        for name in list(logging.root.manager.loggerDict):
+            if name.startswith("cloudylist"):
+                logging.getLogger(name).setLevel(logging.WARNING)
+
+    results = run_benchmark(
+        args.accounts,
+        args.regions,
+        args.instances,
+        args.buckets,
+        args.databases,
+        args.format,
+        {"max_workers": args.max_workers} if args.max_workers else None,
+    )
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if not args.baseline:
+        return 0
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+    key = fleet_key(results)
+    if args.update_baseline:
+        baselines[key] = portable(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        return 0
+    if key not in baselines:
+        print(f"No baseline for fleet {key}", file=sys.stderr)
+        return 0
+    regressions = compare(results, baselines[key], args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
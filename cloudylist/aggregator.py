@@ -0,0 +1,138 @@
+import json
+from typing import Any, Dict, List, Optional, Tuple
+from cloudylist.log import get_logger
+from cloudylist.resources import GLOBAL, PARTITIONED, REGIONAL, ResourceQuery, get_aggregated, get_scope
+
+logger = get_logger(__name__)
+
+# Collection backends the `backend` config section can select
+DIRECT = "direct"  # every plugin calls its own API in every account and region (the default)
+CONFIG_AGGREGATOR = "config_aggregator"  # plugins with an AWS Config mapping are read from an aggregator
+BACKENDS = (DIRECT, CONFIG_AGGREGATOR)
+# SelectAggregateResourceConfig returns at most 100 results a page
+DEFAULT_PAGE_SIZE = 100
+# Longer expressions are rejected, so big account lists are filtered here instead of in the query
+MAX_EXPRESSION_LENGTH = 4096
+# Selected for every resource type; mappings add their own properties
+BASE_FIELDS = ("accountId", "awsRegion", "resourceId", "resourceName", "resourceCreationTime")
+
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def build_expression(resource_type: str, properties: Tuple[str, ...], accounts: List[str], regions: List[str]) -> str:
+    """Build the advanced query selecting one resource type, limited to the accounts and regions given.
+
+    Either list may be empty to select every account or region; the account list is also dropped when it
+    would make the expression too long, leaving `AggregatorBackend.fetch` to filter the results.
+    """
+    fields = ", ".join([*BASE_FIELDS, *properties])
+    conditions = [f"resourceType = {_quote(resource_type)}"]
+    if regions:
+        conditions.append(f"awsRegion IN ({', '.join(map(_quote, regions))})")
+    expression = f"SELECT {fields} WHERE {' AND '.join(conditions)}"
+    if accounts:
+        with_accounts = f"{expression} AND accountId IN ({', '.join(map(_quote, accounts))})"
+        if len(with_accounts) <= MAX_EXPRESSION_LENGTH:
+            return with_accounts
+    return expression
+
+
+class AggregatorBackend:
+    """Collects plugins that declare an AWS Config mapping with one paginated query across the organisation.
+
+    Each plugin's resource type is read from the aggregator named in the `backend` config section, queried
+    in its `region` with ambient credentials or, given `account_id` and `role_name`, by assuming that role.
+    Results are mapped to the plugin's own records, so slices look the same as when the plugin runs directly.
+    """
+
+    def __init__(
+        self,
+        aggregator_name: str,
+        region: str,
+        account_id: Optional[str] = None,
+        role_name: Optional[str] = None,
+        page_size: int = DEFAULT_PAGE_SIZE,
+    ):
+        self.aggregator_name = aggregator_name
+        self.region = region
+        self.account_id = account_id
+        self.role_name = role_name
+        self.page_size = page_size
+
+    def supports(self, plugin: Any, query: Optional[ResourceQuery] = None) -> bool:
+        """Return True if the plugin can be read from the aggregator for this query.
+
+        Filters are applied by the plugins themselves, so filtered runs always call them directly.
+        """
+        return get_aggregated(plugin) is not None and not (query and query.requested())
+
+    def fetch(
+        self,
+        client: Any,
+        plugin: Any,
+        accounts: List[str],
+        regions: List[str],
+        query: Optional[ResourceQuery] = None,
+    ) -> Dict[Tuple[str, str], List[Dict[str, Any]]]:
+        """Return a plugin's records by (account, region), with global and partitioned plugins under "global".
+
+        Regional plugins get an entry, possibly empty, for every account and region given, so a region
+        with nothing in it is reported the same way as when the plugin runs there.
+        """
+        mapping = get_aggregated(plugin)
+        kind = get_scope(plugin)
+        if query and kind == PARTITIONED:
+            # Keep the field the resources are split on until they have been partitioned
+            query = query.including(plugin.partition_key)
+        details = [field for field in mapping.details if query and query.wants(field)]
+        properties = (*mapping.properties, *(mapping.details[field] for field in details))
+        expression = build_expression(mapping.resource_type, properties, accounts, regions if kind == REGIONAL else [])
+        wanted = set(accounts)
+        if kind == REGIONAL:
+            records: Dict[Tuple[str, str], List[Dict[str, Any]]] = {
+                (account, region): [] for account in accounts for region in regions
+            }
+        else:
+            records = {(account, GLOBAL): [] for account in accounts}
+        paginator = client.get_paginator("select_aggregate_resource_config")
+        pages = paginator.paginate(
+            Expression=expression,
+            ConfigurationAggregatorName=self.aggregator_name,
+            PaginationConfig={"PageSize": self.page_size},
+        )
+        for page in pages:
+            for result in page.get("Results", []):
+                item = json.loads(result)
+                if item["accountId"] not in wanted:
+                    continue
+                key = (item["accountId"], item["awsRegion"] if kind == REGIONAL else GLOBAL)
+                if key not in records:
+                    continue
+                record = mapping.to_record(item)
+                for field in mapping.details:
+                    if field not in details:
+                        record.pop(field, None)
+                records[key].append(query.project(record, item) if query else record)
+        return records
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "AggregatorBackend":
+        return cls(
+            config["aggregator_name"],
+            config.get("region", "us-east-1"),
+            config.get("account_id"),
+            config.get("role_name"),
+            int(config.get("page_size", DEFAULT_PAGE_SIZE)),
+        )
+
+
+def configure_backend(config: Optional[Dict[str, Any]]) -> Optional[AggregatorBackend]:
+    """Apply the `backend` config section, returning None when every plugin should be run directly."""
+    kind = (config or {}).get("type", DIRECT)
+    if kind not in BACKENDS:
+        raise ValueError(f"Unknown collection backend: {kind}")
+    if kind == DIRECT:
+        return None
+    return AggregatorBackend.from_config(config)
@@ -0,0 +1,164 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from cloudylist.log import get_logger
+
+logger = get_logger(__name__)
+
+# Defaults for the `clients` section of the config; a run sizes the pool to its workspace instead
+DEFAULT_MAX_CLIENTS = 256
+DEFAULT_MAX_POOL_CONNECTIONS = 10
+
+
+def expected_clients(tasks: int, accounts: int, regions: int) -> int:
+    """Return how many clients a run can use: one per task, and per account one for each region's
+    detail lookups (e.g. the Resource Groups Tagging API) and one for finding its regions.
+    """
+    return tasks + accounts * (regions + 1)
+
+
+def _max_clients(config: Dict[str, Any], expected: Optional[int]) -> int:
+    return int(config.get("max_clients") or expected or DEFAULT_MAX_CLIENTS)
+
+
+class ClientPool:
+    """Reuses boto3 sessions per set of credentials and clients per (session, service, region).
+
+    All sessions share one botocore loader, so each service model is parsed once per process, and
+    each cached client keeps its own keep-alive HTTP connection pool. Once more than `max_clients`
+    clients are cached the least recently used one is dropped; it isn't closed, since another thread
+    may still be using it, and is reclaimed once nothing refers to it.
+
+    Clients are built outside the pool's lock, so different accounts' clients are built in parallel.
+    A lock per set of credentials serializes building from one session, which botocore doesn't
+    support concurrently, and makes sure each client is built only once.
+    """
+
+    def __init__(
+        self, max_clients: int = DEFAULT_MAX_CLIENTS, max_pool_connections: int = DEFAULT_MAX_POOL_CONNECTIONS
+    ):
+        from botocore.config import Config
+        from botocore.loaders import create_loader
+
+        self.max_clients = max_clients
+        self.max_pool_connections = max_pool_connections
+        self.client_config = Config(max_pool_connections=max_pool_connections)
+        self._loader = create_loader()
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, Any] = {}
+        self._building: Dict[str, threading.Lock] = {}
+        self._clients: "OrderedDict[Tuple[str, str, str], Any]" = OrderedDict()
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]], expected: Optional[int] = None) -> "ClientPool":
+        """Build a pool from the `clients` section of the config, holding `expected` clients by default."""
+        config = config or {}
+        return cls(
+            _max_clients(config, expected), int(config.get("max_pool_connections", DEFAULT_MAX_POOL_CONNECTIONS))
+        )
+
+    def _session(self, credentials: Dict[str, str]) -> Any:
+        import boto3
+        import botocore.session
+
+        key = credentials["AccessKeyId"]
+        if key not in self._sessions:
+            core_session = botocore.session.Session()
+            core_session.register_component("data_loader", self._loader)
+            self._sessions[key] = boto3.Session(
+                aws_access_key_id=credentials["AccessKeyId"],
+                aws_secret_access_key=credentials["SecretAccessKey"],
+                aws_session_token=credentials["SessionToken"],
+                botocore_session=core_session,
+            )
+            # boto3.Session appends its data path to the loader each time; keep the shared loader's list flat
+            search_paths = self._loader.search_paths
+            search_paths[:] = list(dict.fromkeys(search_paths))
+        return self._sessions[key]
+
+    def get_client(self, service: str, credentials: Dict[str, str], region: str) -> Any:
+        """Return a cached client for the service and region, creating it on first use."""
+        key = (credentials["AccessKeyId"], service, region)
+        with self._lock:
+            client = self._cached(key)
+            if client is not None:
+                return client
+            building = self._building.setdefault(key[0], threading.Lock())
+        with building:
+            with self._lock:
+                client = self._cached(key)
+                if client is not None:
+                    return client
+                session = self._session(credentials)
+            client = session.client(service, region_name=region, config=self.client_config)
+            with self._lock:
+                self._clients[key] = client
+                while len(self._clients) > self.max_clients:
+                    self._drop(*self._clients.popitem(last=False))
+            return client
+
+    def _cached(self, key: Tuple[str, str, str]) -> Optional[Any]:
+        client = self._clients.get(key)
+        if client is not None:
+            self._clients.move_to_end(key)
+        return client
+
+    def evict(self, access_key_id: str) -> None:
+        """Drop every client and the session created for one set of credentials, once they are being
+        replaced (see `cloudylist.utils.assume_role`). Clients already handed out keep working.
+        """
+        with self._lock:
+            for key in [key for key in self._clients if key[0] == access_key_id]:
+                self._drop(key, self._clients.pop(key))
+            self._sessions.pop(access_key_id, None)
+            self._building.pop(access_key_id, None)
+
+    def close(self) -> None:
+        """Close every cached client and forget every session."""
+        with self._lock:
+            while self._clients:
+                key, client = self._clients.popitem(last=False)
+                client.close()
+                self._drop(key, client)
+            self._sessions.clear()
+            self._building.clear()
+
+    def _drop(self, key: Tuple[str, str, str], client: Any) -> None:
+        logger.debug(f"Dropping {key[1]} client for {key[2]}")
+        if not any(other[0] == key[0] for other in self._clients):
+            self._sessions.pop(key[0], None)
+            self._building.pop(key[0], None)
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+
+_client_pool: Optional[ClientPool] = None
+
+
+def get_client_pool() -> ClientPool:
+    """Return the process-wide client pool used by `get_boto3_client`, creating it on first use."""
+    global _client_pool
+    if _client_pool is None:
+        _client_pool = ClientPool()
+    return _client_pool
+
+
+def configure_client_pool(config: Optional[Dict[str, Any]], expected: Optional[int] = None) -> ClientPool:
+    """Apply the `clients` config section, keeping the current pool if its connection settings match.
+
+    Without `max_clients`, the pool holds `expected` clients (see `expected_clients`), or
+    `DEFAULT_MAX_CLIENTS` when the run's size isn't known.
+    """
+    global _client_pool
+    settings = config or {}
+    max_pool_connections = int(settings.get("max_pool_connections", DEFAULT_MAX_POOL_CONNECTIONS))
+    current = _client_pool
+    if current is not None and current.max_pool_connections == max_pool_connections:
+        # Resizing keeps the cached clients; a smaller pool drops the oldest as new ones are added
+        current.max_clients = _max_clients(settings, expected)
+        return current
+    if current is not None:
+        current.close()
+    _client_pool = ClientPool.from_config(settings, expected)
+    return _client_pool
@@ -0,0 +1,99 @@
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Sequence, Tuple
+
+DEFAULT_MAX_WORKERS = 16
+# How many tasks past the oldest unfinished one may be started, per worker
+DEFAULT_WINDOW_PER_WORKER = 8
+# How worker processes are started when `processes` is set; see `cloudylist.processes`
+DEFAULT_START_METHOD = "spawn"
+
+
+class TaskLimiter:
+    """Per-account and per-region caps applied on top of the worker pool size.
+
+    Only the dispatching thread touches the counters, so no locking is needed.
+    """
+
+    def __init__(self, per_account: Optional[int] = None, per_region: Optional[int] = None):
+        self.per_account = per_account
+        self.per_region = per_region
+        self.accounts: Counter = Counter()
+        self.regions: Counter = Counter()
+
+    def try_acquire(self, account_id: Hashable, region: Hashable) -> bool:
+        """Take an account and a region slot if both are free."""
+        if self.per_account and self.accounts[account_id] >= self.per_account:
+            return False
+        if self.per_region and self.regions[region] >= self.per_region:
+            return False
+        self.accounts[account_id] += 1
+        self.regions[region] += 1
+        return True
+
+    def release(self, account_id: Hashable, region: Hashable) -> None:
+        """Give back the slots taken by `try_acquire`."""
+        self.accounts[account_id] -= 1
+        self.regions[region] -= 1
+
+
+def get_concurrency_settings(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Read the `concurrency` section of the config, filling in defaults."""
+    settings = config.get("concurrency") or {}
+    max_workers = int(settings.get("max_workers") or DEFAULT_MAX_WORKERS)
+    return {
+        "max_workers": max_workers,
+        "per_account": settings.get("per_account"),
+        "per_region": settings.get("per_region"),
+        "window": int(settings.get("window") or max_workers * DEFAULT_WINDOW_PER_WORKER),
+        "processes": int(settings.get("processes") or 0),
+        "start_method": settings.get("start_method") or DEFAULT_START_METHOD,
+    }
+
+
+def ordered_map(
+    func: Callable[..., Any],
+    tasks: Sequence[Tuple[Any, ...]],
+    slots: Sequence[Tuple[Hashable, Hashable]],
+    max_workers: int,
+    limiter: Optional[TaskLimiter] = None,
+    window: Optional[int] = None,
+) -> Iterator[Any]:
+    """Run `func(*task)` for each task on a thread pool, yielding results in task order.
+
+    `slots[i]` is the (account, region) pair task i counts against in `limiter`. Tasks are started
+    out of order when a cap blocks an earlier one, but never more than `window` tasks past the
+    oldest unfinished task, so finished results waiting for their turn stay bounded.
+    """
+    limiter = limiter or TaskLimiter()
+    window = window or max_workers * DEFAULT_WINDOW_PER_WORKER
+    futures: Dict[int, Future] = {}
+    running: Dict[Future, int] = {}
+    waiting: List[int] = []
+    next_in = next_out = 0
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while next_out < len(tasks):
+            while next_in < min(len(tasks), next_out + window):
+                waiting.append(next_in)
+                next_in += 1
+            for index in list(waiting):
+                if len(running) >= max_workers:
+                    break
+                if limiter.try_acquire(*slots[index]):
+                    waiting.remove(index)
+                    futures[index] = executor.submit(func, *tasks[index])
+                    running[futures[index]] = index
+
+            head = futures.get(next_out)
+            if head is not None and head.done():
+                if head in running:
+                    limiter.release(*slots[running.pop(head)])
+                del futures[next_out]
+                next_out += 1
+                yield head.result()
+                continue
+
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                limiter.release(*slots[running.pop(future)])
@@ -0,0 +1,279 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+from cloudylist.log import get_logger
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows has no flock, fall back to the in-process lock only
+    fcntl = None
+
+logger = get_logger(__name__)
+
+# Refresh credentials this many seconds before STS says they expire
+DEFAULT_REFRESH_MARGIN = 300
+# Defaults for the `role_failures` section: skip a failing role for 5 minutes, doubling up to a day
+DEFAULT_BACKOFF = 300
+DEFAULT_MAX_BACKOFF = 86400
+# STS errors that mean the target role can't be assumed, as opposed to the runner's own credentials or
+# network failing; only these put a role into backoff
+ROLE_FAILURE_CODES = ("AccessDenied", "AccessDeniedException")
+
+
+def is_role_failure(error: BaseException) -> bool:
+    """Return True if `error` is STS refusing the target role, e.g. a missing role or a suspended account."""
+    from botocore.exceptions import ClientError
+
+    return isinstance(error, ClientError) and error.response.get("Error", {}).get("Code") in ROLE_FAILURE_CODES
+
+
+@contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    """Hold an advisory lock on `path` while it is read and rewritten, against other threads and processes."""
+    os.makedirs(os.path.dirname(path) or ".", mode=0o700, exist_ok=True)
+    fd = os.open(f"{path}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        if fcntl:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+def replace_file(path: str, content: str) -> None:
+    """Write `content` to a temp file of its own, readable only by its owner, and move it over `path`."""
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path) or ".", prefix=f"{os.path.basename(path)}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class CredentialCache:
+    """Assumed-role credentials keyed by the caller and role ARN, optionally persisted to a private file.
+
+    `caller` identifies the credentials the role was assumed with, so switching profiles or keys never
+    reuses a session another identity obtained. Entries are only cached when STS returned an
+    `Expiration`, and are treated as missing once they are within `refresh_margin` seconds of expiring.
+    When `path` is set the cache is shared between runs through a JSON file readable only by its owner,
+    guarded by an advisory lock.
+    """
+
+    def __init__(self, path: Optional[str] = None, refresh_margin: int = DEFAULT_REFRESH_MARGIN):
+        self.path = os.path.expanduser(path) if path else None
+        self.refresh_margin = timedelta(seconds=refresh_margin)
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]]) -> "CredentialCache":
+        """Build a cache from the `credential_cache` section of the config."""
+        config = config or {}
+        return cls(config.get("path"), int(config.get("refresh_margin", DEFAULT_REFRESH_MARGIN)))
+
+    def _is_fresh(self, credentials: Dict[str, Any]) -> bool:
+        return credentials["Expiration"] - self.refresh_margin > datetime.now(timezone.utc)
+
+    @staticmethod
+    def _key(caller: str, role_arn: str) -> str:
+        return f"{caller} {role_arn}"
+
+    def get(self, caller: str, role_arn: str) -> Optional[Dict[str, Any]]:
+        """Return live credentials `caller` obtained for `role_arn`, or None if they are missing or about to expire."""
+        key = self._key(caller, role_arn)
+        with self._lock:
+            credentials = self._entries.get(key)
+            if credentials and self._is_fresh(credentials):
+                return credentials
+            if self.path:
+                with file_lock(self.path):
+                    self._entries.update(self._read())
+                credentials = self._entries.get(key)
+                if credentials and self._is_fresh(credentials):
+                    return credentials
+        return None
+
+    def pop(self, caller: str, role_arn: str) -> Optional[Dict[str, Any]]:
+        """Forget and return whatever credentials `caller` has cached for `role_arn`, live or not."""
+        with self._lock:
+            return self._entries.pop(self._key(caller, role_arn), None)
+
+    def put(self, caller: str, role_arn: str, credentials: Dict[str, Any]) -> None:
+        """Store credentials STS returned to `caller`; credentials without an `Expiration` are not cached."""
+        if not isinstance(credentials.get("Expiration"), datetime):
+            return
+        key = self._key(caller, role_arn)
+        with self._lock:
+            self._entries[key] = credentials
+            if self.path:
+                with file_lock(self.path):
+                    entries = self._read()
+                    entries[key] = credentials
+                    self._write({key: entry for key, entry in entries.items() if self._is_fresh(entry)})
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            mode = os.stat(self.path).st_mode
+        except FileNotFoundError:
+            return {}
+        if mode & 0o077:
+            logger.warning(f"Ignoring credential cache {self.path}: it is readable by other users")
+            return {}
+        try:
+            with open(self.path, "r") as f:
+                raw = json.load(f)
+            return {
+                key: {**entry, "Expiration": datetime.fromisoformat(entry["Expiration"])} for key, entry in raw.items()
+            }
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable credential cache {self.path}: {e}")
+            return {}
+
+    def _write(self, entries: Dict[str, Dict[str, Any]]) -> None:
+        raw = {key: {**entry, "Expiration": entry["Expiration"].isoformat()} for key, entry in entries.items()}
+        replace_file(self.path, json.dumps(raw))
+
+
+def _role_failure_settings(config: Dict[str, Any]) -> Tuple[Optional[str], int, int]:
+    return (
+        os.path.expanduser(config["path"]) if config.get("path") else None,
+        int(config.get("backoff", DEFAULT_BACKOFF)),
+        int(config.get("max_backoff", DEFAULT_MAX_BACKOFF)),
+    )
+
+
+class RoleFailures:
+    """Roles that recently failed to be assumed, so runs skip them instead of waiting on STS to refuse again.
+
+    After `n` consecutive failures a role is skipped for `backoff * 2 ** (n - 1)` seconds, at most
+    `max_backoff`; a success forgets it. When `path` is set the failures are kept between runs in a
+    JSON file, so suspended or misconfigured accounts cost one attempt per backoff period. Each change
+    is merged into the file's latest contents under its lock, and a file that can't be written is
+    logged and the failures kept in memory, so the cache never fails collection.
+    """
+
+    def __init__(
+        self, path: Optional[str] = None, backoff: int = DEFAULT_BACKOFF, max_backoff: int = DEFAULT_MAX_BACKOFF
+    ):
+        self.path = os.path.expanduser(path) if path else None
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, float]] = self._read()
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "RoleFailures":
+        return cls(*_role_failure_settings(config))
+
+    def settings(self) -> Tuple[Optional[str], int, int]:
+        return (self.path, self.backoff, self.max_backoff)
+
+    def retry_at(self, role_arn: str) -> Optional[float]:
+        """Return when `role_arn` may be tried again, or None if it isn't being skipped."""
+        with self._lock:
+            entry = self._entries.get(role_arn)
+        if entry is None or entry["retry_at"] <= time.time():
+            return None
+        return entry["retry_at"]
+
+    def failed(self, role_arn: str) -> None:
+        def fail(entries: Dict[str, Dict[str, float]]) -> None:
+            failures = entries.get(role_arn, {}).get("failures", 0) + 1
+            delay = min(self.backoff * 2 ** (failures - 1), self.max_backoff)
+            entries[role_arn] = {"failures": failures, "retry_at": time.time() + delay}
+
+        with self._lock:
+            self._update(fail)
+
+    def succeeded(self, role_arn: str) -> None:
+        with self._lock:
+            if role_arn in self._entries:
+                self._update(lambda entries: entries.pop(role_arn, None))
+
+    def _update(self, change: Callable[[Dict[str, Dict[str, float]]], Any]) -> None:
+        """Apply `change` to the entries and, with a `path`, to the file's latest entries under its lock."""
+        change(self._entries)
+        if not self.path:
+            return
+        try:
+            with file_lock(self.path):
+                entries = self._read()
+                change(entries)
+                replace_file(self.path, json.dumps(entries))
+        except OSError as e:
+            logger.warning(f"Could not write role failure cache {self.path}: {e}")
+            return
+        self._entries = entries
+
+    def _read(self) -> Dict[str, Dict[str, float]]:
+        if not self.path:
+            return {}
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable role failure cache {self.path}: {e}")
+            return {}
+
+
+_role_failures: Optional[RoleFailures] = None
+
+
+def get_role_failures() -> Optional[RoleFailures]:
+    """Return the process-wide negative cache of failing roles, or None when roles are always tried."""
+    return _role_failures
+
+
+def set_role_failures(failures: Optional[RoleFailures]) -> None:
+    global _role_failures
+    _role_failures = failures
+
+
+def configure_role_failures(config: Optional[Dict[str, Any]]) -> Optional[RoleFailures]:
+    """Apply the `role_failures` config section, keeping the current cache if its settings match.
+
+    Without the section every role is tried on every run, as before.
+    """
+    if not config:
+        set_role_failures(None)
+        return None
+    current = get_role_failures()
+    if current is None or current.settings() != _role_failure_settings(config):
+        set_role_failures(RoleFailures.from_config(config))
+    return get_role_failures()
+
+
+_credential_cache = CredentialCache()
+
+
+def get_credential_cache() -> CredentialCache:
+    """Return the process-wide credential cache used by `assume_role`."""
+    return _credential_cache
+
+
+def set_credential_cache(cache: CredentialCache) -> None:
+    """Replace the process-wide credential cache, e.g. with one persisted to disk."""
+    global _credential_cache
+    _credential_cache = cache
+
+
+def configure_credential_cache(config: Optional[Dict[str, Any]]) -> CredentialCache:
+    """Apply the `credential_cache` config section, keeping the current cache if its settings match."""
+    cache = CredentialCache.from_config(config)
+    current = get_credential_cache()
+    if (cache.path, cache.refresh_margin) != (current.path, current.refresh_margin):
+        set_credential_cache(cache)
+    return get_credential_cache()
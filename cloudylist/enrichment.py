@@ -0,0 +1,117 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from cloudylist.log import get_logger
+from cloudylist.metrics import get_metrics
+from cloudylist.resources import GLOBAL, Enrichment, ResourceQuery, get_enrichments, get_identity
+
+logger = get_logger(__name__)
+
+# Defaults for the `enrichment` section of the config
+DEFAULT_MAX_WORKERS = 8
+
+# Returns a client for (service, region), paced and instrumented like the plugin's own
+ClientFactory = Callable[[str, str], Any]
+
+
+class Enricher:
+    """Fills in detail fields on collected slices using the batched lookups plugins register with `enrich`.
+
+    Only lookups for `fields` run, and with a query that lists fields, only those it asks for. For each
+    slice's account and region the resources' keys are de-duplicated and split into the lookup's batches,
+    so a region costs a handful of calls however many resources it has. Batches from every task share one
+    pool of `max_workers` threads, which caps the lookups in flight across the whole run. A failed lookup
+    is logged and leaves its field unset; it doesn't fail the slice.
+
+    Plugins whose responses already carry a field, e.g. EC2 instance tags, are asked for it through the
+    query's `details` instead (see `cloudylist.resources.ResourceQuery`), and need no lookup.
+    """
+
+    def __init__(self, fields: Iterable[str], max_workers: int = DEFAULT_MAX_WORKERS):
+        self.fields = set(fields)
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="enrich")
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "Enricher":
+        return cls(config["fields"], int(config.get("max_workers") or DEFAULT_MAX_WORKERS))
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    def wanted(self, query: Optional[ResourceQuery] = None) -> List[str]:
+        """Return the enabled fields a query wants: all of them, or with a field list only those it names."""
+        wanted = self.fields & set(query.fields) if query and query.fields else self.fields
+        return sorted(wanted)
+
+    def enrichments(self, plugin: Any, query: Optional[ResourceQuery] = None) -> List[Enrichment]:
+        """Return the plugin's lookups to run for a query."""
+        wanted = self.wanted(query)
+        return [enrichment for enrichment in get_enrichments(plugin) if enrichment.field in wanted]
+
+    def keys(self, plugin: Any, query: Optional[ResourceQuery] = None) -> List[str]:
+        """Return the resource fields the lookups for a query are keyed on, which collection must keep."""
+        keys = [enrichment.key or get_identity(plugin) for enrichment in self.enrichments(plugin, query)]
+        return [key for key in dict.fromkeys(keys) if key]
+
+    def enrich(
+        self,
+        slices: List[Dict[str, Any]],
+        plugin_name: str,
+        plugin: Any,
+        get_client: ClientFactory,
+        default_region: str,
+        query: Optional[ResourceQuery] = None,
+    ) -> None:
+        """Add the enabled detail fields to one task's slices in place, waiting for every lookup.
+
+        Global slices are looked up through `default_region`, the region their task was queried in.
+        """
+        batches: List[Tuple[Enrichment, Dict[str, List[Dict[str, Any]]], Future]] = []
+        for enrichment in self.enrichments(plugin, query):
+            key_field = enrichment.key or get_identity(plugin)
+            by_region: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+            for item in slices:
+                region = default_region if item["region"] == GLOBAL else item["region"]
+                resources = by_region.setdefault(region, {})
+                for resource in item["resources"]:
+                    if key_field and resource.get(key_field) is not None:
+                        resources.setdefault(str(resource[key_field]), []).append(resource)
+            for region, resources in by_region.items():
+                keys = list(resources)
+                size = enrichment.batch_size or len(keys) or 1
+                for start in range(0, len(keys), size):
+                    batch = {key: resources[key] for key in keys[start : start + size]}
+                    future = self._executor.submit(self._lookup, enrichment, plugin_name, get_client, region, batch)
+                    batches.append((enrichment, batch, future))
+        for enrichment, batch, future in batches:
+            values = future.result()
+            if values is None:
+                continue
+            for key, resources in batch.items():
+                if key in values:
+                    for resource in resources:
+                        resource[enrichment.field] = values[key]
+
+    def _lookup(
+        self,
+        enrichment: Enrichment,
+        plugin_name: str,
+        get_client: ClientFactory,
+        region: str,
+        batch: Dict[str, List[Dict[str, Any]]],
+    ) -> Optional[Dict[str, Any]]:
+        try:
+            with get_metrics().stage("enrich", service=plugin_name, field=enrichment.field):
+                return enrichment.lookup(get_client(enrichment.service or plugin_name, region), list(batch))
+        except Exception as e:
+            logger.warning(
+                f"Error looking up {enrichment.field} for {len(batch)} {plugin_name} resources in {region}: {e}"
+            )
+            return None
+
+
+def configure_enrichment(config: Optional[Dict[str, Any]]) -> Optional[Enricher]:
+    """Build an enricher from the `enrichment` config section, or return None when no fields are enabled."""
+    if not config or not config.get("fields"):
+        return None
+    return Enricher.from_config(config)
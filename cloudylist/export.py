@@ -0,0 +1,182 @@
+import csv
+import json
+import os
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+from cloudylist.log import get_logger
+
+logger = get_logger(__name__)
+
+EXPORT_FORMATS = ("csv", "parquet")
+DEFAULT_BATCH_SIZE = 10000
+# Columns every exported row starts with, ahead of the plugin's own fields
+BASE_COLUMNS = ["account", "region", "service"]
+
+
+def flatten(item: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Turn one inventory slice into one row per resource, tagged with its account, region and service."""
+    for resource in item["resources"]:
+        row = {"account": item["account"], "region": item["region"], "service": item["service"]}
+        for key, value in resource.items():
+            # Nested values don't fit a flat column, so they are stored as JSON text
+            row[key] = json.dumps(value, default=str) if isinstance(value, (dict, list)) else value
+        yield row
+
+
+def _infer_columns(rows: List[Dict[str, Any]]) -> List[str]:
+    columns = list(BASE_COLUMNS)
+    for row in rows:
+        columns.extend(key for key in row if key not in columns)
+    return columns
+
+
+class _TableWriter(ABC):
+    """Buffers one service's rows and writes them in batches; the columns come from the first batch.
+
+    Fields first seen in a later batch have no column to go in, so they are dropped with a warning.
+    """
+
+    extension = ""
+
+    def __init__(self, path: str, batch_size: int):
+        self.path = path
+        self.batch_size = batch_size
+        self.columns: Optional[List[str]] = None
+        self.rows = 0
+        self._batch: List[Dict[str, Any]] = []
+        self._dropped: Set[str] = set()
+
+    def add(self, row: Dict[str, Any]) -> None:
+        self._batch.append(row)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._batch:
+            return
+        if self.columns is None:
+            self.columns = _infer_columns(self._batch)
+            self._open()
+        else:
+            dropped = {key for row in self._batch for key in row if key not in self.columns} - self._dropped
+            if dropped:
+                logger.warning(f"Dropping fields not seen in the first batch written to {self.path}: {sorted(dropped)}")
+                self._dropped |= dropped
+        self._write(self._batch)
+        self.rows += len(self._batch)
+        self._batch = []
+
+    def close(self) -> None:
+        self.flush()
+        if self.columns is not None:
+            self._close()
+
+    @abstractmethod
+    def _open(self) -> None:
+        """Start the file, fixing its columns from `self.columns` and the first batch."""
+
+    @abstractmethod
+    def _write(self, rows: List[Dict[str, Any]]) -> None:
+        """Append a batch of rows."""
+
+    def _close(self) -> None:
+        """Finish the file; only called if anything was written."""
+
+
+class CsvTableWriter(_TableWriter):
+    """Writes one service's rows to a CSV file with a header row, appending each batch."""
+
+    extension = "csv"
+
+    def _open(self) -> None:
+        with open(self.path, "w", newline="") as f:
+            csv.DictWriter(f, fieldnames=self.columns).writeheader()
+
+    def _write(self, rows: List[Dict[str, Any]]) -> None:
+        with open(self.path, "a", newline="") as f:
+            csv.DictWriter(f, fieldnames=self.columns, extrasaction="ignore").writerows(rows)
+
+
+class ParquetTableWriter(_TableWriter):
+    """Writes one service's rows to a Parquet file, one row group per batch. Requires pyarrow.
+
+    Column types are inferred from the first batch, with columns that are empty there typed as strings,
+    and later batches are converted to them. Values that don't fit their column are written as nulls.
+    """
+
+    extension = "parquet"
+
+    def __init__(self, path: str, batch_size: int):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise RuntimeError("Parquet export requires pyarrow: pip install pyarrow") from e
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self._schema = None
+        self._mismatched: Set[str] = set()
+        super().__init__(path, batch_size)
+
+    def _array(self, name: str, values: List[Any], type: Any) -> Any:
+        pa = self._pa
+        if pa.types.is_string(type):
+            values = [value if value is None or isinstance(value, str) else str(value) for value in values]
+        try:
+            return pa.array(values, type=type)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            pass
+        if name not in self._mismatched:
+            logger.warning(f"Writing {name} values that aren't {type} as nulls in {self.path}")
+            self._mismatched.add(name)
+        fitting = []
+        for value in values:
+            try:
+                fitting.append(pa.scalar(value, type=type))
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                fitting.append(pa.scalar(None, type=type))
+        return pa.array(fitting, type=type)
+
+    def _open(self) -> None:
+        pa = self._pa
+        inferred = pa.Table.from_pydict({name: [row.get(name) for row in self._batch] for name in self.columns})
+        # A column with no values yet would be typed null and couldn't hold any later batch's values
+        self._schema = pa.schema(
+            [field.with_type(pa.string()) if pa.types.is_null(field.type) else field for field in inferred.schema]
+        )
+        self._writer = self._pq.ParquetWriter(self.path, self._schema)
+
+    def _write(self, rows: List[Dict[str, Any]]) -> None:
+        arrays = [self._array(field.name, [row.get(field.name) for row in rows], field.type) for field in self._schema]
+        self._writer.write_table(self._pa.Table.from_arrays(arrays, schema=self._schema))
+
+    def _close(self) -> None:
+        self._writer.close()
+
+
+WRITERS = {"csv": CsvTableWriter, "parquet": ParquetTableWriter}
+
+
+def export_inventory(
+    data: Iterable[Dict[str, Any]], output_dir: str, format: str = "csv", batch_size: int = DEFAULT_BATCH_SIZE
+) -> Dict[str, int]:
+    """Export slices as flat rows, one `<service>.<format>` file per service.
+
+    Slices are consumed as they arrive and rows are written in batches of `batch_size`, so memory is
+    bounded by one batch per service. Returns the number of rows written per service.
+    """
+    writer_class = WRITERS[format]
+    os.makedirs(output_dir, exist_ok=True)
+    writers: Dict[str, _TableWriter] = {}
+    try:
+        for item in data:
+            service = item["service"]
+            if service not in writers:
+                path = os.path.join(output_dir, f"{service}.{writer_class.extension}")
+                writers[service] = writer_class(path, batch_size)
+            for row in flatten(item):
+                writers[service].add(row)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return {service: writer.rows for service, writer in writers.items()}
@@ -0,0 +1,250 @@
+import threading
+from array import array
+from collections.abc import Sequence
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+# Marks a field a resource does not have, so records with different fields can share columns
+_MISSING = object()
+# A string column is categorical, i.e. stored as codes into the shared value table, when each value
+# repeats at least this many times on average (states, types, regions); other strings are packed
+CATEGORICAL_REPEATS = 2
+
+
+class _Codes:
+    """A categorical column: one 4-byte code per resource into the inventory's value table."""
+
+    __slots__ = ("codes",)
+
+    def __init__(self, codes: array):
+        self.codes = codes
+
+    def decode(self, table: List[Any]) -> List[Any]:
+        return [table[code] for code in self.codes]
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, _Codes) and self.codes == other.codes
+
+
+class _Packed:
+    """A column of mostly distinct strings (IDs, names) packed into one string with 4-byte offsets."""
+
+    __slots__ = ("text", "offsets")
+
+    def __init__(self, values: List[str]):
+        offsets = array("I", [0])
+        for value in values:
+            offsets.append(offsets[-1] + len(value))
+        self.text = "".join(values)
+        self.offsets = offsets
+
+    def decode(self, table: List[Any]) -> List[str]:
+        text, offsets = self.text, self.offsets
+        return [text[offsets[index] : offsets[index + 1]] for index in range(len(offsets) - 1)]
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, _Packed) and self.text == other.text and self.offsets == other.offsets
+
+
+class _Maps:
+    """A column of string-to-string dicts, e.g. tags, stored as key and value codes into the value table.
+
+    `sizes` holds each resource's number of entries, with `NO_MAP` for a resource without the field.
+    """
+
+    __slots__ = ("sizes", "keys", "values")
+
+    NO_MAP = 0xFFFFFFFF
+
+    def __init__(self, sizes: array, keys: array, values: array):
+        self.sizes = sizes
+        self.keys = keys
+        self.values = values
+
+    def decode(self, table: List[Any]) -> List[Any]:
+        decoded = []
+        start = 0
+        for size in self.sizes:
+            if size == self.NO_MAP:
+                decoded.append(_MISSING)
+                continue
+            end = start + size
+            decoded.append(
+                {table[key]: table[value] for key, value in zip(self.keys[start:end], self.values[start:end])}
+            )
+            start = end
+        return decoded
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, _Maps) and (self.sizes, self.keys, self.values) == (
+            other.sizes,
+            other.keys,
+            other.values,
+        )
+
+
+class _Objects:
+    """A column of values with no compact form, e.g. numbers, nested dicts or raw API fields."""
+
+    __slots__ = ("values",)
+
+    def __init__(self, values: List[Any]):
+        self.values = tuple(values)
+
+    def decode(self, table: List[Any]) -> List[Any]:
+        return list(self.values)
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, _Objects) and self.values == other.values
+
+
+def _is_string_map(value: Any) -> bool:
+    return (
+        type(value) is dict
+        and all(isinstance(key, str) for key in value)
+        and all(isinstance(item, str) for item in value.values())
+    )
+
+
+class _Slice:
+    """One (account, region, service) slice with its resources stored column by column.
+
+    Slices encoded by the same `Inventory` are equal exactly when their slice dicts are.
+    """
+
+    __slots__ = ("account", "region", "service", "fields", "columns", "count")
+
+    def __init__(self, account: str, region: str, service: str, fields: Tuple[str, ...], columns: tuple, count: int):
+        self.account = account
+        self.region = region
+        self.service = service
+        self.fields = fields
+        self.columns = columns
+        self.count = count
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, _Slice) and all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+
+class Inventory(Sequence):
+    """A list of inventory slices held compactly, for inventories too large to keep as plain dicts.
+
+    Each slice's resources are stored as columns: repeated strings (states, types, regions) as codes
+    into a value table shared by every slice, distinct strings (IDs, names) packed into one string per
+    column, string-to-string dicts (tags) as codes for their keys and values, and anything else as a
+    tuple. Account, region and service names are shared the same way.
+    Indexing and iteration rebuild the usual slice dicts on demand, so an `Inventory` can be passed
+    anywhere a list of slices is read. Appending is thread-safe.
+    """
+
+    def __init__(self, slices: Iterable[Dict[str, Any]] = ()):
+        self._lock = threading.Lock()
+        self._table: List[Any] = [_MISSING]
+        self._codes: Dict[Any, int] = {}
+        self._fields: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+        self._slices: List[_Slice] = []
+        self.extend(slices)
+
+    def _code(self, value: Any) -> int:
+        if value is _MISSING:
+            return 0
+        code = self._codes.get(value)
+        if code is None:
+            with self._lock:
+                code = self._codes.get(value)
+                if code is None:
+                    code = self._codes[value] = len(self._table)
+                    self._table.append(value)
+        return code
+
+    def _intern(self, value: str) -> str:
+        return self._table[self._code(value)]
+
+    def _maps(self, values: List[Any]) -> _Maps:
+        sizes, keys, codes = array("I"), array("I"), array("I")
+        for value in values:
+            if value is _MISSING:
+                sizes.append(_Maps.NO_MAP)
+                continue
+            sizes.append(len(value))
+            keys.extend(map(self._code, value))
+            codes.extend(map(self._code, value.values()))
+        return _Maps(sizes, keys, codes)
+
+    def _column(self, values: List[Any]) -> Any:
+        present = [value for value in values if value is not _MISSING]
+        if present and all(_is_string_map(value) for value in present):
+            return self._maps(values)
+        if not all(isinstance(value, str) for value in present):
+            return _Objects(values)
+        if len(values) >= CATEGORICAL_REPEATS * len(set(present)):
+            return _Codes(array("I", map(self._code, values)))
+        if len(present) == len(values):
+            return _Packed(values)
+        return _Objects(values)
+
+    def encode(self, item: Dict[str, Any]) -> _Slice:
+        """Return the compact form of a slice dict, sharing this inventory's value table."""
+        resources = item["resources"]
+        names: Dict[str, None] = {}
+        for resource in resources:
+            names.update(dict.fromkeys(resource))
+        fields = tuple(names)
+        fields = self._fields.setdefault(fields, tuple(map(self._intern, fields)))
+        columns = tuple(self._column([resource.get(field, _MISSING) for resource in resources]) for field in fields)
+        return _Slice(
+            self._intern(item["account"]),
+            self._intern(item["region"]),
+            self._intern(item["service"]),
+            fields,
+            columns,
+            len(resources),
+        )
+
+    def decode(self, compact: _Slice) -> Dict[str, Any]:
+        """Rebuild the slice dict from its compact form."""
+        columns = [column.decode(self._table) for column in compact.columns]
+        resources = []
+        for index in range(compact.count):
+            resources.append(
+                {
+                    field: column[index]
+                    for field, column in zip(compact.fields, columns)
+                    if column[index] is not _MISSING
+                }
+            )
+        return {
+            "account": compact.account,
+            "region": compact.region,
+            "service": compact.service,
+            "resources": resources,
+        }
+
+    def append(self, item: Dict[str, Any]) -> None:
+        self._slices.append(self.encode(item))
+
+    def extend(self, slices: Iterable[Dict[str, Any]]) -> None:
+        for item in slices:
+            self.append(item)
+
+    def resource_count(self) -> int:
+        return sum(compact.count for compact in self._slices)
+
+    def __len__(self) -> int:
+        return len(self._slices)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.decode(compact) for compact in self._slices[index]]
+        return self.decode(self._slices[index])
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for compact in self._slices:
+            yield self.decode(compact)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, (Inventory, list, tuple)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"Inventory({len(self)} slices, {self.resource_count()} resources)"
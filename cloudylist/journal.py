@@ -0,0 +1,111 @@
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+from cloudylist.log import get_logger
+from cloudylist.tracking import DONE, FAILED, SKIPPED, TaskKey, TaskTracker
+
+logger = get_logger(__name__)
+
+# Bump when the journal layout changes; journals from other versions can't be resumed
+JOURNAL_VERSION = 1
+
+
+class JournalError(Exception):
+    """Raised when a journal can't be resumed, e.g. it was written for a different query."""
+
+
+class Checkpoint:
+    """What an interrupted run's journal recorded about each task, for `iter_inventory` to pick up from.
+
+    Resuming replays every task the journal has as done and queries the rest. With `retry_failed`,
+    only the tasks it has as failed are queried again; skipped tasks stay skipped, and tasks the run
+    never reached are left out. Slices are read back from the journal one task at a time.
+    """
+
+    def __init__(self, path: str, outcomes: Dict[TaskKey, Tuple[str, int]], end: int = 0, retry_failed: bool = False):
+        self.path = path
+        self.outcomes = outcomes
+        self.end = end
+        self.retry_failed = retry_failed
+
+    def wanted(self, key: TaskKey) -> bool:
+        """Return True if the task belongs in the resumed run, whether replayed or queried."""
+        return not self.retry_failed or key in self.outcomes
+
+    def replays(self, key: TaskKey) -> bool:
+        """Return True if the task's outcome comes from the journal instead of AWS."""
+        status = self.outcomes.get(key, (None, 0))[0]
+        return status == DONE or (self.retry_failed and status == SKIPPED)
+
+    def replay(self, key: TaskKey) -> Tuple[str, List[Dict[str, Any]]]:
+        """Return a replayed task's status and slices, read from its journal entry."""
+        status, offset = self.outcomes[key]
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return status, json.loads(f.readline())["slices"]
+
+    def failed(self) -> List[TaskKey]:
+        return [key for key, (status, _) in self.outcomes.items() if status == FAILED]
+
+    @classmethod
+    def load(cls, path: str, scope: str, retry_failed: bool = False) -> "Checkpoint":
+        """Read a journal, keeping each task's latest entry. A last line cut short by a crash is ignored."""
+        outcomes: Dict[TaskKey, Tuple[str, int]] = {}
+        with open(path, "rb") as f:
+            header = f.readline()
+            try:
+                header = json.loads(header)
+            except ValueError:
+                raise JournalError(f"{path} is not a cloudylist journal") from None
+            if header.get("version") != JOURNAL_VERSION or header.get("scope") != scope:
+                raise JournalError(f"{path} was written by a run with a different query or version")
+            offset = f.tell()
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logger.warning(f"Ignoring an incomplete entry at the end of {path}")
+                    break
+                outcomes[tuple(entry["key"])] = (entry["status"], offset)
+                offset += len(line)
+        return cls(path, outcomes, offset, retry_failed)
+
+
+class Journal(TaskTracker):
+    """Appends each finished task and its slices to an NDJSON file as the run goes.
+
+    The first line records the run's scope (see `cloudylist.snapshots.query_scope`), so a resume with
+    different filters or fields is refused. Each entry is flushed as soon as it is written, so an
+    interrupted run loses at most the tasks in flight. Resuming appends to the same journal; tasks
+    replayed from it are not written again.
+    """
+
+    def __init__(self, path: str, scope: str, checkpoint: Optional[Checkpoint] = None):
+        self.path = path
+        self.scope = scope
+        self.checkpoint = checkpoint
+        self._file = None
+
+    def start(self, workspace: Dict[str, List[str]], keys: List[TaskKey]) -> None:
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if self.checkpoint is not None:
+            # Drop any entry cut short by the interruption before appending after it
+            os.truncate(self.path, self.checkpoint.end)
+            self._file = open(self.path, "a")  # noqa: SIM115 - written by finished() until close()
+            return
+        self._file = open(self.path, "w")  # noqa: SIM115 - written by finished() until close()
+        self._file.write(json.dumps({"version": JOURNAL_VERSION, "scope": self.scope}) + "\n")
+        self._file.flush()
+
+    def finished(self, key: TaskKey, status: str, slices: Any = None) -> None:
+        if self._file is None or (self.checkpoint is not None and self.checkpoint.replays(key)):
+            return
+        entry = {"key": list(key), "status": status, "slices": slices or []}
+        self._file.write(json.dumps(entry, default=str) + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -1,54 +1,543 @@
+import importlib.util
+import os
+import time
 import typer
 import json
-import yaml
-from rich.console import Console
-from rich.table import Table
-from cloudylist.utils import collect_inventory, load_config
-from stevedore import ExtensionManager
+from typing import Annotated, Any, List, Optional, Sequence
+from cloudylist.export import DEFAULT_BATCH_SIZE, EXPORT_FORMATS, export_inventory
+from cloudylist.inventory import Inventory
+from cloudylist.journal import Checkpoint, Journal, JournalError
+from cloudylist.log import get_logger
+from cloudylist.metrics import METRICS_FORMATS, Metrics, set_metrics, write_metrics
+from cloudylist.output import STREAMING_FORMATS, stream_inventory
+from cloudylist.plugins import get_plugin, load_plugins
+from cloudylist.resources import ResourceQuery, get_identity
+from cloudylist.shard import (
+    ShardManifest,
+    check_shards,
+    manifest_path,
+    merge_inventories,
+    overlapping_tasks,
+    parse_shard,
+)
+from cloudylist.snapshots import SnapshotRecorder, SnapshotStore, configure_snapshots, query_scope
+from cloudylist.summary import DEFAULT_GROUPS, DEFAULT_TOP, InventorySummary, parse_groups
+from cloudylist.utils import iter_inventory, load_config, resolve_accounts
 
+# boto3, rich, yaml and stevedore are imported inside the functions that need them, so `--help` and
+# small runs don't pay for them at startup. tests/test_startup.py guards this.
 app = typer.Typer()
-console = Console()
+logger = get_logger(__name__)
 
 
-def output_table(data):
-    table = Table(title="AWS Multi-Account Inventory")
-    table.add_column("Account", style="cyan", justify="left")
-    table.add_column("Region", style="green", justify="left")
-    table.add_column("Service", style="magenta", justify="left")
-    table.add_column("Resources", justify="left")
-    for item in data:
-        resources_summary = f"{len(item['resources'])} resources"
-        table.add_row(item["account"], item["region"], item["service"], resources_summary)
-    console.print(table)
+_console = None
+
+
+def get_console():
+    """Return the shared rich console, creating it on first use."""
+    global _console
+    if _console is None:
+        from rich.console import Console
+
+        _console = Console()
+    return _console
+
+
+# The live table is redrawn at most this often, however fast slices arrive
+LIVE_REFRESH_SECONDS = 0.25
+
+
+def render_summary(summary: InventorySummary, groups: Sequence[str]):
+    """Build the table view: a progress line and one bounded table per summary group."""
+    from rich.console import Group
+    from rich.progress_bar import ProgressBar
+    from rich.table import Table
+
+    progress = summary.progress()
+    finished = progress["done"] + progress["failed"] + progress["skipped"]
+    status = (
+        f"{finished}/{progress['planned']} tasks, {progress['failed']} failed, {progress['skipped']} skipped, "
+        f"{progress['pending']} pending - {summary.resources} resources in {summary.slices} slices"
+    )
+    header = Table.grid(padding=(0, 1))
+    header.add_row(ProgressBar(total=progress["planned"] or None, completed=finished, width=30), status)
+    parts = [header]
+    for group in groups:
+        rows, others = summary.rows(group)
+        title = f"Largest {summary.top} slices" if group == "top" else f"Resources by {group}"
+        table = Table(title=title, title_justify="left")
+        table.add_column("Slice" if group == "top" else group.capitalize(), style="cyan", justify="left")
+        if group != "top":
+            table.add_column("Slices", justify="right")
+        table.add_column("Resources", justify="right")
+        for name, slices, resources in rows:
+            if group == "top":
+                table.add_row(name, str(resources))
+            else:
+                table.add_row(name, str(slices), str(resources))
+        if others:
+            table.caption = f"{others} more not shown"
+        parts.append(table)
+    return Group(*parts)
+
+
+def output_table(data, summary: InventorySummary, groups: Sequence[str] = DEFAULT_GROUPS):
+    """Summarise slices as they arrive. On a terminal the view updates live; otherwise it prints once at the end."""
+    console = get_console()
+    if not _is_terminal():
+        for item in data:
+            summary.add(item)
+        console.print(render_summary(summary, groups))
+        return
+
+    from rich.live import Live
+
+    with Live(render_summary(summary, groups), console=console, auto_refresh=False) as view:
+        last = time.monotonic()
+        for item in data:
+            summary.add(item)
+            if time.monotonic() - last >= LIVE_REFRESH_SECONDS:
+                view.update(render_summary(summary, groups), refresh=True)
+                last = time.monotonic()
+        view.update(render_summary(summary, groups), refresh=True)
 
 
 def output_json(data):
-    console.print_json(data=json.dumps(data, indent=4))
+    # Serialise slice by slice, so a compact Inventory is never expanded into dicts all at once
+    text = "[" + ",".join(json.dumps(item, default=str) for item in data) + "]"
+    get_console().print_json(text, indent=4)
 
 
 def output_yaml(data):
-    yaml_output = yaml.dump(data, default_flow_style=False, sort_keys=False)
-    console.print(yaml_output)
+    import yaml
+
+    yaml_output = yaml.dump(list(data), default_flow_style=False, sort_keys=False)
+    get_console().print(yaml_output)
+
+
+def _is_terminal() -> bool:
+    return get_console().is_terminal
+
+
+def output_metrics(metrics: Metrics, format: str, path: str = "-"):
+    """Report the run's metrics: a summary table on stderr, or a JSON report / Prometheus textfile."""
+    if format in ("json", "prometheus") and path != "-":
+        write_metrics(metrics, format, path)
+        return
+    if format == "json":
+        get_console().print_json(metrics.to_json())
+        return
+    if format == "prometheus":
+        get_console().out(metrics.to_prometheus(), end="")
+        return
+
+    from rich.console import Console
+    from rich.table import Table
+
+    table = Table(title="Metrics")
+    table.add_column("Kind", style="cyan", justify="left")
+    table.add_column("Name", style="magenta", justify="left")
+    for column in ("Calls", "Errors", "Retries", "Bytes", "Seconds"):
+        table.add_column(column, justify="right")
+    for row in metrics.summary():
+        table.add_row(
+            row["kind"],
+            row["name"],
+            f"{row['calls']:g}",
+            f"{row['errors']:g}",
+            f"{row['retries']:g}",
+            f"{row['bytes']:g}",
+            f"{row['seconds']:.3f}",
+        )
+    # stderr, so the table never mixes into inventory written to stdout
+    Console(stderr=True).print(table)
+
+
+def _check_metrics_format(metrics: str) -> bool:
+    if metrics and metrics not in METRICS_FORMATS:
+        get_console().print(f"[red]Invalid metrics format:[/red] {metrics}", style="bold red")
+        return False
+    return True
+
+
+def _load_checkpoint(journal_path: str, query: ResourceQuery, resume: bool, retry_failed: bool) -> Optional[Checkpoint]:
+    """Return the journal's checkpoint to replay for --resume or --retry-failed, or None to start afresh.
+
+    Raises JournalError if there is no journal to read or it doesn't match the query.
+    """
+    if not (resume or retry_failed):
+        return None
+    if not journal_path:
+        raise JournalError("--resume and --retry-failed need --journal or `journal.path`")
+    if not os.path.exists(journal_path):
+        if retry_failed:
+            raise JournalError(f"No journal to retry at {journal_path}")
+        return None
+    checkpoint = Checkpoint.load(journal_path, query_scope(query), retry_failed)
+    logger.info(
+        f"Resuming from {journal_path}: {len(checkpoint.outcomes)} tasks recorded, {len(checkpoint.failed())} failed"
+    )
+    return checkpoint
+
+
+def _snapshot_recorder(store: SnapshotStore, plugins: Any, query: ResourceQuery) -> SnapshotRecorder:
+    """Return a tracker that saves the run to the snapshot store, telling resources apart by plugin identity."""
+    identities = {}
+    for name in plugins.names():
+        plugin = get_plugin(plugins, name)
+        if plugin is not None:
+            identities[name] = get_identity(plugin)
+    return SnapshotRecorder(store, query_scope(query), identities)
+
+
+def _write_inventory(inventory, format: str, output: str, summary: InventorySummary, groups: Sequence[str]):
+    """Render the slices as they are collected, as a table, pretty-printed, or streamed to `output`."""
+    if format == "table":
+        output_table(inventory, summary, groups)
+    elif output == "-" and _is_terminal() and format != "ndjson":
+        # Pretty-print for people; this needs the whole inventory in memory, so hold it compactly
+        if format == "json":
+            output_json(Inventory(inventory))
+        else:
+            output_yaml(Inventory(inventory))
+    else:
+        # Files, pipes and NDJSON bypass rich and are written slice by slice
+        stream_inventory(inventory, format, output)
+
+
+def _close_trackers(
+    manifest: Optional[ShardManifest],
+    output: str,
+    store: Optional[SnapshotStore],
+    recorder: Optional[SnapshotRecorder],
+    run_journal: Optional[Journal],
+):
+    """Save what the trackers recorded once the run is over; `recorder` is None if it was already finished."""
+    if manifest is not None:
+        # The manifest tells `merge` which tasks this shard covered
+        manifest.save(manifest_path(output))
+    if recorder is not None:
+        recorder.finish()
+    if store is not None:
+        store.close()
+    if run_journal is not None:
+        run_journal.close()
 
 
 @app.command()
 def show_inventory(
-    config_file: str = typer.Option("config.yml", help="Path to the configuration file."),
-    format: str = typer.Option("table", help="Output format: table, json, yaml"),
+    config_file: Annotated[str, typer.Option(help="Path to the configuration file.")] = "config.yml",
+    format: Annotated[str, typer.Option(help="Output format: table, json, ndjson, yaml")] = "table",
+    output: Annotated[str, typer.Option(help="Write json, ndjson or yaml output to this file ('-' for stdout).")] = "-",
+    metrics: Annotated[str, typer.Option(help="Report API call and stage metrics: table, json, prometheus")] = "",
+    metrics_file: Annotated[str, typer.Option(help="Write the json or prometheus metrics to this file.")] = "-",
+    all_regions: Annotated[bool, typer.Option(help="Ignore the region index and query every region.")] = False,
+    state: Annotated[Optional[List[str]], typer.Option(help="Only resources in this state (repeatable).")] = None,
+    resource_type: Annotated[
+        Optional[List[str]], typer.Option("--type", help="Only resources of this type, e.g. t3.micro (repeatable).")
+    ] = None,
+    tag: Annotated[
+        Optional[List[str]], typer.Option(help="Only resources tagged Key=Value or Key (repeatable).")
+    ] = None,
+    fields: Annotated[str, typer.Option(help="Comma-separated resource fields to keep.")] = "",
+    page_size: Annotated[int, typer.Option(help="Resources per API page, where supported (0 for the default).")] = 0,
+    shard: Annotated[str, typer.Option(help="Collect only shard i of N of the work space, e.g. 1/4.")] = "",
+    group_by: Annotated[
+        str, typer.Option(help="Table summaries, comma-separated: account, region, service, top")
+    ] = ",".join(DEFAULT_GROUPS),
+    top: Annotated[int, typer.Option(help="Rows shown per table summary.")] = DEFAULT_TOP,
+    changes_only: Annotated[
+        bool, typer.Option(help="Output only resources changed since the last snapshot (needs `snapshots`).")
+    ] = False,
+    journal: Annotated[
+        str, typer.Option(help="Record finished tasks in this journal (default: `journal.path` in the config).")
+    ] = "",
+    resume: Annotated[bool, typer.Option(help="Replay the journal's finished tasks and query only the rest.")] = False,
+    retry_failed: Annotated[bool, typer.Option(help="Replay the journal, querying only its failed tasks.")] = False,
 ):
+    if format not in ("table", *STREAMING_FORMATS):
+        get_console().print(f"[red]Invalid format:[/red] {format}", style="bold red")
+        return
+    if not _check_metrics_format(metrics):
+        return
+    try:
+        groups = parse_groups(group_by)
+    except ValueError as e:
+        get_console().print(f"[red]{e}[/red]", style="bold red")
+        return
+    manifest = None
+    if shard:
+        try:
+            manifest = ShardManifest(parse_shard(shard))
+        except ValueError as e:
+            get_console().print(f"[red]{e}[/red]", style="bold red")
+            return
+        if format == "table" or output == "-":
+            get_console().print("[red]--shard needs a json, ndjson or yaml --output file to merge[/red]")
+            return
+
+    if changes_only and (format == "table" or manifest is not None):
+        get_console().print("[red]--changes-only needs a json, ndjson or yaml format and no --shard[/red]")
+        return
+
+    run_metrics = set_metrics(Metrics())
     config = load_config(config_file)
-    plugins = ExtensionManager(namespace="resources", invoke_on_load=False, verify_requirements=False)
+    plugins = load_plugins()
 
-    inventory = collect_inventory(config, plugins)
+    # Slices stream out of the collector as tasks complete; waiting on them is the "collect" stage
+    query = ResourceQuery.parse(state, resource_type, tag, fields, page_size or None)
+    summary = InventorySummary(top)
+    journal_path = os.path.expanduser(journal or (config.get("journal") or {}).get("path", ""))
+    try:
+        checkpoint = _load_checkpoint(journal_path, query, resume, retry_failed)
+    except JournalError as e:
+        get_console().print(f"[red]{e}[/red]", style="bold red")
+        return
+    trackers = [summary] if format == "table" else []
+    run_journal = Journal(journal_path, query_scope(query), checkpoint) if journal_path else None
+    if run_journal is not None:
+        trackers.append(run_journal)
+    store = configure_snapshots(config.get("snapshots")) if manifest is None else None
+    recorder = None
+    if store is not None:
+        recorder = _snapshot_recorder(store, plugins, query)
+        trackers.append(recorder)
+    elif changes_only:
+        get_console().print("[red]--changes-only needs a `snapshots` section in the config[/red]")
+        return
+    if manifest is not None:
+        trackers.append(manifest)
 
-    if format == "table":
-        output_table(inventory)
-    elif format == "json":
-        output_json(inventory)
-    elif format == "yaml":
-        output_yaml(inventory)
+    shard_key = manifest.shard if manifest is not None else None
+    collected = iter_inventory(config, plugins, all_regions, query, shard_key, trackers, checkpoint)
+    inventory = run_metrics.timed_iter(collected, "collect")
+    start = time.perf_counter()
+
+    if changes_only:
+        # Every slice has to be recorded before the run can be compared with the last one
+        for _ in inventory:
+            pass
+        previous = recorder.finish()
+        stream_inventory(store.diff(previous, recorder.run), format, output)
     else:
-        console.print(f"[red]Invalid format:[/red] {format}", style="bold red")
+        _write_inventory(inventory, format, output, summary, groups)
+
+    # Rendering time is what the output took beyond waiting on collection
+    rendering = time.perf_counter() - start - run_metrics.stage_seconds("collect")
+    run_metrics.observe("stage_seconds", max(rendering, 0.0), stage="output", format=format)
+    _close_trackers(manifest, output, store, recorder if not changes_only else None, run_journal)
+    if metrics:
+        output_metrics(run_metrics, metrics, metrics_file)
+
+
+@app.command()
+def export(
+    config_file: Annotated[str, typer.Option(help="Path to the configuration file.")] = "config.yml",
+    format: Annotated[str, typer.Option(help="Export format: csv, parquet (requires pyarrow)")] = "csv",
+    output_dir: Annotated[str, typer.Option(help="Directory to write one file per service into.")] = "export",
+    batch_size: Annotated[int, typer.Option(help="Rows buffered per service between writes.")] = DEFAULT_BATCH_SIZE,
+    metrics: Annotated[str, typer.Option(help="Report API call and stage metrics: table, json, prometheus")] = "",
+    metrics_file: Annotated[str, typer.Option(help="Write the json or prometheus metrics to this file.")] = "-",
+    all_regions: Annotated[bool, typer.Option(help="Ignore the region index and query every region.")] = False,
+    state: Annotated[Optional[List[str]], typer.Option(help="Only resources in this state (repeatable).")] = None,
+    resource_type: Annotated[
+        Optional[List[str]], typer.Option("--type", help="Only resources of this type, e.g. t3.micro (repeatable).")
+    ] = None,
+    tag: Annotated[
+        Optional[List[str]], typer.Option(help="Only resources tagged Key=Value or Key (repeatable).")
+    ] = None,
+    fields: Annotated[str, typer.Option(help="Comma-separated resource fields to keep.")] = "",
+    page_size: Annotated[int, typer.Option(help="Resources per API page, where supported (0 for the default).")] = 0,
+):
+    """Export the inventory as flat rows, one file per service."""
+    if format not in EXPORT_FORMATS:
+        get_console().print(f"[red]Invalid format:[/red] {format}", style="bold red")
+        return
+    if not _check_metrics_format(metrics):
+        return
+    if format == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        get_console().print("[red]Parquet export requires pyarrow:[/red] pip install pyarrow", style="bold red")
+        return
+
+    run_metrics = set_metrics(Metrics())
+    config = load_config(config_file)
+    with run_metrics.stage("export", format=format):
+        query = ResourceQuery.parse(state, resource_type, tag, fields, page_size or None)
+        inventory = iter_inventory(config, load_plugins(), all_regions, query)
+        rows = export_inventory(inventory, output_dir, format, batch_size)
+    for service, count in rows.items():
+        get_console().print(f"Exported {count} {service} rows to {output_dir}")
+    if metrics:
+        output_metrics(run_metrics, metrics, metrics_file)
+
+
+def _identity_of(service: str) -> Optional[str]:
+    """Return a service's resource ID field, importing only that plugin, for telling saved resources apart."""
+    plugins = load_plugins()
+    if service not in plugins:
+        return None
+    plugin = get_plugin(plugins, service)
+    return get_identity(plugin) if plugin is not None else None
+
+
+@app.command()
+def merge(
+    inputs: Annotated[List[str], typer.Argument(help="Outputs of a sharded show-inventory run.")],
+    config_file: Annotated[str, typer.Option(help="Also check the shards cover this config's accounts.")] = "",
+    format: Annotated[str, typer.Option(help="Output format: json, ndjson, yaml")] = "json",
+    output: Annotated[str, typer.Option(help="Write the merged inventory to this file ('-' for stdout).")] = "-",
+    allow_incomplete: Annotated[bool, typer.Option(help="Merge even if shards are missing or tasks failed.")] = False,
+):
+    """Merge the outputs of a sharded run into one inventory, checking every task was collected."""
+    if format not in STREAMING_FORMATS:
+        get_console().print(f"[red]Invalid format:[/red] {format}", style="bold red")
+        return
+
+    from rich.console import Console
+
+    errors = Console(stderr=True)
+    manifests = []
+    problems = []
+    for path in inputs:
+        try:
+            manifests.append(ShardManifest.load(manifest_path(path)))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            problems.append(f"No readable shard manifest for {path}: {e}")
+    expected = None
+    if config_file:
+        config = load_config(config_file)
+        accounts = [account["account_id"] for account in resolve_accounts(config)]
+        expected = {"accounts": accounts, "regions": config["regions"]}
+    problems.extend(check_shards(manifests, expected))
+    for problem in problems:
+        errors.print(f"[red]{problem}[/red]")
+    if problems and not allow_incomplete:
+        raise typer.Exit(code=1)
+
+    # Without every manifest, any slice may have been collected by more than one input
+    shared = overlapping_tasks(manifests) if len(manifests) == len(inputs) else None
+
+    stream_inventory(merge_inventories(inputs, _identity_of, shared), format, output)
+
+
+@app.command()
+def diff(
+    config_file: Annotated[str, typer.Option(help="Path to the configuration file.")] = "config.yml",
+    old: Annotated[int, typer.Option("--from", help="Snapshot to compare from (default: the one before --to).")] = 0,
+    new: Annotated[int, typer.Option("--to", help="Snapshot to compare to (default: the latest).")] = 0,
+    format: Annotated[str, typer.Option(help="Output format: json, ndjson, yaml")] = "json",
+    output: Annotated[str, typer.Option(help="Write the changes to this file ('-' for stdout).")] = "-",
+    list_runs: Annotated[bool, typer.Option("--list", help="List the stored snapshots instead.")] = False,
+):
+    """Report resources added, removed or modified between two snapshots, by default the latest two of a scope."""
+    if format not in STREAMING_FORMATS:
+        get_console().print(f"[red]Invalid format:[/red] {format}", style="bold red")
+        return
+    store = configure_snapshots(load_config(config_file).get("snapshots"))
+    if store is None:
+        get_console().print("[red]No `snapshots` section in the config[/red]", style="bold red")
+        raise typer.Exit(code=1)
+    try:
+        if list_runs:
+            from rich.table import Table
+
+            table = Table(title="Snapshots")
+            for column in ("Run", "Started", "Scope", "Complete", "Slices"):
+                table.add_column(column)
+            for run in store.runs():
+                started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(run["started"]))
+                table.add_row(str(run["id"]), started, run["scope"], str(bool(run["complete"])), str(run["slices"]))
+            get_console().print(table)
+            return
+        new = new or store.latest()
+        old = old or (store.latest(store.scope_of(new), before=new) if new else None)
+        if not new or not old:
+            get_console().print("[red]Need two complete snapshots to compare[/red]", style="bold red")
+            raise typer.Exit(code=1)
+        stream_inventory(store.diff(old, new), format, output)
+    finally:
+        store.close()
+
+
+@app.command()
+def query(
+    inventory: Annotated[str, typer.Argument(help="Saved inventory file: ndjson (memory-mapped), json or yaml.")],
+    account: Annotated[Optional[List[str]], typer.Option(help="Only this account (repeatable, * wildcards).")] = None,
+    region: Annotated[Optional[List[str]], typer.Option(help="Only this region (repeatable, * wildcards).")] = None,
+    service: Annotated[Optional[List[str]], typer.Option(help="Only this service (repeatable, * wildcards).")] = None,
+    resource_id: Annotated[
+        Optional[List[str]], typer.Option("--id", help="Only this resource ID (repeatable, * wildcards).")
+    ] = None,
+    where: Annotated[
+        Optional[List[str]], typer.Option(help="Only resources with Field=Value, e.g. Type=t3.* (repeatable).")
+    ] = None,
+    format: Annotated[str, typer.Option(help="Output format: table, json, ndjson, yaml")] = "table",
+    output: Annotated[str, typer.Option(help="Write json, ndjson or yaml output to this file ('-' for stdout).")] = "-",
+    limit: Annotated[int, typer.Option(help="Stop after this many resources (0 for all).")] = 0,
+):
+    """Look up resources in a saved inventory through a sidecar index, without querying AWS."""
+    from cloudylist.search import InventoryIndex, InventoryIndexError, parse_where
+
+    if format not in ("table", *STREAMING_FORMATS):
+        get_console().print(f"[red]Invalid format:[/red] {format}", style="bold red")
+        return
+    try:
+        filters = parse_where(where)
+    except ValueError as e:
+        get_console().print(f"[red]{e}[/red]", style="bold red")
+        return
+
+    try:
+        index = InventoryIndex(inventory, _identity_of)
+    except InventoryIndexError as e:
+        get_console().print(f"[red]{e}[/red]", style="bold red")
+        raise typer.Exit(code=1)
+    try:
+        rows = index.search(account or (), region or (), service or (), resource_id or (), filters, limit)
+        if format != "table":
+            stream_inventory(rows, format, output)
+            return
+        from rich.table import Table
+
+        table = Table(title=f"Resources in {inventory}")
+        columns: List[str] = []
+        rows = list(rows)
+        for row in rows:
+            columns.extend(key for key in row if key not in columns)
+        for column in columns:
+            table.add_column(column)
+        for row in rows:
+            table.add_row(*(str(row.get(column, "")) for column in columns))
+        get_console().print(table)
+    finally:
+        index.close()
+
+
+@app.command()
+def serve(
+    config_file: Annotated[str, typer.Option(help="Path to the configuration file.")] = "config.yml",
+    host: Annotated[str, typer.Option(help="Address to listen on.")] = "127.0.0.1",
+    port: Annotated[int, typer.Option(help="Port to listen on (0 picks a free one).")] = 8080,
+):
+    """Keep the inventory in memory, refreshing each service on its TTL, and serve it over HTTP.
+
+    GET /inventory?account=..&region=..&service=.. returns the matching slices with an ETag, and
+    answers If-None-Match with 304 while they are unchanged. GET /health reports each service.
+    """
+    # http.server is only needed here, so it isn't imported for the other commands
+    from cloudylist.server import InventoryServer
+
+    server = InventoryServer(load_config(config_file), load_plugins())
+    httpd = server.http_server(host, port)
+    server.start()
+    get_console().print(f"Serving inventory on http://{host}:{httpd.server_port}/inventory")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        server.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,290 @@
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Upper bounds, in seconds, of the latency histogram buckets (the last bucket is unbounded)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+METRICS_FORMATS = ("table", "json", "prometheus")
+_START = "cloudylist_metrics_start"
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(**labels: Any) -> Labels:
+    return tuple(sorted((name, str(value)) for name, value in labels.items() if value is not None))
+
+
+class Histogram:
+    """Fixed-bucket histogram of observed durations."""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile as the upper bound of the bucket it falls in, clamped to the largest bound."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.buckets[-1]
+
+
+class Metrics:
+    """Counters and latency histograms for API calls and pipeline stages, labelled by account/region/service.
+
+    `attach` hooks botocore's before-call/after-call events on a client to time every API call and
+    count its retries, errors and response bytes. `stage` times a block of the pipeline.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+
+    def inc(self, name: str, value: float = 1, **labels: Any) -> None:
+        key = (name, _labels(**labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def merge(self, other: "Metrics") -> None:
+        """Add another registry's counters and histograms to this one, e.g. a worker process's."""
+        with self._lock:
+            for key, value in other.counters.items():
+                self.counters[key] = self.counters.get(key, 0) + value
+            for key, histogram in other.histograms.items():
+                mine = self.histograms.setdefault(key, Histogram(histogram.buckets))
+                mine.counts = [a + b for a, b in zip(mine.counts, histogram.counts)]
+                mine.count += histogram.count
+                mine.sum += histogram.sum
+
+    def __getstate__(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"counters": dict(self.counters), "histograms": dict(self.histograms)}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__()
+        self.counters.update(state["counters"])
+        self.histograms.update(state["histograms"])
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        key = (name, _labels(**labels))
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    @contextmanager
+    def stage(self, name: str, **labels: Any) -> Iterator[None]:
+        """Time a pipeline stage into the `stage_seconds` histogram."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("stage_seconds", time.perf_counter() - start, stage=name, **labels)
+
+    def timed_iter(self, items: Iterable[Any], name: str, **labels: Any) -> Iterator[Any]:
+        """Yield from `items`, counting only the time spent waiting on them as the `name` stage."""
+        iterator = iter(items)
+        waited = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    waited += time.perf_counter() - start
+                yield item
+        finally:
+            self.observe("stage_seconds", waited, stage=name, **labels)
+
+    def attach(self, client: Any, account_id: str, service: str, region: str) -> Any:
+        """Register API call hooks on a boto3 client, replacing any from an earlier run."""
+        labels = {"account": account_id, "region": region, "service": service}
+        events = client.meta.events
+        for event, handler in (("before-call", self._before_call), ("after-call", self._after_call)):
+            unique_id = f"cloudylist-metrics-{event}"
+            events.unregister(event, unique_id=unique_id)
+            events.register(event, lambda handler=handler, **kwargs: handler(labels, **kwargs), unique_id=unique_id)
+        events.unregister("after-call-error", unique_id="cloudylist-metrics-error")
+        events.register(
+            "after-call-error",
+            lambda **kwargs: self._call_error(labels, **kwargs),
+            unique_id="cloudylist-metrics-error",
+        )
+        return client
+
+    def _before_call(self, labels: Dict[str, str], context: Optional[Dict] = None, **kwargs) -> None:
+        if context is not None:
+            context[_START] = time.perf_counter()
+
+    def _after_call(
+        self,
+        labels: Dict[str, str],
+        model: Any = None,
+        http_response: Any = None,
+        parsed: Any = None,
+        context: Optional[Dict] = None,
+        **kwargs,
+    ) -> None:
+        operation = getattr(model, "name", "unknown")
+        start = (context or {}).get(_START)
+        if start is not None:
+            self.observe("api_call_seconds", time.perf_counter() - start, operation=operation, **labels)
+        self.inc("api_calls_total", operation=operation, **labels)
+        parsed = parsed if isinstance(parsed, dict) else {}
+        retries = parsed.get("ResponseMetadata", {}).get("RetryAttempts")
+        if retries:
+            self.inc("api_retries_total", retries, operation=operation, **labels)
+        if "Error" in parsed:
+            self.inc("api_errors_total", operation=operation, **labels)
+        size = self._response_bytes(http_response)
+        if size:
+            self.inc("api_response_bytes_total", size, operation=operation, **labels)
+
+    def _call_error(self, labels: Dict[str, str], model: Any = None, **kwargs) -> None:
+        self.inc("api_errors_total", operation=getattr(model, "name", "unknown"), **labels)
+
+    @staticmethod
+    def _response_bytes(http_response: Any) -> int:
+        headers = getattr(http_response, "headers", None) or {}
+        length = headers.get("content-length")
+        if length and str(length).isdigit():
+            return int(length)
+        try:
+            return len(http_response.content or b"")
+        except (AttributeError, TypeError):
+            return 0
+
+    def to_dict(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Return every counter and histogram with its labels, for a JSON report."""
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self.counters.items())
+            ]
+            histograms = [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": histogram.count,
+                    "sum": round(histogram.sum, 6),
+                    "p50": histogram.quantile(0.5),
+                    "p95": histogram.quantile(0.95),
+                    "buckets": dict(zip([*map(str, histogram.buckets), "+Inf"], histogram.counts)),
+                }
+                for (name, labels), histogram in sorted(self.histograms.items())
+            ]
+        return {"counters": counters, "histograms": histograms}
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self, prefix: str = "cloudylist_") -> str:
+        """Render the metrics in the Prometheus text exposition format, e.g. for a node_exporter textfile."""
+
+        def render(labels: Labels, extra: Labels = ()) -> str:
+            pairs = [f'{name}="{_escape(value)}"' for name, value in (*labels, *extra)]
+            return "{" + ",".join(pairs) + "}" if pairs else ""
+
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self.counters}):
+                lines.append(f"# TYPE {prefix}{name} counter")
+                for (other, labels), value in sorted(self.counters.items()):
+                    if other == name:
+                        lines.append(f"{prefix}{name}{render(labels)} {value:g}")
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append(f"# TYPE {prefix}{name} histogram")
+                for (other, labels), histogram in sorted(self.histograms.items()):
+                    if other != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip([*map(str, histogram.buckets), "+Inf"], histogram.counts):
+                        cumulative += count
+                        lines.append(f"{prefix}{name}_bucket{render(labels, (('le', bound),))} {cumulative}")
+                    lines.append(f"{prefix}{name}_sum{render(labels)} {histogram.sum:.6f}")
+                    lines.append(f"{prefix}{name}_count{render(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def stage_seconds(self, name: str) -> float:
+        """Return the total time recorded for a pipeline stage, across all its labels."""
+        with self._lock:
+            return sum(
+                histogram.sum
+                for (other, labels), histogram in self.histograms.items()
+                if other == "stage_seconds" and ("stage", name) in labels
+            )
+
+    def summary(self, by: Tuple[str, ...] = ("service", "operation")) -> List[Dict[str, Any]]:
+        """Aggregate API calls over the `by` labels, followed by one row per pipeline stage."""
+        fields = {
+            "api_calls_total": "calls",
+            "api_errors_total": "errors",
+            "api_retries_total": "retries",
+            "api_response_bytes_total": "bytes",
+        }
+        rows: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+        def row(kind: str, name: str) -> Dict[str, Any]:
+            empty = {"kind": kind, "name": name, "calls": 0, "errors": 0, "retries": 0, "bytes": 0, "seconds": 0.0}
+            return rows.setdefault((kind, name), empty)
+
+        with self._lock:
+            for (name, labels), value in self.counters.items():
+                if name in fields:
+                    label_map = dict(labels)
+                    row("api", " ".join(label_map.get(label, "") for label in by))[fields[name]] += value
+            for (name, labels), histogram in self.histograms.items():
+                label_map = dict(labels)
+                if name == "api_call_seconds":
+                    row("api", " ".join(label_map.get(label, "") for label in by))["seconds"] += histogram.sum
+                elif name == "stage_seconds":
+                    stage = row("stage", label_map["stage"])
+                    stage["calls"] += histogram.count
+                    stage["seconds"] += histogram.sum
+        return [rows[key] for key in sorted(rows)]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def write_metrics(metrics: Metrics, format: str, path: str) -> None:
+    """Write a JSON report or Prometheus textfile, atomically so a scraper never reads a partial file."""
+    text = metrics.to_json() if format == "json" else metrics.to_prometheus()
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+_metrics = Metrics()
+
+
+def get_metrics() -> Metrics:
+    """Return the process-wide metrics registry the pipeline records into."""
+    return _metrics
+
+
+def set_metrics(metrics: Metrics) -> Metrics:
+    """Replace the process-wide metrics registry, e.g. with a fresh one at the start of a run."""
+    global _metrics
+    _metrics = metrics
+    return _metrics
@@ -0,0 +1,126 @@
+import json
+import os
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from cloudylist.credentials import file_lock, replace_file
+from cloudylist.log import get_logger
+
+logger = get_logger(__name__)
+
+# Defaults for the `organization` section of the config
+DEFAULT_TTL = 3600
+# Only accounts in this state are inventoried; suspended and closing ones can't have roles assumed
+ACTIVE = "ACTIVE"
+
+
+def _is_active(account: Dict[str, Any]) -> bool:
+    # `State` replaces the deprecated `Status`; either may be the only one present
+    return (account.get("State") or account.get("Status")) == ACTIVE
+
+
+class OrganizationSource:
+    """Accounts discovered from AWS Organizations, cached in a local file for `ttl` seconds.
+
+    Every account in the organization is listed, or with `ous` only those under the given
+    organizational units and their children, and accounts that aren't ACTIVE are dropped. Each is
+    inventoried through `role_name`. Organizations is read with the runner's own credentials, or through
+    `admin_role_name` in `account_id` (the management or delegated administrator account) when set.
+    If listing fails, an expired cache is used rather than nothing.
+    """
+
+    def __init__(
+        self,
+        role_name: str,
+        ous: Iterable[str] = (),
+        path: Optional[str] = None,
+        ttl: int = DEFAULT_TTL,
+        account_id: Optional[str] = None,
+        admin_role_name: Optional[str] = None,
+    ):
+        self.role_name = role_name
+        self.ous = sorted(ous)
+        self.path = os.path.expanduser(path) if path else None
+        self.ttl = ttl
+        self.account_id = account_id
+        self.admin_role_name = admin_role_name
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "OrganizationSource":
+        return cls(
+            config["role_name"],
+            config.get("ous") or (),
+            config.get("cache_path"),
+            int(config.get("ttl", DEFAULT_TTL)),
+            config.get("account_id"),
+            config.get("admin_role_name"),
+        )
+
+    def _key(self) -> str:
+        return json.dumps({"ous": self.ous, "account_id": self.account_id})
+
+    def _read(self) -> Optional[Dict[str, Any]]:
+        if not self.path:
+            return None
+        try:
+            with open(self.path, "r") as f:
+                cached = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable account cache {self.path}: {e}")
+            return None
+        return cached if cached.get("key") == self._key() else None
+
+    def _write(self, account_ids: List[str]) -> None:
+        if not self.path:
+            return
+        try:
+            with file_lock(self.path):
+                replace_file(
+                    self.path, json.dumps({"key": self._key(), "fetched": time.time(), "accounts": account_ids})
+                )
+        except OSError as e:
+            logger.warning(f"Could not write account cache {self.path}: {e}")
+
+    def list_accounts(self, client: Any) -> List[str]:
+        """Page through the organization, or its `ous`, returning the IDs of ACTIVE accounts."""
+        found: Dict[str, Dict[str, Any]] = {}
+        if not self.ous:
+            for page in client.get_paginator("list_accounts").paginate():
+                found.update((account["Id"], account) for account in page.get("Accounts", []))
+        parents = list(self.ous)
+        while parents:
+            parent = parents.pop()
+            for page in client.get_paginator("list_accounts_for_parent").paginate(ParentId=parent):
+                found.update((account["Id"], account) for account in page.get("Accounts", []))
+            for page in client.get_paginator("list_organizational_units_for_parent").paginate(ParentId=parent):
+                parents.extend(unit["Id"] for unit in page.get("OrganizationalUnits", []))
+        inactive = [account_id for account_id, account in found.items() if not _is_active(account)]
+        if inactive:
+            logger.info(f"Skipping {len(inactive)} accounts that are not {ACTIVE}")
+        return sorted(account_id for account_id, account in found.items() if _is_active(account))
+
+    def accounts(self, get_client: Callable[[], Any]) -> List[Dict[str, str]]:
+        """Return the discovered accounts as config entries, listing them again once the cache is older than `ttl`."""
+        cached = self._read()
+        if cached is not None and time.time() - cached["fetched"] < self.ttl:
+            account_ids = cached["accounts"]
+        else:
+            try:
+                account_ids = self.list_accounts(get_client())
+            except Exception as e:
+                if cached is None:
+                    raise
+                logger.warning(f"Error listing organization accounts, using the cached list from {self.path}: {e}")
+                account_ids = cached["accounts"]
+            else:
+                logger.info(f"Discovered {len(account_ids)} active accounts in the organization")
+                self._write(account_ids)
+        return [{"account_id": account_id, "role_name": self.role_name} for account_id in account_ids]
+
+
+def configure_organization(config: Optional[Dict[str, Any]]) -> Optional[OrganizationSource]:
+    """Build an account source from the `organization` config section, or return None if accounts are all listed."""
+    if not config:
+        return None
+    return OrganizationSource.from_config(config)
@@ -0,0 +1,81 @@
+import json
+import os
+import sys
+import textwrap
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, TextIO
+
+# Formats that can be written record by record, without holding the whole inventory
+STREAMING_FORMATS = ("json", "ndjson", "yaml")
+
+
+def write_ndjson(data: Iterable[Dict[str, Any]], stream: TextIO) -> int:
+    """Write one compact JSON object per line, as each slice arrives. Returns the slices written."""
+    count = 0
+    for item in data:
+        stream.write(json.dumps(item, default=str))
+        stream.write("\n")
+        count += 1
+    return count
+
+
+def write_json(data: Iterable[Dict[str, Any]], stream: TextIO, indent: int = 4) -> int:
+    """Write a JSON array incrementally, one element per slice. Returns the slices written."""
+    count = 0
+    stream.write("[")
+    for item in data:
+        stream.write(",\n" if count else "\n")
+        stream.write(textwrap.indent(json.dumps(item, indent=indent, default=str), " " * indent))
+        count += 1
+    stream.write("\n]\n" if count else "]\n")
+    return count
+
+
+def write_yaml(data: Iterable[Dict[str, Any]], stream: TextIO) -> int:
+    """Write a YAML sequence incrementally, one entry per slice. Returns the slices written."""
+    import yaml
+
+    count = 0
+    for item in data:
+        # A one-element list dumps as a single "- " entry, and entries concatenate into one sequence
+        yaml.dump([item], stream, default_flow_style=False, sort_keys=False)
+        count += 1
+    if not count:
+        stream.write("[]\n")
+    return count
+
+
+WRITERS = {"json": write_json, "ndjson": write_ndjson, "yaml": write_yaml}
+
+
+@contextmanager
+def open_output(path: str) -> Iterator[TextIO]:
+    """Open `path` for writing, or yield stdout for "-"."""
+    if path == "-":
+        yield sys.stdout
+        sys.stdout.flush()
+        return
+    with open(path, "w") as f:
+        yield f
+
+
+def stream_inventory(data: Iterable[Dict[str, Any]], format: str, path: str = "-") -> int:
+    """Write slices to a file or stdout in a streaming format as they are collected."""
+    with open_output(path) as stream:
+        return WRITERS[format](data, stream)
+
+
+def read_inventory(path: str) -> Iterator[Dict[str, Any]]:
+    """Read slices back from a JSON, NDJSON or YAML inventory file, choosing the format by its extension."""
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, "r") as f:
+        if extension in (".ndjson", ".jsonl"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        elif extension in (".yaml", ".yml"):
+            import yaml
+
+            yield from yaml.safe_load(f) or []
+        else:
+            yield from json.load(f)
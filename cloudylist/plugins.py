@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+import sys
+from importlib import import_module
+from typing import Any, Dict, List, Optional
+from cloudylist.log import get_logger
+
+logger = get_logger(__name__)
+
+NAMESPACE = "resources"
+CACHE_DIR_ENV = "CLOUDYLIST_CACHE_DIR"
+DEFAULT_CACHE_DIR = "~/.cache/cloudylist"
+
+
+def get_cache_dir() -> str:
+    """Return the directory cloudylist keeps its caches in."""
+    return os.path.expanduser(os.environ.get(CACHE_DIR_ENV, DEFAULT_CACHE_DIR))
+
+
+class LazyExtension:
+    """Stands in for a stevedore Extension, importing the plugin the first time it is used."""
+
+    def __init__(self, name: str, target: str, index_path: Optional[str] = None):
+        self.name = name
+        self.target = target
+        self.index_path = index_path
+        self._plugin = None
+
+    @property
+    def plugin(self) -> Any:
+        if self._plugin is None:
+            module_name, _, attribute = self.target.partition(":")
+            try:
+                plugin = import_module(module_name)
+                for part in attribute.split(".") if attribute else []:
+                    plugin = getattr(plugin, part)
+            except (ImportError, AttributeError):
+                # The environment changed in a way the fingerprint missed; rescan on the next run
+                if self.index_path and os.path.exists(self.index_path):
+                    os.remove(self.index_path)
+                raise
+            self._plugin = plugin
+        return self._plugin
+
+
+class PluginIndex:
+    """The `names()`/`[name].plugin` subset of stevedore's ExtensionManager, built from entry point targets."""
+
+    def __init__(self, targets: Dict[str, str], index_path: Optional[str] = None):
+        self.targets = targets
+        self._extensions = {name: LazyExtension(name, target, index_path) for name, target in targets.items()}
+
+    def names(self) -> List[str]:
+        return list(self._extensions)
+
+    def __getitem__(self, name: str) -> LazyExtension:
+        return self._extensions[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._extensions
+
+
+def get_plugin(plugins: Any, name: str) -> Optional[Any]:
+    """Return the named plugin, or None if it can no longer be imported, logging why it is left out."""
+    try:
+        return plugins[name].plugin
+    except (ImportError, AttributeError) as e:
+        logger.error(f"Skipping plugin {name}, which could not be loaded: {e}")
+        return None
+
+
+def _fingerprint() -> str:
+    """Hash the interpreter, sys.path and each path entry's mtime.
+
+    Installing, upgrading or removing a distribution adds or renames its metadata directory, which
+    bumps the mtime of the sys.path entry it lives in, so a changed environment gets a new fingerprint.
+    """
+    digest = hashlib.sha256(sys.executable.encode())
+    for entry in sys.path:
+        try:
+            mtime = os.stat(entry or ".").st_mtime_ns
+        except OSError:
+            mtime = -1
+        digest.update(f"\0{entry}\0{mtime}".encode())
+    return digest.hexdigest()
+
+
+def _discover(namespace: str) -> Dict[str, str]:
+    from stevedore import ExtensionManager
+
+    manager = ExtensionManager(namespace=namespace, invoke_on_load=False)
+    return {extension.name: extension.entry_point.value for extension in manager}
+
+
+def load_plugins(namespace: str = NAMESPACE, cache_dir: Optional[str] = None) -> PluginIndex:
+    """Return the plugins registered under `namespace`, from a cached index when it is still valid.
+
+    The index records each plugin's entry point target, keyed by a fingerprint of the environment.
+    On a hit neither stevedore nor any plugin is imported until a plugin is actually used; on a miss
+    the entry points are scanned with stevedore and the index rewritten.
+    """
+    path = os.path.join(cache_dir or get_cache_dir(), f"plugins-{namespace}.json")
+    fingerprint = _fingerprint()
+    try:
+        with open(path, "r") as f:
+            index = json.load(f)
+        if index["fingerprint"] == fingerprint:
+            return PluginIndex(index["plugins"], path)
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    targets = _discover(namespace)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"fingerprint": fingerprint, "plugins": targets}, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.debug(f"Could not write plugin index {path}: {e}")
+        return PluginIndex(targets)
+    return PluginIndex(targets, path)
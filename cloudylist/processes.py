@@ -0,0 +1,168 @@
+import heapq
+import multiprocessing
+import queue
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Sequence, Tuple
+from cloudylist.clients import configure_client_pool, expected_clients
+from cloudylist.concurrency import TaskLimiter, ordered_map
+from cloudylist.enrichment import configure_enrichment
+from cloudylist.log import get_logger
+from cloudylist.metrics import Metrics, get_metrics, set_metrics
+from cloudylist.throttle import RequestScheduler
+
+logger = get_logger(__name__)
+
+# A worker sends its finished tasks in batches of up to this many tasks or resources, whichever comes first
+BATCH_TASKS = 16
+BATCH_RESOURCES = 5000
+# How long the parent waits for a batch before checking whether a worker died
+POLL_SECONDS = 1.0
+
+
+def assign_accounts(slots: Sequence[Tuple[Hashable, Hashable]], processes: int) -> List[List[int]]:
+    """Split task indexes between worker processes, keeping each account's tasks on one worker.
+
+    Accounts are handed out largest first to whichever worker has the fewest tasks so far.
+    """
+    by_account: Dict[Hashable, List[int]] = {}
+    for index, (account_id, _) in enumerate(slots):
+        by_account.setdefault(account_id, []).append(index)
+    workers: List[List[int]] = [[] for _ in range(min(processes, len(by_account)))]
+    loads = [(0, worker) for worker in range(len(workers))]
+    for indexes in sorted(by_account.values(), key=len, reverse=True):
+        load, worker = heapq.heappop(loads)
+        workers[worker].extend(indexes)
+        heapq.heappush(loads, (load + len(indexes), worker))
+    return [sorted(indexes) for indexes in workers]
+
+
+def _worker(
+    worker: int,
+    func: Callable[..., Any],
+    config: Dict[str, Any],
+    settings: Dict[str, Any],
+    assigned: List[Tuple[int, Tuple[Any, ...], Tuple[Hashable, Hashable]]],
+    results: Any,
+) -> None:
+    """Run one worker process's tasks on its own thread pool, sessions and clients, sending back batches."""
+    metrics = set_metrics(Metrics())
+    accounts = {account_id for _, _, (account_id, _) in assigned}
+    configure_client_pool(config.get("clients"), expected_clients(len(assigned), len(accounts), len(config["regions"])))
+    scheduler = RequestScheduler(config.get("throttle"))
+    enricher = configure_enrichment(config.get("enrichment"))
+    tasks = [(scheduler, *task, enricher) for _, task, _ in assigned]
+    slots = [slot for _, _, slot in assigned]
+    limiter = TaskLimiter(settings["per_account"], settings["per_region"])
+    batch: List[Tuple[int, Any]] = []
+    size = 0
+    try:
+        outcomes = ordered_map(func, tasks, slots, settings["max_workers"], limiter=limiter, window=settings["window"])
+        for (index, _, _), slices in zip(assigned, outcomes):
+            batch.append((index, slices))
+            size += sum(len(item["resources"]) for item in slices or ())
+            if len(batch) >= BATCH_TASKS or size >= BATCH_RESOURCES:
+                results.put((worker, batch, None))
+                batch = []
+                size = 0
+        if batch:
+            results.put((worker, batch, None))
+    finally:
+        if enricher is not None:
+            enricher.close()
+        results.put((worker, None, (scheduler.stats(), metrics)))
+
+
+def process_map(
+    func: Callable[..., Any],
+    tasks: Sequence[Tuple[Any, ...]],
+    slots: Sequence[Tuple[Hashable, Hashable]],
+    config: Dict[str, Any],
+    settings: Dict[str, Any],
+    scheduler: RequestScheduler,
+) -> Iterator[Any]:
+    """Run `func(scheduler, *task, enricher)` for each task in worker processes, yielding results in task order.
+
+    Like `ordered_map`, but tasks are spread over `settings["processes"]` processes started with
+    `settings["start_method"]`, each account's tasks on one process (see `assign_accounts`). Each worker
+    builds its own client pool, `RequestScheduler` and enricher from `config` and runs its tasks on a
+    `max_workers` thread pool, so response parsing and record building use every core instead of
+    contending for one GIL. Throttling buckets are per account, so pacing is unchanged; the retry budget
+    and `per_region` cap apply per process. Workers send finished tasks back in batches of up to
+    `BATCH_TASKS` tasks or `BATCH_RESOURCES` resources, each pickled once, and when they finish their
+    throttling counters are added to `scheduler` and their metrics to the parent's registry. Tasks of
+    a worker that dies come back as None (failed).
+
+    Results that arrive ahead of an earlier account's are held in the parent until it is done, so the
+    `window` bound holds within each worker but not across them.
+    """
+    context = multiprocessing.get_context(settings["start_method"])
+    results = context.Queue()
+    outstanding: Dict[int, set] = {}
+    workers = []
+    for worker, indexes in enumerate(assign_accounts(slots, settings["processes"])):
+        assigned = [(index, tasks[index], slots[index]) for index in indexes]
+        process = context.Process(
+            target=_worker, args=(worker, func, config, settings, assigned, results), name=f"cloudylist-{worker}"
+        )
+        process.daemon = True
+        process.start()
+        workers.append(process)
+        outstanding[worker] = set(indexes)
+
+    finished: Dict[int, Any] = {}
+    running = set(range(len(workers)))
+
+    def receive() -> None:
+        """Take the next batch or final message off the queue, failing the tasks of workers that died."""
+        try:
+            handle(*results.get(timeout=POLL_SECONDS))
+            return
+        except queue.Empty:
+            pass
+        dead = [worker for worker in running if not workers[worker].is_alive()]
+        if not dead:
+            return
+        # A worker may have sent its last batches just before exiting, after the wait above timed out
+        while True:
+            try:
+                handle(*results.get_nowait())
+            except queue.Empty:
+                break
+        for worker in dead:
+            if worker in running:
+                logger.error(f"Worker process {workers[worker].name} exited with code {workers[worker].exitcode}")
+                finish(worker)
+
+    def handle(worker: int, batch: Any, counters: Any) -> None:
+        if batch is None:
+            scheduler.merge(counters[0])
+            get_metrics().merge(counters[1])
+            finish(worker)
+            return
+        for index, slices in batch:
+            outstanding[worker].discard(index)
+            finished[index] = slices
+
+    def finish(worker: int) -> None:
+        running.discard(worker)
+        if outstanding[worker]:
+            logger.error(f"Worker process {workers[worker].name} left {len(outstanding[worker])} tasks unfinished")
+            finished.update(dict.fromkeys(outstanding[worker]))
+            outstanding[worker] = set()
+
+    next_out = 0
+    try:
+        while next_out < len(tasks):
+            if next_out in finished:
+                yield finished.pop(next_out)
+                next_out += 1
+            else:
+                receive()
+        # Wait for the workers' final messages, which carry their throttling counters and metrics
+        while running:
+            receive()
+    finally:
+        for process in workers:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        results.close()
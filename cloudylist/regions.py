@@ -0,0 +1,150 @@
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from cloudylist.log import get_logger
+
+logger = get_logger(__name__)
+
+# Defaults for the `region_index` section of the config
+DEFAULT_REPROBE_INTERVAL = 7 * 24 * 3600
+DEFAULT_OPT_IN_TTL = 24 * 3600
+
+# Region states recorded per account
+ACTIVE = "active"
+EMPTY = "empty"
+NOT_OPTED_IN = "not-opted-in"
+
+
+def describe_opt_in(client: Any) -> Dict[str, str]:
+    """Return each region's opt-in status (e.g. "opt-in-not-required", "opted-in", "not-opted-in")."""
+    regions = client.describe_regions(AllRegions=True)["Regions"]
+    return {region["RegionName"]: region.get("OptInStatus", "opt-in-not-required") for region in regions}
+
+
+def _settings(config: Dict[str, Any]) -> Tuple[Optional[str], int, int]:
+    return (
+        os.path.expanduser(config["path"]) if config.get("path") else None,
+        int(config.get("reprobe_interval", DEFAULT_REPROBE_INTERVAL)),
+        int(config.get("opt_in_ttl", DEFAULT_OPT_IN_TTL)),
+    )
+
+
+class RegionIndex:
+    """Per-account record of which regions are disabled, empty or in use, optionally persisted to a file.
+
+    Opt-in status comes from `DescribeRegions` and is refreshed after `opt_in_ttl` seconds. A region
+    where every regional plugin succeeded and found nothing is marked empty and skipped until it is
+    `reprobe_interval` seconds old; any resource found marks it active again.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        reprobe_interval: int = DEFAULT_REPROBE_INTERVAL,
+        opt_in_ttl: int = DEFAULT_OPT_IN_TTL,
+    ):
+        self.path = os.path.expanduser(path) if path else None
+        self.reprobe_interval = reprobe_interval
+        self.opt_in_ttl = opt_in_ttl
+        self._lock = threading.Lock()
+        self._accounts: Dict[str, Dict[str, Any]] = self._read() if self.path else {}
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]]) -> "RegionIndex":
+        """Build an index from the `region_index` section of the config."""
+        return cls(*_settings(config or {}))
+
+    def settings(self) -> Tuple[Optional[str], int, int]:
+        return (self.path, self.reprobe_interval, self.opt_in_ttl)
+
+    def _account(self, account_id: str) -> Dict[str, Any]:
+        return self._accounts.setdefault(account_id, {"opt_in": {}, "opt_in_checked": 0, "regions": {}})
+
+    def needs_opt_in(self, account_id: str) -> bool:
+        """Return True if the account's opt-in status is unknown or older than `opt_in_ttl`."""
+        with self._lock:
+            return time.time() - self._account(account_id)["opt_in_checked"] >= self.opt_in_ttl
+
+    def set_opt_in(self, account_id: str, statuses: Dict[str, str]) -> None:
+        with self._lock:
+            account = self._account(account_id)
+            account["opt_in"] = statuses
+            account["opt_in_checked"] = time.time()
+
+    def select(self, account_id: str, regions: List[str]) -> List[str]:
+        """Return the regions worth querying for an account, in the order given."""
+        now = time.time()
+        selected = []
+        with self._lock:
+            account = self._account(account_id)
+            for region in regions:
+                if account["opt_in"].get(region) == NOT_OPTED_IN:
+                    continue
+                state = account["regions"].get(region)
+                if state and state["state"] == EMPTY and now - state["checked"] < self.reprobe_interval:
+                    continue
+                selected.append(region)
+        return selected
+
+    def record(self, account_id: str, region: str, active: bool) -> None:
+        """Record that a region was fully queried and whether anything was found in it."""
+        with self._lock:
+            self._account(account_id)["regions"][region] = {
+                "state": ACTIVE if active else EMPTY,
+                "checked": time.time(),
+            }
+
+    def save(self) -> None:
+        """Write the index to its file, if it has one."""
+        if not self.path:
+            return
+        with self._lock:
+            raw = json.dumps(self._accounts)
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(raw)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not write region index {self.path}: {e}")
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path, "r") as f:
+                accounts = json.load(f)
+            return accounts if isinstance(accounts, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable region index {self.path}: {e}")
+            return {}
+
+
+_region_index: Optional[RegionIndex] = None
+
+
+def get_region_index() -> Optional[RegionIndex]:
+    """Return the process-wide region index, or None when regions are not filtered."""
+    return _region_index
+
+
+def set_region_index(index: Optional[RegionIndex]) -> None:
+    global _region_index
+    _region_index = index
+
+
+def configure_region_index(config: Optional[Dict[str, Any]]) -> Optional[RegionIndex]:
+    """Apply the `region_index` config section, keeping the current index if its settings match.
+
+    Without the section every configured region is queried, as before.
+    """
+    if config is None:
+        set_region_index(None)
+        return None
+    current = get_region_index()
+    if current is None or current.settings() != _settings(config):
+        set_region_index(RegionIndex.from_config(config))
+    return get_region_index()
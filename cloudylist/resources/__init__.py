@@ -0,0 +1,276 @@
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# How often a `resources` plugin needs to be queried for each account
+GLOBAL = "global"  # once, e.g. IAM; the slice is reported under the "global" region
+REGIONAL = "regional"  # once per configured region (the default)
+PARTITIONED = "partitioned"  # once, then split into per-region slices by a field on each resource
+SCOPES = (GLOBAL, REGIONAL, PARTITIONED)
+
+
+def scope(kind: str, partition_key: Optional[str] = None):
+    """Declare a plugin's scope; partitioned plugins name the resource field holding the region."""
+    if kind not in SCOPES:
+        raise ValueError(f"Unknown plugin scope: {kind}")
+    if kind == PARTITIONED and not partition_key:
+        raise ValueError("Partitioned plugins must name a partition_key")
+
+    def decorate(func):
+        func.scope = kind
+        func.partition_key = partition_key
+        return func
+
+    return decorate
+
+
+def get_scope(plugin) -> str:
+    """Return the scope a plugin declared, treating plugins that declare nothing as regional."""
+    kind = getattr(plugin, "scope", REGIONAL)
+    return kind if kind in SCOPES else REGIONAL
+
+
+def identity(field: str):
+    """Declare the resource field that identifies a plugin's resources, e.g. `InstanceId`, for snapshots and diffs."""
+
+    def decorate(func):
+        func.identity = field
+        return func
+
+    return decorate
+
+
+def get_identity(plugin) -> Optional[str]:
+    """Return the identifying field a plugin declared, or None if its resources are identified by content."""
+    field = getattr(plugin, "identity", None)
+    return field if isinstance(field, str) else None
+
+
+# Filters a plugin can be asked to apply; see `filters` and `ResourceQuery`
+FILTERS = ("state", "type", "tag")
+
+
+def filters(*names: str):
+    """Declare the filters a plugin applies itself, and that it takes a `ResourceQuery` as its second argument.
+
+    Plugins that declare no filters are called with the client alone; a query with filters then skips
+    them entirely, and a field list is applied to their resources afterwards.
+    """
+    unknown = [name for name in names if name not in FILTERS]
+    if unknown:
+        raise ValueError(f"Unknown plugin filters: {', '.join(unknown)}")
+
+    def decorate(func):
+        func.filters = names
+        return func
+
+    return decorate
+
+
+def get_filters(plugin) -> Optional[Tuple[str, ...]]:
+    """Return the filters a plugin declared, or None if it does not take a query."""
+    names = getattr(plugin, "filters", None)
+    return names if isinstance(names, tuple) else None
+
+
+class ConfigMapping:
+    """How a plugin's resources are read from an AWS Config aggregator instead of the plugin's own API.
+
+    `properties` are the configuration item properties to select besides the resource's account,
+    region, ID, name and creation time, and `to_record` turns one result into the plugin's record.
+    `details` maps detail fields of the record, e.g. `Tags`, to the property each is read from; those
+    are only selected, and the fields kept, when the query asks for them (see `ResourceQuery.wants`).
+    """
+
+    def __init__(
+        self,
+        resource_type: str,
+        properties: Tuple[str, ...],
+        to_record: Callable[[Dict[str, Any]], Dict],
+        details: Optional[Dict[str, str]] = None,
+    ):
+        self.resource_type = resource_type
+        self.properties = properties
+        self.to_record = to_record
+        self.details = dict(details or {})
+
+
+def aggregated(
+    resource_type: str,
+    to_record: Callable[[Dict[str, Any]], Dict],
+    properties: Iterable[str] = (),
+    details: Optional[Dict[str, str]] = None,
+):
+    """Declare the AWS Config resource type a plugin lists, so the aggregator backend can collect it."""
+
+    def decorate(func):
+        func.aggregated = ConfigMapping(resource_type, tuple(properties), to_record, details)
+        return func
+
+    return decorate
+
+
+def get_aggregated(plugin) -> Optional[ConfigMapping]:
+    """Return a plugin's AWS Config mapping, or None if only the plugin itself can list its resources."""
+    mapping = getattr(plugin, "aggregated", None)
+    return mapping if isinstance(mapping, ConfigMapping) else None
+
+
+class Enrichment:
+    """A batched detail lookup that fills in one field of a plugin's resources after they are collected.
+
+    `lookup(client, keys)` is called with up to `batch_size` distinct keys from one account and region
+    (all of them when `batch_size` is None) and returns each key's value. Keys are the resources' `key`
+    field, by default the plugin's identity. `service` names the client the lookup needs, when it isn't
+    the plugin's own.
+    """
+
+    def __init__(
+        self,
+        field: str,
+        lookup: Callable[[Any, List[str]], Dict[str, Any]],
+        batch_size: Optional[int] = None,
+        service: Optional[str] = None,
+        key: Optional[str] = None,
+    ):
+        self.field = field
+        self.lookup = lookup
+        self.batch_size = batch_size
+        self.service = service
+        self.key = key
+
+
+def enrich(
+    field: str,
+    lookup: Callable[[Any, List[str]], Dict[str, Any]],
+    batch_size: Optional[int] = None,
+    service: Optional[str] = None,
+    key: Optional[str] = None,
+):
+    """Register a detail lookup for the enrichment stage (see `cloudylist.enrichment`); stack one per field."""
+
+    def decorate(func):
+        func.enrichments = (*get_enrichments(func), Enrichment(field, lookup, batch_size, service, key))
+        return func
+
+    return decorate
+
+
+def get_enrichments(plugin) -> Tuple[Enrichment, ...]:
+    """Return the detail lookups a plugin registered, if any."""
+    enrichments = getattr(plugin, "enrichments", ())
+    return enrichments if isinstance(enrichments, tuple) else ()
+
+
+class ResourceQuery:
+    """Filters and a field projection for one inventory run.
+
+    Each filter is a list of accepted values; tags map a key to a required value, or to None for any
+    value. A resource must pass every filter given. `fields` lists the resource fields to keep, taken
+    from the plugin's usual record or, failing that, from the raw API response. `services` limits the
+    run to those plugins. `details` are enabled detail fields, e.g. `Tags`, that plugins fill in
+    themselves when the response they already have carries them; records leave them out otherwise.
+    """
+
+    def __init__(
+        self,
+        states: Iterable[str] = (),
+        types: Iterable[str] = (),
+        tags: Optional[Dict[str, Optional[str]]] = None,
+        fields: Iterable[str] = (),
+        page_size: Optional[int] = None,
+        services: Iterable[str] = (),
+        details: Iterable[str] = (),
+    ):
+        self.states = list(states)
+        self.types = list(types)
+        self.tags = dict(tags or {})
+        self.fields = list(fields)
+        self.page_size = page_size
+        self.services = list(services)
+        self.details = list(details)
+
+    @classmethod
+    def parse(
+        cls,
+        states: Optional[List[str]] = None,
+        types: Optional[List[str]] = None,
+        tags: Optional[List[str]] = None,
+        fields: Optional[str] = None,
+        page_size: Optional[int] = None,
+    ) -> "ResourceQuery":
+        """Build a query from command line values: tags as `Key=Value` or `Key`, fields comma separated."""
+        parsed_tags = {}
+        for tag in tags or []:
+            key, separator, value = tag.partition("=")
+            parsed_tags[key] = value if separator else None
+        field_list = [field.strip() for field in (fields or "").split(",") if field.strip()]
+        return cls(states or (), types or (), parsed_tags, field_list, page_size)
+
+    def requested(self) -> Tuple[str, ...]:
+        """Return the names of the filters this query uses."""
+        used = {"state": self.states, "type": self.types, "tag": self.tags}
+        return tuple(name for name in FILTERS if used[name])
+
+    def supported_by(self, plugin) -> bool:
+        """Return True if the plugin can apply every filter this query uses."""
+        return set(self.requested()) <= set(get_filters(plugin) or ())
+
+    def matches(
+        self, state: Optional[str] = None, type: Optional[str] = None, tags: Optional[Dict[str, str]] = None
+    ) -> bool:
+        """Return True if a resource with this state, type and tags passes the filters."""
+        if self.states and state not in self.states:
+            return False
+        if self.types and type not in self.types:
+            return False
+        tags = tags or {}
+        return all(key in tags and (value is None or tags[key] == value) for key, value in self.tags.items())
+
+    def project(self, record: Dict[str, Any], raw: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Keep only the requested fields of a record, looking up fields it lacks in the raw response."""
+        if not self.fields:
+            return record
+        return {field: record[field] if field in record else (raw or {}).get(field) for field in self.fields}
+
+    def including(self, field: str) -> "ResourceQuery":
+        """Return a copy whose projection also keeps `field`, e.g. the field a partitioned plugin splits on."""
+        if not self.fields or field in self.fields:
+            return self
+        fields = [*self.fields, field]
+        return ResourceQuery(self.states, self.types, self.tags, fields, self.page_size, self.services, self.details)
+
+    def wants(self, field: str) -> bool:
+        """Return True if a detail field is asked for, as an enabled detail or in the projection."""
+        return field in self.details or field in self.fields
+
+    def with_details(self, details: Iterable[str]) -> "ResourceQuery":
+        """Return a copy that also asks plugins for these detail fields."""
+        details = [*self.details, *(field for field in details if field not in self.details)]
+        return ResourceQuery(self.states, self.types, self.tags, self.fields, self.page_size, self.services, details)
+
+    def narrows(self) -> bool:
+        """Return True if the query leaves resources or plugins out, so a run sees only part of each region."""
+        return bool(self.requested() or self.services)
+
+    def __bool__(self) -> bool:
+        return bool(self.requested() or self.fields or self.page_size or self.services or self.details)
+
+
+def tag_dict(tags: Optional[List[Dict[str, str]]]) -> Dict[str, str]:
+    """Turn an AWS `[{"Key": ..., "Value": ...}]` tag list into a dict."""
+    return {tag["Key"]: tag.get("Value", "") for tag in tags or []}
+
+
+def tags_by_name(client, resource_type: str, names: List[str]) -> Dict[str, Dict[str, str]]:
+    """Look up tags through the Resource Groups Tagging API, keyed by the name at the end of each ARN.
+
+    One paged GetResources call covers every resource of `resource_type` (e.g. `rds:db`) in the client's
+    region, so it is registered without a batch size. Names the API doesn't return have no tags.
+    """
+    tags: Dict[str, Dict[str, str]] = {name: {} for name in names}
+    paginator = client.get_paginator("get_resources")
+    for page in paginator.paginate(ResourceTypeFilters=[resource_type], ResourcesPerPage=100):
+        for mapping in page.get("ResourceTagMappingList", []):
+            name = mapping["ResourceARN"].split(":")[-1]
+            if name in tags:
+                tags[name] = tag_dict(mapping.get("Tags"))
+    return tags
@@ -1,14 +1,64 @@
-def list_resources(client):
-    """List EC2 instances."""
-    instances = []
-    response = client.describe_instances()
-    for reservation in response.get("Reservations", []):
-        for instance in reservation.get("Instances", []):
-            instances.append(
-                {
+from typing import Any, Dict, List
+from cloudylist.resources import ResourceQuery, aggregated, filters, identity, tag_dict
+
+
+def _api_filters(query: ResourceQuery) -> List[Dict[str, Any]]:
+    """Translate a query's filters into DescribeInstances `Filters`, so EC2 only returns matches."""
+    api_filters = []
+    if query.states:
+        api_filters.append({"Name": "instance-state-name", "Values": query.states})
+    if query.types:
+        api_filters.append({"Name": "instance-type", "Values": query.types})
+    for key, value in query.tags.items():
+        if value is None:
+            api_filters.append({"Name": "tag-key", "Values": [key]})
+        else:
+            api_filters.append({"Name": f"tag:{key}", "Values": [value]})
+    return api_filters
+
+
+def _from_config(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Map an AWS Config query result to the record `list_resources` produces."""
+    configuration = item.get("configuration") or {}
+    return {
+        "InstanceId": item["resourceId"],
+        "State": (configuration.get("state") or {}).get("name"),
+        "Type": configuration.get("instanceType"),
+        "Tags": {tag["key"]: tag.get("value", "") for tag in item.get("tags") or []},
+    }
+
+
+@identity("InstanceId")
+@aggregated(
+    "AWS::EC2::Instance",
+    _from_config,
+    properties=("configuration.state.name", "configuration.instanceType"),
+    details={"Tags": "tags"},
+)
+@filters("state", "type", "tag")
+def list_resources(client, query=None):
+    """List EC2 instances, one page at a time. Filters are applied by the API.
+
+    Tags are only included when the query asks for them, e.g. with `Tags` in the enrichment fields.
+    """
+    query = query or ResourceQuery()
+    tags = query.wants("Tags")
+    kwargs: Dict[str, Any] = {}
+    api_filters = _api_filters(query)
+    if api_filters:
+        kwargs["Filters"] = api_filters
+    if query.page_size:
+        kwargs["PaginationConfig"] = {"PageSize": min(max(query.page_size, 5), 1000)}
+    paginator = client.get_paginator("describe_instances")
+    for page in paginator.paginate(**kwargs):
+        for reservation in page.get("Reservations", []):
+            for instance in reservation.get("Instances", []):
+                record = {
                     "InstanceId": instance["InstanceId"],
                     "State": instance["State"]["Name"],
                     "Type": instance["InstanceType"],
                 }
-            )
-    return instances
+                if tags:
+                    # DescribeInstances returns the tags with each instance, so they cost no extra calls
+                    record["Tags"] = tag_dict(instance.get("Tags"))
+                yield query.project(record, instance)
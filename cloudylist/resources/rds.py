@@ -1,7 +1,35 @@
-def list_resources(client):
-    """List RDS instances."""
-    response = client.describe_db_instances()
-    return [
-        {"DBInstanceIdentifier": db["DBInstanceIdentifier"], "Status": db["DBInstanceStatus"]}
-        for db in response.get("DBInstances", [])
-    ]
+from typing import Any, Dict, List
+from cloudylist.resources import ResourceQuery, aggregated, enrich, filters, identity, tag_dict, tags_by_name
+
+
+def _from_config(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Map an AWS Config query result to the record `list_resources` produces."""
+    configuration = item.get("configuration") or {}
+    return {"DBInstanceIdentifier": item["resourceName"], "Status": configuration.get("dBInstanceStatus")}
+
+
+def _tags(client, identifiers: List[str]) -> Dict[str, Dict[str, str]]:
+    return tags_by_name(client, "rds:db", identifiers)
+
+
+@identity("DBInstanceIdentifier")
+@enrich("Tags", _tags, service="resourcegroupstaggingapi")
+@aggregated("AWS::RDS::DBInstance", _from_config, properties=("configuration.dBInstanceStatus",))
+@filters("state", "type", "tag")
+def list_resources(client, query=None):
+    """List RDS instances, one page at a time.
+
+    DescribeDBInstances can only filter on identifiers and engines, so state, type and tag filters
+    are checked here, against the status, instance class and tags each response already carries.
+    """
+    query = query or ResourceQuery()
+    kwargs = {}
+    if query.page_size:
+        kwargs["PaginationConfig"] = {"PageSize": min(max(query.page_size, 20), 100)}
+    paginator = client.get_paginator("describe_db_instances")
+    for page in paginator.paginate(**kwargs):
+        for db in page.get("DBInstances", []):
+            if not query.matches(db["DBInstanceStatus"], db.get("DBInstanceClass"), tag_dict(db.get("TagList"))):
+                continue
+            record = {"DBInstanceIdentifier": db["DBInstanceIdentifier"], "Status": db["DBInstanceStatus"]}
+            yield query.project(record, db)
@@ -1,6 +1,41 @@
-def list_resources(client):
-    """List S3 buckets."""
-    response = client.list_buckets()
-    return [
-        {"Name": bucket["Name"], "CreationDate": str(bucket["CreationDate"])} for bucket in response.get("Buckets", [])
-    ]
+from datetime import datetime
+from typing import Any, Dict, List
+from cloudylist.resources import PARTITIONED, ResourceQuery, aggregated, enrich, filters, identity, scope, tags_by_name
+
+
+def _from_config(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Map an AWS Config query result to the record `list_resources` produces, dates formatted the same way."""
+    created = item.get("resourceCreationTime")
+    return {
+        "Name": item["resourceName"],
+        "CreationDate": str(datetime.fromisoformat(created.replace("Z", "+00:00"))) if created else None,
+        "Region": item.get("awsRegion"),
+    }
+
+
+def _tags(client, names: List[str]) -> Dict[str, Dict[str, str]]:
+    return tags_by_name(client, "s3", names)
+
+
+@identity("Name")
+@enrich("Tags", _tags, service="resourcegroupstaggingapi")
+@aggregated("AWS::S3::Bucket", _from_config)
+@scope(PARTITIONED, partition_key="Region")
+@filters()
+def list_resources(client, query=None):
+    """List S3 buckets, one page at a time. ListBuckets is global, so this runs once per account.
+
+    Buckets have no state or type and their tags cost a call each, so no filters are supported; tags
+    can be added after collection by the enrichment stage instead. ListBuckets already reports each
+    bucket's region.
+    """
+    query = query or ResourceQuery()
+    paginator = client.get_paginator("list_buckets")
+    for page in paginator.paginate():
+        for bucket in page.get("Buckets", []):
+            record = {
+                "Name": bucket["Name"],
+                "CreationDate": str(bucket["CreationDate"]),
+                "Region": bucket.get("BucketRegion"),
+            }
+            yield query.project(record, bucket)
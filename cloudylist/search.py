@@ -0,0 +1,226 @@
+import fnmatch
+import json
+import mmap
+import os
+import sqlite3
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from cloudylist.log import get_logger
+from cloudylist.output import read_inventory
+
+logger = get_logger(__name__)
+
+# Written next to the inventory, e.g. inventory.ndjson.index.db
+INDEX_SUFFIX = ".index.db"
+# Bump when the index layout changes, so older sidecars are rebuilt
+INDEX_VERSION = 1
+# Resource fields indexed besides the resource ID; others can still be filtered on, by scanning
+INDEXED_FIELDS = ("State", "Status", "Type", "Engine")
+# Fields tried, in order, for the ID of resources whose plugin declares no identity
+ID_FIELDS = ("InstanceId", "DBInstanceIdentifier", "Name", "Arn", "id")
+
+_SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE slices (
+    n INTEGER PRIMARY KEY, account TEXT, region TEXT, service TEXT, offset INTEGER, length INTEGER, body TEXT
+);
+CREATE TABLE resources (id INTEGER PRIMARY KEY, slice INTEGER, position INTEGER, resource_id TEXT);
+CREATE TABLE attributes (resource INTEGER, field TEXT, value TEXT);
+"""
+# Created after loading, which is faster than maintaining them row by row
+_INDEXES = """
+CREATE INDEX slices_by_account ON slices (account);
+CREATE INDEX slices_by_region ON slices (region);
+CREATE INDEX slices_by_service ON slices (service);
+CREATE INDEX resources_by_id ON resources (resource_id);
+CREATE INDEX resources_by_slice ON resources (slice, position);
+CREATE INDEX attributes_by_resource ON attributes (resource, field, value);
+"""
+
+
+class InventoryIndexError(Exception):
+    """Raised when an inventory can't be indexed, e.g. it is missing or a slice is malformed."""
+
+
+def index_path(path: str) -> str:
+    return f"{path}{INDEX_SUFFIX}"
+
+
+def _signature(path: str) -> str:
+    stat = os.stat(path)
+    return json.dumps([INDEX_VERSION, stat.st_size, stat.st_mtime_ns])
+
+
+def _ndjson_slices(path: str) -> Iterator[Tuple[Dict[str, Any], int, int, Optional[str]]]:
+    """Yield each slice of an NDJSON file with its byte offset and length, for reading it back through mmap."""
+    offset = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line), offset, len(line), None
+            offset += len(line)
+
+
+def _other_slices(path: str) -> Iterator[Tuple[Dict[str, Any], int, int, Optional[str]]]:
+    """Yield each slice of a JSON or YAML file with its text, which has no per-slice offsets to map."""
+    for item in read_inventory(path):
+        yield item, 0, 0, json.dumps(item, default=str)
+
+
+def _resource_id(resource: Dict[str, Any], field: Optional[str]) -> Optional[str]:
+    for name in (field,) if field else ID_FIELDS:
+        if resource.get(name) is not None:
+            return str(resource[name])
+    return None
+
+
+class InventoryIndex:
+    """A saved inventory with a SQLite sidecar index, for answering lookups without parsing the whole file.
+
+    The sidecar holds each slice's account, region and service, and each resource's ID and `INDEXED_FIELDS`,
+    so matches are found by index lookups. For NDJSON inventories only the matching slices are then read,
+    straight from a memory map of the file; JSON and YAML inventories keep each slice's text in the sidecar.
+    The sidecar is rebuilt whenever the inventory file changes. `identity_of` names a service's resource ID
+    field; it is only called while building, once per service found.
+    """
+
+    def __init__(self, path: str, identity_of: Optional[Callable[[str], Optional[str]]] = None):
+        if not os.path.isfile(path):
+            raise InventoryIndexError(f"No inventory file at {path}")
+        self.path = path
+        self.identity_of = identity_of
+        self._db = self._open()
+        self._file = open(path, "rb")  # noqa: SIM115 - backs the memory map until close()
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(path) else None
+
+    def _open(self) -> sqlite3.Connection:
+        sidecar = index_path(self.path)
+        if os.path.exists(sidecar):
+            db = sqlite3.connect(sidecar)
+            try:
+                row = db.execute("SELECT value FROM meta WHERE key = 'signature'").fetchone()
+                if row and row[0] == _signature(self.path):
+                    return db
+            except sqlite3.DatabaseError:
+                pass
+            db.close()
+        return self._build(sidecar)
+
+    def _build(self, sidecar: str) -> sqlite3.Connection:
+        logger.info(f"Indexing {self.path}")
+        tmp_path = f"{sidecar}.{os.getpid()}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        db = sqlite3.connect(tmp_path)
+        try:
+            self._load(db)
+            db.close()
+            os.replace(tmp_path, sidecar)
+        except Exception as e:
+            db.close()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise InventoryIndexError(f"Could not index {self.path}: {e}") from e
+        return sqlite3.connect(sidecar)
+
+    def _load(self, db: sqlite3.Connection) -> None:
+        """Fill a new sidecar from the inventory file."""
+        db.executescript(_SCHEMA)
+        extension = os.path.splitext(self.path)[1].lower()
+        slices = _ndjson_slices(self.path) if extension in (".ndjson", ".jsonl") else _other_slices(self.path)
+        identities: Dict[str, Optional[str]] = {}
+        resource_number = 0
+        for n, (item, offset, length, body) in enumerate(slices):
+            db.execute(
+                "INSERT INTO slices VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (n, item["account"], item["region"], item["service"], offset, length, body),
+            )
+            if item["service"] not in identities:
+                identities[item["service"]] = self.identity_of(item["service"]) if self.identity_of else None
+            field = identities[item["service"]]
+            rows = []
+            attributes = []
+            for position, resource in enumerate(item["resources"]):
+                rows.append((resource_number, n, position, _resource_id(resource, field)))
+                for name in INDEXED_FIELDS:
+                    if isinstance(resource.get(name), (str, int, float)):
+                        attributes.append((resource_number, name, str(resource[name])))
+                resource_number += 1
+            db.executemany("INSERT INTO resources VALUES (?, ?, ?, ?)", rows)
+            db.executemany("INSERT INTO attributes VALUES (?, ?, ?)", attributes)
+        db.executescript(_INDEXES)
+        # Table statistics let SQLite start from whichever filter is most selective
+        db.execute("ANALYZE")
+        db.execute("INSERT INTO meta VALUES ('signature', ?)", (_signature(self.path),))
+        db.commit()
+
+    def close(self) -> None:
+        self._db.close()
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+    def _slice(self, n: int) -> Dict[str, Any]:
+        offset, length, body = self._db.execute("SELECT offset, length, body FROM slices WHERE n = ?", (n,)).fetchone()
+        return json.loads(body if body is not None else self._map[offset : offset + length])
+
+    def search(
+        self,
+        accounts: Sequence[str] = (),
+        regions: Sequence[str] = (),
+        services: Sequence[str] = (),
+        ids: Sequence[str] = (),
+        where: Optional[Dict[str, str]] = None,
+        limit: int = 0,
+    ) -> Iterator[Dict[str, Any]]:
+        """Yield matching resources as rows tagged with their account, region and service, in file order.
+
+        Each argument narrows the match; values may use `*` and `?` wildcards. `where` filters on any
+        resource field, using the index for `INDEXED_FIELDS` and checking other fields as slices are read.
+        """
+        conditions: List[str] = []
+        params: List[Any] = []
+        for column, values in (("s.account", accounts), ("s.region", regions), ("s.service", services)):
+            if values:
+                conditions.append("(" + " OR ".join(f"{column} GLOB ?" for _ in values) + ")")
+                params.extend(values)
+        if ids:
+            conditions.append("(" + " OR ".join("r.resource_id GLOB ?" for _ in ids) + ")")
+            params.extend(ids)
+        scanned = {}
+        for field, value in (where or {}).items():
+            if field in INDEXED_FIELDS:
+                conditions.append(
+                    "EXISTS (SELECT 1 FROM attributes WHERE resource = r.id AND field = ? AND value GLOB ?)"
+                )
+                params.extend([field, value])
+            else:
+                scanned[field] = value
+        sql = "SELECT r.slice, r.position FROM resources r JOIN slices s ON s.n = r.slice"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY r.slice, r.position"
+
+        found = 0
+        current: Tuple[int, Optional[Dict[str, Any]]] = (-1, None)
+        for n, position in self._db.execute(sql, params):
+            if current[0] != n:
+                current = (n, self._slice(n))
+            item = current[1]
+            resource = item["resources"][position]
+            if not all(fnmatch.fnmatchcase(str(resource.get(field)), value) for field, value in scanned.items()):
+                continue
+            yield {"account": item["account"], "region": item["region"], "service": item["service"], **resource}
+            found += 1
+            if limit and found >= limit:
+                return
+
+
+def parse_where(values: Optional[List[str]]) -> Dict[str, str]:
+    """Parse `Field=Value` filters, e.g. `State=stopped` or `Type=t3.*`."""
+    where = {}
+    for value in values or []:
+        field, separator, pattern = value.partition("=")
+        if not separator or not field:
+            raise ValueError(f"Invalid filter {value!r}: expected Field=Value")
+        where[field] = pattern
+    return where
@@ -0,0 +1,236 @@
+import hashlib
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlparse
+from cloudylist.clients import expected_clients
+from cloudylist.inventory import Inventory
+from cloudylist.log import get_logger
+from cloudylist.resources import GLOBAL, ResourceQuery
+from cloudylist.throttle import RequestScheduler
+from cloudylist.tracking import FAILED, TaskKey, TaskTracker
+from cloudylist.utils import configure_collection, iter_inventory, resolve_accounts
+
+logger = get_logger(__name__)
+
+# Defaults for the `serve` section of the config
+DEFAULT_TTL = 300
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+# Query parameters /inventory filters on, each matching a slice field
+FILTER_PARAMS = ("account", "region", "service")
+
+
+class _FailedTasks(TaskTracker):
+    """Collects the tasks that failed during a refresh, so their previous slices can be kept."""
+
+    def __init__(self):
+        self.failed: Set[TaskKey] = set()
+
+    def finished(self, key: TaskKey, status: str, slices: Any = None) -> None:
+        if status == FAILED:
+            self.failed.add(key)
+
+
+class InventoryStore:
+    """The latest slices for each service, replaced one service at a time.
+
+    Each service has a generation that only changes when a refresh changes its slices, so ETags
+    stay valid across refreshes that found nothing new. Slices are held in the compact form of an
+    `Inventory`, whose value table every refresh shares, and expanded only to answer a query.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._instance = uuid.uuid4().hex
+        self._inventory = Inventory()
+        self._slices: Dict[str, Dict[Tuple[str, str], Any]] = {}
+        self.generations: Dict[str, int] = {}
+        self.refreshed: Dict[str, float] = {}
+
+    def replace(self, service: str, slices: List[Dict[str, Any]], failed: Optional[Set[TaskKey]] = None) -> bool:
+        """Swap in a service's new slices, keeping earlier ones for tasks that failed. Returns True if changed."""
+        failed = failed or set()
+        new = {(item["account"], item["region"]): self._inventory.encode(item) for item in slices}
+        with self._lock:
+            old = self._slices.get(service, {})
+            for (account, region), item in old.items():
+                if (account, region, service) in failed or (account, GLOBAL, service) in failed:
+                    new.setdefault((account, region), item)
+            changed = service not in self._slices or new != old
+            self._slices[service] = new
+            if changed:
+                self.generations[service] = self.generations.get(service, 0) + 1
+            self.refreshed[service] = time.time()
+        return changed
+
+    def _matches(self, filters: Dict[str, List[str]], account: str, region: str, service: str) -> bool:
+        values = {"account": account, "region": region, "service": service}
+        return all(not accepted or values[name] in accepted for name, accepted in filters.items())
+
+    def etag(self, filters: Dict[str, List[str]]) -> str:
+        """Return an ETag for the slices matching `filters`, without building the response."""
+        with self._lock:
+            return self._etag(filters)
+
+    def _etag(self, filters: Dict[str, List[str]]) -> str:
+        services = [
+            service for service in sorted(self._slices) if not filters.get("service") or service in filters["service"]
+        ]
+        state = [
+            self._instance,
+            sorted(filters.items()),
+            [(service, self.generations[service]) for service in services],
+        ]
+        return '"' + hashlib.sha256(json.dumps(state).encode()).hexdigest()[:32] + '"'
+
+    def query(self, filters: Dict[str, List[str]]) -> Tuple[str, List[Dict[str, Any]]]:
+        """Return the ETag and the slices matching `filters`, in account, region, service order."""
+        with self._lock:
+            matched = [
+                (account, region, service, compact)
+                for service, by_key in self._slices.items()
+                for (account, region), compact in by_key.items()
+                if self._matches(filters, account, region, service)
+            ]
+            etag = self._etag(filters)
+        matched.sort(key=lambda match: match[:3])
+        return etag, [self._inventory.decode(match[3]) for match in matched]
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                service: {
+                    "generation": self.generations[service],
+                    "refreshed": self.refreshed[service],
+                    "slices": len(self._slices[service]),
+                }
+                for service in sorted(self._slices)
+            }
+
+
+class InventoryServer:
+    """Keeps an inventory in memory, refreshing each service on its own TTL from the `serve` config section.
+
+    One background thread per service re-collects it every `ttls[service]` (or `ttl`) seconds, so
+    many HTTP consumers share a single collection loop. The refreshes share one `RequestScheduler`,
+    and the process-wide credential cache and client pool are configured once, when the server starts,
+    so concurrent refreshes pace requests together and don't reconfigure each other's clients.
+    """
+
+    def __init__(self, config: Dict[str, Any], plugins: Any, store: Optional[InventoryStore] = None):
+        self.config = config
+        self.plugins = plugins
+        self.store = store or InventoryStore()
+        self.services = list(plugins.names())
+        self.scheduler = RequestScheduler(config.get("throttle"))
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def ttl(self, service: str) -> float:
+        settings = self.config.get("serve") or {}
+        return float((settings.get("ttls") or {}).get(service, settings.get("ttl", DEFAULT_TTL)))
+
+    def refresh(self, service: str) -> bool:
+        """Collect one service across every account and region and swap it into the store."""
+        tracker = _FailedTasks()
+        query = ResourceQuery(services=[service])
+        slices = list(
+            iter_inventory(self.config, self.plugins, query=query, trackers=[tracker], scheduler=self.scheduler)
+        )
+        changed = self.store.replace(service, slices, tracker.failed)
+        logger.info(f"Refreshed {service}: {len(slices)} slices, {'changed' if changed else 'unchanged'}")
+        return changed
+
+    def _run(self, service: str) -> None:
+        while not self._stop.is_set():
+            try:
+                self.refresh(service)
+            except Exception as e:
+                logger.error(f"Error refreshing {service}: {e}")
+            self._stop.wait(self.ttl(service))
+
+    def _expected_clients(self) -> int:
+        try:
+            accounts = len(resolve_accounts(self.config))
+        except Exception as e:
+            logger.warning(f"Could not list accounts to size the client pool, counting the listed ones: {e}")
+            accounts = len(self.config.get("accounts") or [])
+        regions = len(self.config["regions"])
+        return expected_clients(accounts * regions * len(self.services), accounts, regions)
+
+    def start(self) -> None:
+        """Configure the process for every refresh, then start one refresh thread per service; each
+        collects its service straight away.
+        """
+        configure_collection(self.config, self._expected_clients())
+        for service in self.services:
+            thread = threading.Thread(target=self._run, args=(service,), name=f"refresh-{service}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+
+    def ready(self) -> bool:
+        """Return True once every service has been collected at least once."""
+        return all(service in self.store.refreshed for service in self.services)
+
+    def http_server(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> ThreadingHTTPServer:
+        """Return an HTTP server answering /inventory and /health from the store; port 0 picks a free port."""
+        return ThreadingHTTPServer((host, port), _make_handler(self))
+
+
+def _filters(query_string: str) -> Dict[str, List[str]]:
+    """Read ?account=..&region=..&service=.. filters; each may repeat or hold comma separated values."""
+    params = parse_qs(query_string)
+    return {
+        name: sorted({value for raw in params.get(name, []) for value in raw.split(",") if value})
+        for name in FILTER_PARAMS
+    }
+
+
+def _make_handler(server: InventoryServer):
+    class InventoryHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/health":
+                self._send_json(200, {"ready": server.ready(), "services": server.store.status()})
+            elif url.path != "/inventory":
+                self._send_json(404, {"error": f"Not found: {url.path}"})
+            elif not server.ready():
+                self._send_json(503, {"error": "Inventory not collected yet"})
+            else:
+                self._send_inventory(_filters(url.query))
+
+        def _send_inventory(self, filters: Dict[str, List[str]]) -> None:
+            # Answer conditional requests before serialising anything
+            tags = [tag.strip() for tag in self.headers.get("If-None-Match", "").split(",") if tag.strip()]
+            etag = server.store.etag(filters)
+            if "*" in tags or etag in tags:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            etag, slices = server.store.query(filters)
+            self._send_json(200, slices, {"ETag": etag, "Cache-Control": "no-cache"})
+
+        def _send_json(self, status: int, body: Any, headers: Optional[Dict[str, str]] = None) -> None:
+            payload = json.dumps(body, default=str).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            logger.debug(f"{self.address_string()} {format % args}")
+
+    return InventoryHandler
@@ -0,0 +1,179 @@
+import hashlib
+import json
+import os
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+from cloudylist.output import read_inventory
+from cloudylist.resources import GLOBAL
+from cloudylist.tracking import DONE, FAILED, SKIPPED, TaskKey, TaskTracker
+
+# Written next to a sharded run's output, e.g. inventory-1.ndjson.manifest.json
+MANIFEST_SUFFIX = ".manifest.json"
+# When shards overlap, the best outcome recorded for a task wins
+_RANK = {FAILED: 0, SKIPPED: 1, DONE: 2}
+
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """Parse a shard given as `i/N`, with shards numbered from 1 to N."""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard {value!r}: expected i/N, e.g. 1/4") from None
+    if not 1 <= index <= count:
+        raise ValueError(f"Invalid shard {value!r}: i must be between 1 and N")
+    return index, count
+
+
+def shard_of(key: TaskKey, count: int) -> int:
+    """Return the shard, from 1 to `count`, a task belongs to. Stable across hosts and Python versions."""
+    digest = hashlib.sha256("\0".join(key).encode()).digest()
+    return int.from_bytes(digest[:8], "big") % count + 1
+
+
+def in_shard(key: TaskKey, shard: Optional[Tuple[int, int]]) -> bool:
+    return shard is None or shard_of(key, shard[1]) == shard[0]
+
+
+def workspace_keys(workspace: Dict[str, List[str]]) -> List[TaskKey]:
+    """Return every task in a work space: account-wide plugins once per account, regional ones per region."""
+    keys = []
+    for account_id in workspace["accounts"]:
+        keys.extend((account_id, GLOBAL, name) for name in workspace["account_plugins"])
+        for region in workspace["regions"]:
+            keys.extend((account_id, region, name) for name in workspace["regional_plugins"])
+    return keys
+
+
+def manifest_path(output: str) -> str:
+    return f"{output}{MANIFEST_SUFFIX}"
+
+
+class ShardManifest(TaskTracker):
+    """Records a sharded run's work space and the outcome of each of its tasks, for `merge_shards`.
+
+    Tasks that never report an outcome, e.g. because the run was interrupted, count as failed.
+    """
+
+    def __init__(self, shard: Tuple[int, int]):
+        self.shard = shard
+        self.workspace: Dict[str, List[str]] = {}
+        self.tasks: Dict[TaskKey, str] = {}
+
+    def start(self, workspace: Dict[str, List[str]], keys: List[TaskKey]) -> None:
+        self.workspace = workspace
+        self.tasks = {key: FAILED for key in keys}
+
+    def finished(self, key: TaskKey, status: str, slices: Any = None) -> None:
+        self.tasks[key] = status
+
+    def save(self, path: str) -> None:
+        raw = {
+            "shard": list(self.shard),
+            "workspace": self.workspace,
+            "tasks": [[*key, status] for key, status in self.tasks.items()],
+        }
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(raw, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "ShardManifest":
+        with open(path, "r") as f:
+            raw = json.load(f)
+        manifest = cls(tuple(raw["shard"]))
+        manifest.workspace = raw["workspace"]
+        manifest.tasks = {(account, region, service): status for account, region, service, status in raw["tasks"]}
+        return manifest
+
+
+def _normalise(workspace: Dict[str, List[str]]) -> Dict[str, List[str]]:
+    return {name: sorted(values) for name, values in workspace.items()}
+
+
+def check_shards(manifests: List[ShardManifest], expected: Optional[Dict[str, List[str]]] = None) -> List[str]:
+    """Return the problems that keep a set of shard manifests from covering their whole work space.
+
+    `expected` may give some of the work space (e.g. accounts and regions from the config) to check
+    the manifests against.
+    """
+    if not manifests:
+        return ["No shard manifests to merge"]
+    problems = []
+    counts = sorted({manifest.shard[1] for manifest in manifests})
+    if len(counts) > 1:
+        problems.append(f"Shards come from runs split {', '.join(map(str, counts))} ways")
+    workspace = _normalise(manifests[0].workspace)
+    for manifest in manifests:
+        if _normalise(manifest.workspace) != workspace:
+            problems.append(f"Shard {manifest.shard[0]}/{manifest.shard[1]} covers a different work space")
+    for name, values in (expected or {}).items():
+        if sorted(values) != workspace.get(name):
+            problems.append(f"The shards' {name} do not match the config")
+    missing = sorted(set(range(1, counts[-1] + 1)) - {manifest.shard[0] for manifest in manifests})
+    if missing:
+        problems.append(f"Missing shards: {', '.join(f'{index}/{counts[-1]}' for index in missing)}")
+
+    outcomes: Dict[TaskKey, str] = {}
+    for manifest in manifests:
+        for key, status in manifest.tasks.items():
+            if _RANK[status] > _RANK.get(outcomes.get(key), -1):
+                outcomes[key] = status
+    expected_keys = workspace_keys(workspace)
+    uncollected = [key for key in expected_keys if outcomes.get(key) not in (DONE, SKIPPED)]
+    if uncollected:
+        examples = ", ".join("/".join(key) for key in uncollected[:5])
+        problems.append(f"{len(uncollected)} of {len(expected_keys)} tasks were not collected, e.g. {examples}")
+    return problems
+
+
+def _resource_key(resource: Dict[str, Any], field: Optional[str]) -> str:
+    """Return what tells a resource apart within its slice: its ID, or its whole content without one."""
+    if field and resource.get(field) is not None:
+        return str(resource[field])
+    return json.dumps(resource, sort_keys=True, default=str)
+
+
+def overlapping_tasks(manifests: List[ShardManifest]) -> Set[TaskKey]:
+    """Return the tasks more than one shard manifest lists, whose slices may appear in several outputs."""
+    counts: Dict[TaskKey, int] = {}
+    for manifest in manifests:
+        for key in manifest.tasks:
+            counts[key] = counts.get(key, 0) + 1
+    return {key for key, count in counts.items() if count > 1}
+
+
+def merge_inventories(
+    paths: List[str],
+    identity_of: Optional[Callable[[str], Optional[str]]] = None,
+    shared: Optional[Set[TaskKey]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Stream inventory files into one, file by file, dropping resources already seen.
+
+    Resources are told apart within their (account, region, service) slice by the ID field `identity_of`
+    names for the service. Shards cover separate tasks, so a slice normally comes from one file and is
+    only deduplicated against itself; the keys of its resources are kept past it only if its task is in
+    `shared` (see `overlapping_tasks`), or for every slice when `shared` is None. A kept slice found again
+    in a later file is yielded again with just the resources it adds, or not at all if it adds none.
+    """
+    fields: Dict[str, Optional[str]] = {}
+    slices: Set[TaskKey] = set()
+    kept: Dict[TaskKey, Set[str]] = {}
+    for path in paths:
+        for item in read_inventory(path):
+            slice_key = (item["account"], item["region"], item["service"])
+            account, region, service = slice_key
+            if service not in fields:
+                fields[service] = identity_of(service) if identity_of else None
+            if shared is None or slice_key in shared or (account, GLOBAL, service) in shared:
+                seen = kept.setdefault(slice_key, set())
+            else:
+                seen = set()
+            resources = []
+            for resource in item["resources"]:
+                key = _resource_key(resource, fields[service])
+                if key not in seen:
+                    seen.add(key)
+                    resources.append(resource)
+            if resources or slice_key not in slices:
+                slices.add(slice_key)
+                yield {"account": account, "region": region, "service": service, "resources": resources}
@@ -0,0 +1,245 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from cloudylist.log import get_logger
+from cloudylist.resources import ResourceQuery
+from cloudylist.tracking import DONE, TaskKey, TaskTracker
+
+logger = get_logger(__name__)
+
+# Defaults for the `snapshots` section of the config
+DEFAULT_KEEP = 48
+# Kinds of change `SnapshotStore.diff` reports, in the order they are listed for each slice
+CHANGES = ("added", "removed", "modified")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started REAL NOT NULL,
+    scope TEXT NOT NULL,
+    complete INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS slices (
+    run INTEGER NOT NULL,
+    account TEXT NOT NULL,
+    region TEXT NOT NULL,
+    service TEXT NOT NULL,
+    task_region TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    PRIMARY KEY (run, account, region, service)
+);
+CREATE INDEX IF NOT EXISTS slices_by_hash ON slices (hash);
+CREATE TABLE IF NOT EXISTS resources (
+    slice_hash TEXT NOT NULL,
+    resource_id TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    body TEXT NOT NULL,
+    PRIMARY KEY (slice_hash, resource_id)
+);
+"""
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _body(resource: Dict[str, Any]) -> str:
+    return json.dumps(resource, sort_keys=True, default=str)
+
+
+def resource_id(resource: Dict[str, Any], field: Optional[str] = None) -> str:
+    """Return a resource's identity: its `field` if it has one, otherwise a hash of its content."""
+    if field and resource.get(field) is not None:
+        return str(resource[field])
+    return "sha256:" + _digest(_body(resource))
+
+
+def query_scope(query: Optional[ResourceQuery]) -> str:
+    """Describe what a run collected, so only runs that saw the same resources and fields are compared."""
+    if not query:
+        return "all"
+    scope = {"states": query.states, "types": query.types, "tags": query.tags, "fields": query.fields}
+    scope["services"] = sorted(query.services)
+    return json.dumps(scope, sort_keys=True)
+
+
+class SnapshotStore:
+    """Every run's slices in a local SQLite database, for finding what changed between runs.
+
+    A slice is stored as a hash of its resources, and the resources themselves once per distinct
+    slice hash, keyed by resource identity. Unchanged slices cost a row per run, and comparing two
+    runs only reads the resources of slices whose hashes differ. The newest `keep` runs are kept.
+    """
+
+    def __init__(self, path: str, keep: int = DEFAULT_KEEP):
+        self.path = path
+        self.keep = keep
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path)
+        self._db.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self._db.close()
+
+    def begin(self, scope: str) -> int:
+        """Start recording a run, returning its ID. It is ignored until `finish` marks it complete."""
+        with self._db:
+            return self._db.execute("INSERT INTO runs (started, scope) VALUES (?, ?)", (time.time(), scope)).lastrowid
+
+    def add(self, run: int, task_region: str, item: Dict[str, Any], id_field: Optional[str] = None) -> str:
+        """Record one slice of a run, storing its resources unless an identical slice is stored already."""
+        rows = {}
+        for resource in item["resources"]:
+            body = _body(resource)
+            rows.setdefault(resource_id(resource, id_field), (_digest(body), body))
+        slice_hash = _digest(json.dumps(sorted((key, value[0]) for key, value in rows.items())))
+        # Written in the run's transaction, committed by `finish`
+        self._db.executemany(
+            "INSERT OR IGNORE INTO resources (slice_hash, resource_id, hash, body) VALUES (?, ?, ?, ?)",
+            [(slice_hash, key, digest, body) for key, (digest, body) in rows.items()],
+        )
+        self._db.execute(
+            "INSERT OR REPLACE INTO slices VALUES (?, ?, ?, ?, ?, ?)",
+            (run, item["account"], item["region"], item["service"], task_region, slice_hash),
+        )
+        return slice_hash
+
+    def carry(self, run: int, previous: int, key: TaskKey) -> None:
+        """Copy a task's slices from the previous run, e.g. when it failed, so they don't show as removed."""
+        self._db.execute(
+            "INSERT OR REPLACE INTO slices SELECT ?, account, region, service, task_region, hash FROM slices "
+            "WHERE run = ? AND account = ? AND task_region = ? AND service = ?",
+            (run, previous, *key),
+        )
+
+    def finish(self, run: int) -> None:
+        """Mark a run complete and drop the oldest runs beyond `keep`, with any resources only they used."""
+        with self._db:
+            self._db.execute("UPDATE runs SET complete = 1 WHERE id = ?", (run,))
+            self._db.execute(
+                "DELETE FROM runs WHERE id NOT IN (SELECT id FROM runs ORDER BY id DESC LIMIT ?)", (self.keep,)
+            )
+            self._db.execute("DELETE FROM slices WHERE run NOT IN (SELECT id FROM runs)")
+            self._db.execute("DELETE FROM resources WHERE slice_hash NOT IN (SELECT hash FROM slices)")
+
+    def runs(self) -> List[Dict[str, Any]]:
+        """Return the stored runs, newest first."""
+        rows = self._db.execute(
+            "SELECT id, started, scope, complete, (SELECT COUNT(*) FROM slices WHERE run = id) "
+            "FROM runs ORDER BY id DESC"
+        )
+        keys = ("id", "started", "scope", "complete", "slices")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def latest(self, scope: Optional[str] = None, before: Optional[int] = None) -> Optional[int]:
+        """Return the newest complete run, optionally with the given scope and older than run `before`."""
+        sql = "SELECT id FROM runs WHERE complete = 1"
+        params: List[Any] = []
+        if scope is not None:
+            sql += " AND scope = ?"
+            params.append(scope)
+        if before is not None:
+            sql += " AND id < ?"
+            params.append(before)
+        row = self._db.execute(f"{sql} ORDER BY id DESC LIMIT 1", params).fetchone()
+        return row[0] if row else None
+
+    def scope_of(self, run: int) -> Optional[str]:
+        row = self._db.execute("SELECT scope FROM runs WHERE id = ?", (run,)).fetchone()
+        return row[0] if row else None
+
+    def _slices(self, run: Optional[int]) -> Dict[Tuple[str, str, str], str]:
+        if run is None:
+            return {}
+        rows = self._db.execute("SELECT account, region, service, hash FROM slices WHERE run = ?", (run,))
+        return {(account, region, service): slice_hash for account, region, service, slice_hash in rows}
+
+    def _resources(self, slice_hash: Optional[str]) -> Dict[str, Tuple[str, str]]:
+        if slice_hash is None:
+            return {}
+        rows = self._db.execute("SELECT resource_id, hash, body FROM resources WHERE slice_hash = ?", (slice_hash,))
+        return {key: (digest, body) for key, digest, body in rows}
+
+    def diff(self, old: Optional[int], new: int) -> Iterator[Dict[str, Any]]:
+        """Yield the resources added, removed or modified from run `old` (None for nothing) to run `new`.
+
+        Slices with the same hash in both runs are skipped without reading their resources. Each change
+        carries the account, region, service and ID of the resource, and its `resource` and `previous`
+        bodies (None where it did not exist).
+        """
+        old_slices = self._slices(old)
+        new_slices = self._slices(new)
+        for key in sorted(old_slices.keys() | new_slices.keys()):
+            if old_slices.get(key) == new_slices.get(key):
+                continue
+            before = self._resources(old_slices.get(key))
+            after = self._resources(new_slices.get(key))
+            changes = {change: [] for change in CHANGES}
+            for ident in sorted(before.keys() | after.keys()):
+                if ident not in before:
+                    changes["added"].append((ident, None, json.loads(after[ident][1])))
+                elif ident not in after:
+                    changes["removed"].append((ident, json.loads(before[ident][1]), None))
+                elif before[ident][0] != after[ident][0]:
+                    changes["modified"].append((ident, json.loads(before[ident][1]), json.loads(after[ident][1])))
+            account, region, service = key
+            for change in CHANGES:
+                for ident, previous, resource in changes[change]:
+                    yield {
+                        "change": change,
+                        "account": account,
+                        "region": region,
+                        "service": service,
+                        "id": ident,
+                        "resource": resource,
+                        "previous": previous,
+                    }
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "SnapshotStore":
+        return cls(os.path.expanduser(config["path"]), int(config.get("keep", DEFAULT_KEEP)))
+
+
+def configure_snapshots(config: Optional[Dict[str, Any]]) -> Optional[SnapshotStore]:
+    """Open the store named by the `snapshots` config section, or return None when runs aren't kept."""
+    if not config or not config.get("path"):
+        return None
+    return SnapshotStore.from_config(config)
+
+
+class SnapshotRecorder(TaskTracker):
+    """Records a run's slices in a `SnapshotStore` as they are collected.
+
+    Tasks that fail or are skipped keep their slices from the previous run of the same scope, so a
+    transient error does not look like every resource in it was removed. Call `finish` once the run
+    has been fully consumed; an unfinished run is never compared against.
+    """
+
+    def __init__(self, store: SnapshotStore, scope: str, identities: Dict[str, Optional[str]]):
+        self.store = store
+        self.scope = scope
+        self.identities = identities
+        self.run: Optional[int] = None
+        self.previous: Optional[int] = None
+
+    def start(self, workspace: Dict[str, List[str]], keys: List[TaskKey]) -> None:
+        self.run = self.store.begin(self.scope)
+        self.previous = self.store.latest(self.scope, before=self.run)
+
+    def finished(self, key: TaskKey, status: str, slices: Any = None) -> None:
+        if status == DONE:
+            for item in slices or ():
+                self.store.add(self.run, key[1], item, self.identities.get(key[2]))
+        elif self.previous is not None:
+            self.store.carry(self.run, self.previous, key)
+
+    def finish(self) -> Optional[int]:
+        """Mark the run complete, returning the previous run of the same scope to diff against, if any."""
+        if self.run is not None:
+            self.store.finish(self.run)
+            logger.info(f"Recorded snapshot {self.run} in {self.store.path}")
+        return self.previous
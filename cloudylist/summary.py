@@ -0,0 +1,77 @@
+import heapq
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+from cloudylist.tracking import DONE, FAILED, SKIPPED, TaskKey, TaskTracker
+
+# Groupings the table view can summarise by; "top" lists the largest (account, region, service) slices
+SUMMARY_GROUPS = ("account", "region", "service", "top")
+DEFAULT_GROUPS = ("account", "service", "top")
+DEFAULT_TOP = 10
+
+
+def parse_groups(value: str) -> Tuple[str, ...]:
+    """Parse comma-separated summary groups, e.g. `account,service,top`."""
+    groups = tuple(group.strip() for group in value.split(",") if group.strip())
+    unknown = [group for group in groups if group not in SUMMARY_GROUPS]
+    if unknown:
+        raise ValueError(f"Unknown summary groups: {', '.join(unknown)}")
+    return groups or DEFAULT_GROUPS
+
+
+class InventorySummary(TaskTracker):
+    """Counts slices and resources per account, region and service as slices arrive.
+
+    As a tracker it also follows how many of the run's tasks are done, failed or skipped. Each slice
+    costs a few counter updates and at most one push onto a heap of the `top` largest slices, so the
+    summary stays small however many slices there are.
+    """
+
+    def __init__(self, top: int = DEFAULT_TOP):
+        self.top = top
+        self.planned = 0
+        self.outcomes: Counter = Counter()
+        self.slices = 0
+        self.resources = 0
+        self._slices = {group: Counter() for group in SUMMARY_GROUPS if group != "top"}
+        self._resources = {group: Counter() for group in SUMMARY_GROUPS if group != "top"}
+        self._largest: List[Tuple[int, TaskKey]] = []
+
+    def start(self, workspace: Dict[str, List[str]], keys: List[TaskKey]) -> None:
+        self.planned += len(keys)
+
+    def finished(self, key: TaskKey, status: str, slices: Any = None) -> None:
+        self.outcomes[status] += 1
+
+    def add(self, item: Dict[str, Any]) -> None:
+        count = len(item["resources"])
+        self.slices += 1
+        self.resources += count
+        for group, slices in self._slices.items():
+            slices[item[group]] += 1
+            self._resources[group][item[group]] += count
+        entry = (count, (item["account"], item["region"], item["service"]))
+        if len(self._largest) < self.top:
+            heapq.heappush(self._largest, entry)
+        elif entry > self._largest[0]:
+            heapq.heapreplace(self._largest, entry)
+
+    def pending(self) -> int:
+        return max(self.planned - sum(self.outcomes.values()), 0)
+
+    def progress(self) -> Dict[str, int]:
+        return {
+            "planned": self.planned,
+            "done": self.outcomes[DONE],
+            "failed": self.outcomes[FAILED],
+            "skipped": self.outcomes[SKIPPED],
+            "pending": self.pending(),
+        }
+
+    def rows(self, group: str) -> Tuple[List[Tuple[str, int, int]], int]:
+        """Return a group's `top` (name, slices, resources) rows, most resources first, and how many were left out."""
+        if group == "top":
+            largest = sorted(self._largest, reverse=True)
+            return [("/".join(key), 1, count) for count, key in largest], max(self.slices - len(largest), 0)
+        resources = self._resources[group]
+        names = heapq.nsmallest(self.top, resources, key=lambda name: (-resources[name], name))
+        return [(name, self._slices[group][name], resources[name]) for name in names], len(resources) - len(names)
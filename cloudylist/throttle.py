@@ -0,0 +1,168 @@
+import random
+import threading
+import time
+from functools import partial
+from typing import Any, Dict, Optional, Tuple
+from cloudylist.log import get_logger
+
+logger = get_logger(__name__)
+
+THROTTLING_ERROR_CODES = {
+    "Throttling",
+    "ThrottlingException",
+    "ThrottledException",
+    "RequestThrottledException",
+    "TooManyRequestsException",
+    "ProvisionedThroughputExceededException",
+    "TransactionInProgressException",
+    "RequestLimitExceeded",
+    "BandwidthLimitExceeded",
+    "LimitExceededException",
+    "RequestThrottled",
+    "SlowDown",
+    "PriorRequestNotComplete",
+    "EC2ThrottledException",
+}
+
+# Defaults for the `throttle` section of the config
+DEFAULT_RATE = 10.0
+DEFAULT_MIN_RATE = 0.5
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_RETRY_BUDGET = 100
+DEFAULT_BASE_DELAY = 1.0
+DEFAULT_MAX_DELAY = 30.0
+
+# Clients are pooled across runs, so hooks are registered under fixed ids and replaced on each attach
+PACE_HOOK_ID = "cloudylist-scheduler-pace"
+FEEDBACK_HOOK_ID = "cloudylist-scheduler-feedback"
+
+
+def is_throttling_error(error: BaseException) -> bool:
+    """Return True if `error` is an AWS throttling response."""
+    from botocore.exceptions import ClientError
+
+    return isinstance(error, ClientError) and error.response.get("Error", {}).get("Code") in THROTTLING_ERROR_CODES
+
+
+class TokenBucket:
+    """A token bucket whose refill rate backs off when throttled and recovers on success."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None, min_rate: float = DEFAULT_MIN_RATE):
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take a token, sleeping until one is available. Returns the seconds spent waiting."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    def throttled(self) -> None:
+        """Halve the refill rate after a throttling response."""
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def succeeded(self) -> None:
+        """Creep the refill rate back towards its configured maximum."""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+class RequestScheduler:
+    """Paces AWS requests per (account, service, region) and retries throttled plugin calls.
+
+    Every HTTP request a client sends takes a token from the bucket for its key, and throttling
+    responses halve that bucket's rate. Plugin calls that still fail with a throttling error are
+    retried with full-jitter exponential backoff while the shared retry budget lasts.
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        config = config or {}
+        self.rate = float(config.get("rate", DEFAULT_RATE))
+        self.burst = config.get("burst")
+        self.min_rate = float(config.get("min_rate", DEFAULT_MIN_RATE))
+        self.service_rates = config.get("rates") or {}
+        self.max_attempts = int(config.get("max_attempts", DEFAULT_MAX_ATTEMPTS))
+        self.retry_budget = int(config.get("retry_budget", DEFAULT_RETRY_BUDGET))
+        self.base_delay = float(config.get("base_delay", DEFAULT_BASE_DELAY))
+        self.max_delay = float(config.get("max_delay", DEFAULT_MAX_DELAY))
+        self._lock = threading.Lock()
+        self._buckets: Dict[Tuple[str, str, str], TokenBucket] = {}
+        self._stats = {"requests": 0, "throttled": 0, "retries": 0, "dropped": 0, "throttled_seconds": 0.0}
+
+    def bucket(self, account_id: str, service: str, region: str) -> TokenBucket:
+        """Return the token bucket for an (account, service, region) key, creating it on first use."""
+        key = (account_id, service, region)
+        with self._lock:
+            if key not in self._buckets:
+                rate = float(self.service_rates.get(service, self.rate))
+                self._buckets[key] = TokenBucket(rate, self.burst, self.min_rate)
+            return self._buckets[key]
+
+    def attach(self, client: Any, account_id: str, service: str, region: str) -> Any:
+        """Register pacing and feedback hooks on a boto3 client, replacing any from an earlier run."""
+        bucket = self.bucket(account_id, service, region)
+        events = client.meta.events
+        events.unregister("before-send", unique_id=PACE_HOOK_ID)
+        events.unregister("needs-retry", unique_id=FEEDBACK_HOOK_ID)
+        events.register("before-send", partial(self._before_send, bucket), unique_id=PACE_HOOK_ID)
+        events.register_first("needs-retry", partial(self._after_attempt, bucket), unique_id=FEEDBACK_HOOK_ID)
+        return client
+
+    def _before_send(self, bucket: TokenBucket, **kwargs) -> None:
+        waited = bucket.acquire()
+        self._record(requests=1, throttled_seconds=waited)
+
+    def _after_attempt(self, bucket: TokenBucket, response: Any = None, **kwargs) -> None:
+        if response is None:
+            return
+        code = response[1].get("Error", {}).get("Code")
+        if code in THROTTLING_ERROR_CODES:
+            bucket.throttled()
+            self._record(throttled=1)
+        elif code is None:
+            bucket.succeeded()
+
+    def retry_delay(self, error: BaseException, attempt: int) -> Optional[float]:
+        """Return how long to back off before retrying a throttled call, or None to give up."""
+        if not is_throttling_error(error) or attempt + 1 >= self.max_attempts:
+            return None
+        with self._lock:
+            if self.retry_budget <= 0:
+                return None
+            self.retry_budget -= 1
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    def backoff(self, delay: float) -> None:
+        """Sleep for `delay` seconds and count it as throttled time."""
+        time.sleep(delay)
+        self._record(retries=1, throttled_seconds=delay)
+
+    def dropped(self) -> None:
+        """Record a slice that was given up on after throttling."""
+        self._record(dropped=1)
+
+    def _record(self, **counts: float) -> None:
+        with self._lock:
+            for name, value in counts.items():
+                self._stats[name] += value
+
+    def merge(self, stats: Dict[str, float]) -> None:
+        """Add the counters from another scheduler's `stats`, e.g. one in a worker process."""
+        self._record(**{name: value for name, value in stats.items() if name in self._stats})
+
+    def stats(self) -> Dict[str, float]:
+        """Return request, throttle and retry counters, plus the seconds spent throttled."""
+        with self._lock:
+            return dict(self._stats)
@@ -0,0 +1,25 @@
+from typing import Any, Dict, List, Tuple
+
+# A unit of collection work: (account, region, service); account-wide plugins use the "global" region
+TaskKey = Tuple[str, str, str]
+
+# Task outcomes reported to trackers
+DONE = "done"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+
+class TaskTracker:
+    """Receives the task plan and every task's outcome from `iter_inventory`.
+
+    `start` gets the whole work space (accounts, regions and plugins by scope) and the keys this run
+    will handle. `finished` is then called once per key with DONE and the slices it produced, FAILED
+    (role or plugin error) or SKIPPED (left out by the region index). Keys that never reach a plugin
+    are reported first, the rest as their slices are yielded. The base class ignores both.
+    """
+
+    def start(self, workspace: Dict[str, List[str]], keys: List[TaskKey]) -> None:
+        pass
+
+    def finished(self, key: TaskKey, status: str, slices: Any = None) -> None:
+        pass
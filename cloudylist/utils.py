@@ -1,20 +1,31 @@
-import logging
-import boto3
-import yaml
-from botocore.exceptions import ClientError
-from typing import List, Dict, Any
-
-
-# Configure logging
-def get_logger(name: str) -> logging.Logger:
-    logger = logging.getLogger(name)
-    if not logger.handlers:
-        handler = logging.StreamHandler()
-        formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-        handler.setFormatter(formatter)
-        logger.addHandler(handler)
-        logger.setLevel(logging.INFO)
-    return logger
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from typing import List, Dict, Any, Iterator, Optional, Sequence, Tuple
+from cloudylist.aggregator import AggregatorBackend, configure_backend
+from cloudylist.clients import configure_client_pool, expected_clients, get_client_pool
+from cloudylist.concurrency import TaskLimiter, get_concurrency_settings, ordered_map
+from cloudylist.credentials import (
+    RoleFailures,
+    configure_credential_cache,
+    configure_role_failures,
+    get_credential_cache,
+    get_role_failures,
+    is_role_failure,
+)
+from cloudylist.enrichment import Enricher, configure_enrichment
+from cloudylist.inventory import Inventory
+from cloudylist.journal import Checkpoint
+from cloudylist.log import get_logger
+from cloudylist.metrics import get_metrics
+from cloudylist.organizations import OrganizationSource, configure_organization
+from cloudylist.plugins import get_plugin
+from cloudylist.processes import process_map
+from cloudylist.regions import RegionIndex, configure_region_index, describe_opt_in
+from cloudylist.resources import GLOBAL, PARTITIONED, REGIONAL, ResourceQuery, get_filters, get_scope
+from cloudylist.shard import in_shard, workspace_keys
+from cloudylist.throttle import RequestScheduler, is_throttling_error
+from cloudylist.tracking import DONE, FAILED, SKIPPED, TaskKey, TaskTracker
 
 
 logger = get_logger(__name__)
@@ -22,59 +33,720 @@ logger = get_logger(__name__)
 
 def load_config(config_file: str = "config.yml") -> Dict[str, Any]:
     """Load configuration from a YAML file."""
+    import yaml
+
     with open(config_file, "r") as f:
         return yaml.safe_load(f)
 
 
+@lru_cache(maxsize=1)
+def _caller_identity() -> str:
+    """Return the access key ID of the runner's own credentials, which roles are assumed with.
+
+    It is read from the local credential chain rather than asked of STS, and only once per process.
+    """
+    import boto3
+
+    credentials = boto3.Session().get_credentials()
+    return credentials.access_key if credentials else ""
+
+
 def assume_role(account_id: str, role_name: str) -> Dict[str, str]:
-    """Assume an IAM role in a target AWS account."""
-    sts_client = boto3.client("sts")
+    """Assume an IAM role in a target AWS account, reusing cached credentials until they near expiry.
+
+    Once they do, the clients pooled for them are evicted along with them.
+    """
     role_arn = f"arn:aws:iam::{account_id}:role/{role_name}"
+    caller = _caller_identity()
+    cache = get_credential_cache()
+    credentials = cache.get(caller, role_arn)
+    if credentials:
+        return credentials
+    stale = cache.pop(caller, role_arn)
+    if stale is not None:
+        # Clients built from the expiring credentials would only go on to fail; in-flight calls keep theirs
+        get_client_pool().evict(stale["AccessKeyId"])
+    import boto3
+    from botocore.exceptions import ClientError
+
+    sts_client = get_metrics().attach(boto3.client("sts"), account_id, "sts", "global")
     try:
         response = sts_client.assume_role(RoleArn=role_arn, RoleSessionName="MultiAccountInventorySession")
+        cache.put(caller, role_arn, response["Credentials"])
         return response["Credentials"]
     except ClientError as e:
         logger.error(f"Failed to assume role {role_arn}: {e}")
         raise
 
 
-def get_boto3_client(service: str, credentials: Dict[str, str], region: str) -> boto3.client:
-    """Return a Boto3 client for a specific service."""
-    return boto3.client(
-        service,
-        aws_access_key_id=credentials["AccessKeyId"],
-        aws_secret_access_key=credentials["SecretAccessKey"],
-        aws_session_token=credentials["SessionToken"],
-        region_name=region,
-    )
+def get_boto3_client(service: str, credentials: Dict[str, str], region: str) -> Any:
+    """Return a Boto3 client for a specific service, reused from the process-wide client pool."""
+    return get_client_pool().get_client(service, credentials, region)
 
 
-def collect_inventory(config: Dict[str, Any], plugins: Any) -> List[Dict[str, Any]]:
-    """Collect inventory across accounts and regions using plugins."""
-    inventory = []
-    for account in config["accounts"]:
-        try:
-            logger.info(f"Assuming role for account: {account['account_id']}")
+def _assume_account_role(account: Dict[str, str], failures: Optional[RoleFailures] = None) -> Optional[Dict[str, str]]:
+    """Assume the inventory role for one account, returning None on failure.
+
+    With `failures`, roles that failed recently are not tried again until their backoff has passed,
+    and each refusal of the role itself (see `cloudylist.credentials.is_role_failure`) extends it.
+    """
+    role_arn = f"arn:aws:iam::{account['account_id']}:role/{account['role_name']}"
+    retry_at = failures.retry_at(role_arn) if failures is not None else None
+    if retry_at is not None:
+        logger.warning(
+            f"Skipping account {account['account_id']}: assuming its role failed recently, "
+            f"next attempt after {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(retry_at))}"
+        )
+        return None
+    try:
+        logger.info(f"Assuming role for account: {account['account_id']}")
+        with get_metrics().stage("assume_role", account=account["account_id"]):
             credentials = assume_role(account["account_id"], account["role_name"])
+    except Exception as e:
+        logger.error(f"Error assuming role for account {account['account_id']}: {e}")
+        if failures is not None and is_role_failure(e):
+            failures.failed(role_arn)
+        return None
+    if failures is not None:
+        failures.succeeded(role_arn)
+    return credentials
+
+
+def _organizations_client(source: OrganizationSource) -> Any:
+    """Return an Organizations client, through the source's administrator role when it names one."""
+    import boto3
+
+    if source.account_id and source.admin_role_name:
+        credentials = assume_role(source.account_id, source.admin_role_name)
+        client = get_boto3_client("organizations", credentials, "us-east-1")
+    else:
+        client = boto3.client("organizations", region_name="us-east-1")
+    return get_metrics().attach(client, source.account_id or "default", "organizations", "global")
+
+
+def resolve_accounts(config: Dict[str, Any]) -> List[Dict[str, str]]:
+    """Return the accounts to inventory: those listed under `accounts` and any found by the `organization` section.
+
+    Listed accounts keep their own role name when the organization has them too.
+    """
+    accounts = list(config.get("accounts") or [])
+    source = configure_organization(config.get("organization"))
+    if source is None:
+        return accounts
+    listed = {account["account_id"] for account in accounts}
+    discovered = source.accounts(partial(_organizations_client, source))
+    return accounts + [account for account in discovered if account["account_id"] not in listed]
+
+
+def _account_regions(
+    index: RegionIndex,
+    regions: List[str],
+    all_regions: bool,
+    account: Dict[str, str],
+    credentials: Optional[Dict[str, str]],
+) -> List[str]:
+    """Return the configured regions worth querying for one account, refreshing its opt-in status if stale."""
+    if credentials is None:
+        return []
+    account_id = account["account_id"]
+    if index.needs_opt_in(account_id):
+        try:
+            client = get_boto3_client("ec2", credentials, regions[0])
+            get_metrics().attach(client, account_id, "ec2", regions[0])
+            index.set_opt_in(account_id, describe_opt_in(client))
+        except Exception as e:
+            logger.warning(f"Could not describe regions for account {account_id}: {e}")
+    if all_regions:
+        return list(regions)
+    selected = index.select(account_id, regions)
+    if len(selected) < len(regions):
+        skipped = ", ".join(region for region in regions if region not in selected)
+        logger.info(f"Skipping disabled or empty regions for account {account_id}: {skipped}")
+    return selected
+
+
+def _record_regions(
+    index: RegionIndex,
+    progress: Dict[Any, List[Any]],
+    task: tuple,
+    slices: Optional[List[Dict[str, Any]]],
+    regional: bool,
+) -> None:
+    """Update the region index once every regional plugin has finished in a region.
+
+    `progress` maps (account, region) to [regional tasks pending, resources found, any task failed].
+    """
+    account_id, region = task[1], task[3]
+    if not regional:
+        # Partitioned plugins (S3 buckets) show a region is in use even when no regional plugin found anything there
+        for item in slices or ():
+            if (account_id, item["region"]) in progress:
+                progress[(account_id, item["region"])][1] += len(item["resources"])
+        return
+    state = progress[(account_id, region)]
+    state[0] -= 1
+    if slices is None:
+        state[2] = True
+    else:
+        state[1] += sum(len(item["resources"]) for item in slices)
+    if state[0] == 0 and not state[2]:
+        index.record(account_id, region, state[1] > 0)
+
+
+def _partition(
+    account_id: str, plugin_name: str, resources: List[Dict[str, Any]], partition_key: str
+) -> List[Dict[str, Any]]:
+    """Split a partitioned plugin's resources into one slice per region, in region order."""
+    partitions: Dict[str, List[Dict[str, Any]]] = {}
+    for resource in resources:
+        partitions.setdefault(resource.get(partition_key) or GLOBAL, []).append(resource)
+    return [
+        {"account": account_id, "region": region, "service": plugin_name, "resources": partitions[region]}
+        for region in sorted(partitions)
+    ]
+
+
+def _make_slices(
+    account_id: str,
+    region: str,
+    plugin_name: str,
+    plugin: Any,
+    resources: List[Dict[str, Any]],
+    query: Optional[ResourceQuery] = None,
+) -> List[Dict[str, Any]]:
+    """Wrap a plugin's resources in slices: one per region found for partitioned plugins, otherwise one."""
+    kind = get_scope(plugin)
+    if kind == PARTITIONED:
+        slices = _partition(account_id, plugin_name, resources, plugin.partition_key)
+        if query and query.fields:
+            for item in slices:
+                item["resources"] = [query.project(resource) for resource in item["resources"]]
+        return slices
+    return [
+        {
+            "account": account_id,
+            "region": GLOBAL if kind == GLOBAL else region,
+            "service": plugin_name,
+            "resources": resources,
+        }
+    ]
+
+
+def _run_plugin(plugin: Any, client: Any, query: Optional[ResourceQuery]) -> List[Dict[str, Any]]:
+    """Run a plugin, handing the query to plugins that take one and projecting the fields of the rest."""
+    if not query:
+        return list(plugin(client))
+    if get_scope(plugin) == PARTITIONED:
+        # Keep the field the resources are split on until they have been partitioned
+        query = query.including(plugin.partition_key)
+    if get_filters(plugin) is None:
+        return [query.project(resource) for resource in plugin(client)]
+    return list(plugin(client, query))
+
+
+def _collection_query(
+    plugin: Any, query: Optional[ResourceQuery], enricher: Optional[Enricher]
+) -> Optional[ResourceQuery]:
+    """Ask the plugin for the enabled detail fields, and widen the query's projection with the fields the
+    plugin's enrichment lookups are keyed on.
+    """
+    if enricher is None:
+        return query
+    details = enricher.wanted(query)
+    if details:
+        query = (query or ResourceQuery()).with_details(details)
+    if not query:
+        return query
+    for key in enricher.keys(plugin, query):
+        query = query.including(key)
+    return query
+
+
+def _widened(collect: Optional[ResourceQuery], query: Optional[ResourceQuery]) -> bool:
+    """Return True if a task kept fields beyond the query's projection, to be dropped after enrichment."""
+    return bool(query and query.fields) and collect.fields != query.fields
+
+
+def _project_slices(slices: List[Dict[str, Any]], query: ResourceQuery) -> None:
+    """Project each slice's resources to the query's fields in place, once enrichment is done with them."""
+    for item in slices:
+        item["resources"] = [query.project(resource) for resource in item["resources"]]
+
+
+def _enrich_slices(
+    enricher: Enricher,
+    scheduler: RequestScheduler,
+    account_id: str,
+    credentials: Dict[str, str],
+    region: str,
+    plugin_name: str,
+    plugin: Any,
+    slices: List[Dict[str, Any]],
+    query: Optional[ResourceQuery] = None,
+) -> None:
+    """Run a task's enrichment lookups, through clients paced and instrumented like the plugin's.
+
+    The slices must have been collected with `_collection_query`, so they still hold the lookups' keys;
+    they are projected to the query's fields afterwards.
+    """
+
+    def get_client(service: str, lookup_region: str) -> Any:
+        client = get_boto3_client(service, credentials, lookup_region)
+        scheduler.attach(client, account_id, service, lookup_region)
+        get_metrics().attach(client, account_id, service, lookup_region)
+        return client
+
+    enricher.enrich(slices, plugin_name, plugin, get_client, region, query)
+    if _widened(_collection_query(plugin, query, enricher), query):
+        _project_slices(slices, query)
+
+
+def _query_plugin(
+    scheduler: RequestScheduler,
+    account_id: str,
+    credentials: Dict[str, str],
+    region: str,
+    plugin_name: str,
+    plugin: Any,
+    query: Optional[ResourceQuery] = None,
+    enricher: Optional[Enricher] = None,
+) -> Optional[List[Dict[str, Any]]]:
+    """Run one plugin for one account and region, returning its slices, or None if it failed.
+
+    Plugins may return a list or yield resources page by page; either way the slice is gathered here,
+    on the worker thread, so throttled pages are retried with the rest of the slice. Global plugins
+    produce one slice under the "global" region, partitioned plugins one slice per region found. With
+    an `enricher`, the slices' detail fields are looked up before they are returned.
+    """
+    collect = _collection_query(plugin, query, enricher)
+    metrics = get_metrics()
+    labels = {"account": account_id, "region": region, "service": plugin_name}
+    attempt = 0
+    while True:
+        try:
+            logger.info(f"Querying plugin: {plugin_name} in region: {region} for account: {account_id}")
+            with metrics.stage("client", service=plugin_name):
+                client = get_boto3_client(plugin_name, credentials, region)
+            scheduler.attach(client, account_id, plugin_name, region)
+            metrics.attach(client, account_id, plugin_name, region)
+            with metrics.stage("plugin", **labels):
+                resources = _run_plugin(plugin, client, collect)
+            slices = _make_slices(account_id, region, plugin_name, plugin, resources, collect)
+            if enricher is not None:
+                _enrich_slices(enricher, scheduler, account_id, credentials, region, plugin_name, plugin, slices, query)
+            return slices
         except Exception as e:
-            logger.error(f"Error assuming role for account {account['account_id']}: {e}")
+            delay = scheduler.retry_delay(e, attempt)
+            if delay is None:
+                if is_throttling_error(e):
+                    scheduler.dropped()
+                metrics.inc("slices_failed_total", **labels)
+                logger.error(f"Error querying {plugin_name} in {region} for account {account_id}: {e}")
+                return None
+            logger.warning(
+                f"Throttled querying {plugin_name} in {region} for account {account_id}, "
+                f"retrying in {delay:.1f}s (attempt {attempt + 1})"
+            )
+            metrics.inc("slice_retries_total", **labels)
+            scheduler.backoff(delay)
+            attempt += 1
+
+
+def _aggregated_slices(
+    scheduler: RequestScheduler,
+    account_id: str,
+    credentials: Optional[Dict[str, str]],
+    region: str,
+    plugin_name: str,
+    plugin: Any,
+    query: Optional[ResourceQuery],
+    enricher: Optional[Enricher],
+    resources: List[Dict[str, Any]],
+) -> List[Dict[str, Any]]:
+    """Wrap one task's aggregator records in slices, enriching them if the account's role could be assumed."""
+    collect = _collection_query(plugin, query, enricher)
+    slices = _make_slices(account_id, region, plugin_name, plugin, resources, collect)
+    if enricher is None or not enricher.keys(plugin, query):
+        return slices
+    if credentials is None:
+        logger.warning(f"Not enriching {plugin_name} in {region} for account {account_id}: no credentials")
+        if _widened(collect, query):
+            _project_slices(slices, query)
+        return slices
+    _enrich_slices(enricher, scheduler, account_id, credentials, region, plugin_name, plugin, slices, query)
+    return slices
+
+
+def _aggregator_client(backend: AggregatorBackend) -> Any:
+    """Return a Config client for the aggregator, assuming the configured role if there is one."""
+    if backend.account_id:
+        credentials = assume_role(backend.account_id, backend.role_name)
+        client = get_boto3_client("config", credentials, backend.region)
+    else:
+        import boto3
+
+        client = boto3.client("config", region_name=backend.region)
+    return get_metrics().attach(client, backend.account_id or "aggregator", "config", backend.region)
+
+
+def _fetch_aggregated(
+    backend: AggregatorBackend,
+    plugins: Any,
+    plugin_names: List[str],
+    accounts: List[str],
+    regions: List[str],
+    query: Optional[ResourceQuery],
+    enricher: Optional[Enricher] = None,
+) -> Dict[str, Dict[Tuple[str, str], List[Dict[str, Any]]]]:
+    """Read every plugin the aggregator supports, returning records by plugin and (account, region).
+
+    Plugins whose query fails are left out, so they fall back to running directly.
+    """
+    supported = [name for name in plugin_names if backend.supports(plugins[name].plugin, query)]
+    if not supported or not accounts:
+        return {}
+    fetched = {}
+    try:
+        client = _aggregator_client(backend)
+    except Exception as e:
+        logger.warning(f"Could not reach aggregator {backend.aggregator_name}, querying plugins directly: {e}")
+        return {}
+    for name in supported:
+        try:
+            logger.info(f"Querying aggregator {backend.aggregator_name} for plugin: {name}")
+            with get_metrics().stage("aggregator", service=name):
+                plugin = plugins[name].plugin
+                collect = _collection_query(plugin, query, enricher)
+                fetched[name] = backend.fetch(client, plugin, accounts, regions, collect)
+        except Exception as e:
+            logger.warning(f"Error querying aggregator for {name}, querying the plugin directly: {e}")
+    return fetched
+
+
+def _select_plugins(plugins: Any, query: Optional[ResourceQuery]) -> List[str]:
+    """Return the names of the plugins to run: those the query asks for that load and can apply its filters."""
+    plugin_names = list(plugins.names())
+    if query and query.services:
+        plugin_names = [name for name in plugin_names if name in query.services]
+    # A plugin whose module has gone away since the plugin index was written is left out, not fatal
+    plugin_names = [name for name in plugin_names if get_plugin(plugins, name) is not None]
+    if query and query.requested():
+        unsupported = [name for name in plugin_names if not query.supported_by(plugins[name].plugin)]
+        if unsupported:
+            logger.info(f"Skipping plugins that cannot filter on {', '.join(query.requested())}: {unsupported}")
+        plugin_names = [name for name in plugin_names if name not in unsupported]
+    return plugin_names
+
+
+def _plan_tasks(
+    config: Dict[str, Any],
+    accounts: List[Dict[str, str]],
+    plugins: Any,
+    plugin_names: List[str],
+    shard: Optional[Tuple[int, int]],
+    checkpoint: Optional[Checkpoint],
+) -> Tuple[Dict[str, Any], List[TaskKey]]:
+    """Return the run's workspace and the (account, region, service) tasks left to it in this shard."""
+    regional_plugins = [name for name in plugin_names if get_scope(plugins[name].plugin) == REGIONAL]
+    account_plugins = [name for name in plugin_names if name not in regional_plugins]
+    workspace = {
+        "accounts": [account["account_id"] for account in accounts],
+        "regions": list(config["regions"]),
+        "account_plugins": account_plugins,
+        "regional_plugins": regional_plugins,
+    }
+    planned = [
+        key
+        for key in workspace_keys(workspace)
+        if in_shard(key, shard) and (checkpoint is None or checkpoint.wanted(key))
+    ]
+    return workspace, planned
+
+
+def _assume_roles(
+    config: Dict[str, Any],
+    accounts: List[Dict[str, str]],
+    settings: Dict[str, Any],
+    role_failures: Optional[RoleFailures],
+    region_index: Optional[RegionIndex],
+    all_regions: bool,
+) -> Tuple[Dict[str, Dict[str, str]], Dict[str, List[str]]]:
+    """Assume each account's role and pick the regions worth querying in it, concurrently.
+
+    Returns the credentials of the accounts whose role was assumed, and the regions of every account.
+    """
+    with ThreadPoolExecutor(max_workers=settings["max_workers"]) as executor:
+        assume = partial(_assume_account_role, failures=role_failures)
+        credentials_by_account = list(executor.map(assume, accounts))
+        if region_index is None:
+            regions_by_account = [config["regions"]] * len(accounts)
+        else:
+            select = partial(_account_regions, region_index, config["regions"], all_regions)
+            regions_by_account = list(executor.map(select, accounts, credentials_by_account))
+    credentials_of = {
+        account["account_id"]: credentials
+        for account, credentials in zip(accounts, credentials_by_account)
+        if credentials is not None
+    }
+    regions_of = {account["account_id"]: regions for account, regions in zip(accounts, regions_by_account)}
+    return credentials_of, regions_of
+
+
+def _build_tasks(
+    config: Dict[str, Any],
+    plugins: Any,
+    planned: List[TaskKey],
+    replayed: set,
+    credentials_of: Dict[str, Dict[str, str]],
+    regions_of: Dict[str, List[str]],
+    aggregated: Dict[str, Any],
+    trackers: Sequence[TaskTracker],
+    scheduler: RequestScheduler,
+    query: Optional[ResourceQuery],
+    enricher: Optional[Enricher],
+) -> Tuple[List[Optional[tuple]], List[TaskKey], Dict[Any, List[Any]]]:
+    """Turn the planned keys into tasks, grouped by account, with None for those the checkpoint replays.
+
+    Tasks that can't run, for want of credentials or in a skipped region, are reported to the trackers
+    and left out. Also returns the `progress` of each (account, region) for `_record_regions`.
+    """
+    planned_by_account: Dict[str, List[TaskKey]] = {}
+    for key in planned:
+        planned_by_account.setdefault(key[0], []).append(key)
+    tasks = []
+    keys = []
+    progress: Dict[Any, List[Any]] = {}
+    for account_id, account_keys in planned_by_account.items():
+        credentials = credentials_of.get(account_id)
+        # Without credentials there was no opt-in lookup, so aggregated tasks keep every configured region
+        regions = regions_of[account_id] if credentials is not None else config["regions"]
+        for key in account_keys:
+            if key in replayed:
+                tasks.append(None)
+                keys.append(key)
+                continue
+            failed = credentials is None and key[2] not in aggregated
+            if failed or (key[1] != GLOBAL and key[1] not in regions):
+                for tracker in trackers:
+                    tracker.finished(key, FAILED if failed else SKIPPED)
+                continue
+            plugin = plugins[key[2]].plugin
+            region = config["regions"][0] if key[1] == GLOBAL else key[1]
+            tasks.append((scheduler, account_id, credentials, region, key[2], plugin, query, enricher))
+            keys.append(key)
+            if key[1] != GLOBAL:
+                progress.setdefault((account_id, region), [0, 0, False])[0] += 1
+    return tasks, keys, progress
+
+
+def _dispatch_tasks(
+    config: Dict[str, Any],
+    settings: Dict[str, Any],
+    scheduler: RequestScheduler,
+    tasks: List[Optional[tuple]],
+    keys: List[TaskKey],
+    aggregated: Dict[str, Any],
+) -> Tuple[Iterator[Any], Iterator[Any]]:
+    """Start running the tasks, returning the slices of those queried directly and of those read from
+    the aggregator, each in task order.
+    """
+    direct = [task for task, key in zip(tasks, keys) if task is not None and key[2] not in aggregated]
+    slots = [(task[1], task[3]) for task in direct]
+    if settings["processes"] and direct:
+        # Workers build their own scheduler and enricher; the tasks carry everything else
+        work = [task[1:7] for task in direct]
+        results = process_map(_query_plugin, work, slots, config, settings, scheduler)
+    else:
+        limiter = TaskLimiter(settings["per_account"], settings["per_region"])
+        results = ordered_map(
+            _query_plugin, direct, slots, settings["max_workers"], limiter=limiter, window=settings["window"]
+        )
+    # Aggregator records are already here; only their enrichment lookups are left to run on the pool
+    from_aggregator = [
+        (*task, aggregated[key[2]].get((key[0], key[1]), []))
+        for task, key in zip(tasks, keys)
+        if task is not None and key[2] in aggregated
+    ]
+    aggregated_results = ordered_map(
+        _aggregated_slices,
+        from_aggregator,
+        [(task[1], task[3]) for task in from_aggregator],
+        settings["max_workers"],
+        window=settings["window"],
+    )
+    return results, aggregated_results
+
+
+def _track_tasks(
+    tasks: List[Optional[tuple]],
+    keys: List[TaskKey],
+    results: Iterator[Any],
+    aggregated_results: Iterator[Any],
+    aggregated: Dict[str, Any],
+    trackers: Sequence[TaskTracker],
+    checkpoint: Optional[Checkpoint],
+    region_index: Optional[RegionIndex],
+    progress: Dict[Any, List[Any]],
+) -> Iterator[Dict[str, Any]]:
+    """Yield each task's slices in task order, reporting its outcome to the trackers.
+
+    Replayed tasks come from the checkpoint. With a `region_index`, what each region turned out to
+    hold is recorded and the index saved at the end.
+    """
+    for task, key in zip(tasks, keys):
+        if task is None:
+            status, slices = checkpoint.replay(key)
+            for tracker in trackers:
+                tracker.finished(key, status, slices)
+            yield from slices
             continue
+        slices = next(aggregated_results if key[2] in aggregated else results)
+        if region_index is not None:
+            _record_regions(region_index, progress, task, slices, key[1] != GLOBAL)
+        for tracker in trackers:
+            tracker.finished(key, FAILED if slices is None else DONE, slices)
+        yield from slices or ()
+    if region_index is not None:
+        region_index.save()
+
+
+def _log_throttling(scheduler: RequestScheduler) -> None:
+    """Warn about any throttling a run's scheduler saw."""
+    stats = scheduler.stats()
+    if stats["throttled"] or stats["retries"] or stats["dropped"]:
+        logger.warning(
+            f"Throttling: {stats['throttled']} throttled responses, {stats['retries']} retries, "
+            f"{stats['dropped']} slices dropped, {stats['throttled_seconds']:.1f}s spent throttled"
+        )
+
+
+def configure_collection(config: Dict[str, Any], expected: Optional[int] = None) -> None:
+    """Apply the process-wide sections of the config, the `credential_cache`, `role_failures` and
+    `clients`, for runs that share a scheduler; `expected` sizes the client pool (see
+    `cloudylist.clients.expected_clients`).
+    """
+    configure_credential_cache(config.get("credential_cache"))
+    configure_role_failures(config.get("role_failures"))
+    configure_client_pool(config.get("clients"), expected)
+
+
+def iter_inventory(
+    config: Dict[str, Any],
+    plugins: Any,
+    all_regions: bool = False,
+    query: Optional[ResourceQuery] = None,
+    shard: Optional[Tuple[int, int]] = None,
+    trackers: Sequence[TaskTracker] = (),
+    checkpoint: Optional[Checkpoint] = None,
+    scheduler: Optional[RequestScheduler] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Collect inventory across accounts and regions using plugins, yielding one slice at a time.
+
+    Roles are assumed and plugins queried concurrently, bounded by the `concurrency` section of the
+    config (`max_workers`, `per_account`, `per_region`, `window`). Requests are paced and throttled
+    calls retried according to the `throttle` section. Assumed-role credentials and clients are
+    reused according to the `credential_cache` and `clients` sections, and failing roles are
+    remembered in one process-wide `role_failures` cache. API calls and stages are
+    recorded in the process-wide registry from `cloudylist.metrics.get_metrics`. A caller running
+    several collections at once passes one shared `scheduler` and applies the process-wide sections
+    itself, once, with `configure_collection`; each run otherwise does so with a scheduler of its own.
+    With `processes` set in the `concurrency` section, plugins are queried in that many worker
+    processes instead, each account on one of them (see `cloudylist.processes.process_map`).
+
+    Accounts are those listed under `accounts` plus, with an `organization` section, the ACTIVE accounts
+    of the organization (see `cloudylist.organizations.OrganizationSource`). With a `role_failures`
+    section, accounts whose role recently failed to be assumed are skipped, with backoff, and reported
+    as failed (see `cloudylist.credentials.RoleFailures`).
+
+    With a `region_index` section, regions an account has not opted in to, or where nothing was found
+    recently, are skipped (see `cloudylist.regions.RegionIndex`); `all_regions` queries them anyway.
+
+    A `query` narrows the plugins run, the resources returned and the fields kept. Plugins that
+    cannot apply one of its filters are not run at all. A `shard` (i, N) runs only the (account,
+    region, service) tasks hashed to shard i of N, and `trackers` are told the plan and each task's
+    outcome. A `checkpoint` from an interrupted run's journal replays the tasks it already finished
+    and queries only the rest (see `cloudylist.journal.Checkpoint`).
+
+    With a `backend` section of type `config_aggregator`, plugins that declare an AWS Config mapping
+    are read from the aggregator in one query each instead (see `cloudylist.aggregator`); the rest, and
+    any whose query fails, are queried directly. Roles are only assumed in accounts with tasks left to
+    query directly or aggregator records to enrich, and an aggregated task never fails for want of one.
+
+    With an `enrichment` section, the detail fields it lists (e.g. `Tags`) are added to each slice by
+    the batched lookups plugins register (see `cloudylist.enrichment.Enricher`).
+
+    Regional plugins are queried in every configured region; global and partitioned plugins once per
+    account, through the first configured region. Slices are yielded in account, region, plugin order
+    (an account's global and partitioned slices first) regardless of which task finishes first, and
+    at most `window` finished slices are held while waiting for an earlier one, so memory does not
+    grow with the size of the fleet.
+    """
+    shared = scheduler is not None
+    if not shared:
+        configure_credential_cache(config.get("credential_cache"))
+        configure_role_failures(config.get("role_failures"))
+    region_index = configure_region_index(config.get("region_index"))
+    backend = configure_backend(config.get("backend"))
+    enricher = configure_enrichment(config.get("enrichment"))
+    role_failures = get_role_failures()
+    configured_accounts = resolve_accounts(config)
+    settings = get_concurrency_settings(config)
+    scheduler = scheduler or RequestScheduler(config.get("throttle"))
+    plugin_names = _select_plugins(plugins, query)
+
+    workspace, planned = _plan_tasks(config, configured_accounts, plugins, plugin_names, shard, checkpoint)
+    for tracker in trackers:
+        tracker.start(workspace, planned)
+    replayed = {key for key in planned if checkpoint is not None and checkpoint.replays(key)}
+    # Accounts with nothing left to query in this shard don't need their role assumed
+    wanted_accounts = {key[0] for key in planned if key not in replayed}
+    accounts = [account for account in configured_accounts if account["account_id"] in wanted_accounts]
+    if not shared:
+        tasks_left = len(planned) - len(replayed)
+        configure_client_pool(
+            config.get("clients"), expected_clients(tasks_left, len(accounts), len(config["regions"]))
+        )
+
+    aggregated = {}
+    if backend is not None:
+        account_ids = [account["account_id"] for account in accounts]
+        aggregated = _fetch_aggregated(backend, plugins, plugin_names, account_ids, config["regions"], query, enricher)
+    # Nor do accounts whose remaining tasks are all read from the aggregator, unless their records need lookups
+    enriched = {name for name in aggregated if enricher is not None and enricher.keys(plugins[name].plugin, query)}
+    role_accounts = {
+        key[0] for key in planned if key not in replayed and (key[2] not in aggregated or key[2] in enriched)
+    }
+    assumed = [account for account in accounts if account["account_id"] in role_accounts]
+    credentials_of, regions_of = _assume_roles(config, assumed, settings, role_failures, region_index, all_regions)
+
+    tasks, keys, progress = _build_tasks(
+        config, plugins, planned, replayed, credentials_of, regions_of, aggregated, trackers, scheduler, query, enricher
+    )
+    results, aggregated_results = _dispatch_tasks(config, settings, scheduler, tasks, keys, aggregated)
+    # Filtered, sharded or resumed results say nothing about whether a whole region is empty, so they
+    # leave the index alone
+    record_regions = region_index is not None and shard is None and checkpoint is None
+    record_regions = record_regions and not (query and query.narrows())
+    yield from _track_tasks(
+        tasks,
+        keys,
+        results,
+        aggregated_results,
+        aggregated,
+        trackers,
+        checkpoint,
+        region_index if record_regions else None,
+        progress,
+    )
+    if enricher is not None:
+        enricher.close()
+
+    if shared:
+        # A shared scheduler's counters span every run using it; its owner reports them
+        return
+    _log_throttling(scheduler)
+
 
-        for region in config["regions"]:
-            for plugin_name in plugins.names():
-                try:
-                    logger.info(f"Querying plugin: {plugin_name} in region: {region}")
-                    plugin = plugins[plugin_name].plugin
-                    client = get_boto3_client(plugin_name, credentials, region)
-                    resources = plugin(client)
-                    inventory.append(
-                        {
-                            "account": account["account_id"],
-                            "region": region,
-                            "service": plugin_name,
-                            "resources": resources,
-                        }
-                    )
-                except Exception as e:
-                    logger.error(f"Error querying {plugin_name} in {region} for account {account['account_id']}: {e}")
-    return inventory
+def collect_inventory(config: Dict[str, Any], plugins: Any) -> Inventory:
+    """Collect inventory across accounts and regions using plugins, held compactly (see `Inventory`)."""
+    return Inventory(iter_inventory(config, plugins))
@@ -1,6 +1,24 @@
 import boto3
 from moto import mock_aws
 import pytest
+from cloudylist.credentials import (
+    CredentialCache,
+    get_credential_cache,
+    get_role_failures,
+    set_credential_cache,
+    set_role_failures,
+)
+
+
+@pytest.fixture(autouse=True)
+def isolated_credential_cache():
+    """Give every test an empty process-wide credential cache and no failing roles, so neither leaks."""
+    previous = get_credential_cache(), get_role_failures()
+    set_credential_cache(CredentialCache())
+    set_role_failures(None)
+    yield
+    set_credential_cache(previous[0])
+    set_role_failures(previous[1])
 
 
 @pytest.fixture
@@ -0,0 +1,161 @@
+import json
+import boto3
+import pytest
+from botocore.stub import ANY, Stubber
+from unittest.mock import MagicMock, patch
+from cloudylist.aggregator import AggregatorBackend, build_expression, configure_backend
+from cloudylist.resources import ResourceQuery, ec2, s3
+from cloudylist.tracking import DONE
+from cloudylist.utils import iter_inventory
+
+BACKEND = {"type": "config_aggregator", "aggregator_name": "org", "region": "us-east-1"}
+
+
+def ec2_result(account, region, instance_id, state="running"):
+    return json.dumps(
+        {
+            "accountId": account,
+            "awsRegion": region,
+            "resourceId": instance_id,
+            "configuration": {"state": {"name": state}, "instanceType": "t3.micro"},
+            "tags": [{"key": "Team", "value": "core", "tag": "Team=core"}],
+        }
+    )
+
+
+def config_client():
+    return boto3.client("config", region_name="us-east-1", aws_access_key_id="a", aws_secret_access_key="b")
+
+
+def test_configure_backend():
+    """Test the backend section defaults to direct collection and rejects unknown types."""
+    assert configure_backend(None) is None
+    assert configure_backend({"type": "direct"}) is None
+    backend = configure_backend({**BACKEND, "page_size": 50})
+    assert (backend.aggregator_name, backend.region, backend.page_size) == ("org", "us-east-1", 50)
+    with pytest.raises(ValueError):
+        configure_backend({"type": "unknown"})
+
+
+def test_build_expression_drops_long_account_lists():
+    """Test accounts and regions are selected in the query unless the account list makes it too long."""
+    expression = build_expression("AWS::EC2::Instance", ("configuration.instanceType",), ["1", "2"], ["us-east-1"])
+    assert expression == (
+        "SELECT accountId, awsRegion, resourceId, resourceName, resourceCreationTime, configuration.instanceType "
+        "WHERE resourceType = 'AWS::EC2::Instance' AND awsRegion IN ('us-east-1') AND accountId IN ('1', '2')"
+    )
+    many = [f"{index:012d}" for index in range(1000)]
+    assert "accountId" not in build_expression("AWS::S3::Bucket", (), many, []).split("WHERE")[1]
+
+
+def test_fetch_maps_results_to_plugin_records():
+    """Test paged results are mapped to the plugin's records by account and region, ignoring other accounts."""
+    client = config_client()
+    backend = AggregatorBackend("org", "us-east-1", page_size=1)
+    with Stubber(client) as stubber:
+        params = {"Expression": ANY, "ConfigurationAggregatorName": "org", "Limit": 1}
+        stubber.add_response(
+            "select_aggregate_resource_config",
+            {"Results": [ec2_result("1", "us-east-1", "i-1")], "NextToken": "next"},
+            params,
+        )
+        stubber.add_response(
+            "select_aggregate_resource_config",
+            {"Results": [ec2_result("3", "us-east-1", "i-3"), ec2_result("1", "eu-west-1", "i-4")]},
+            {**params, "NextToken": "next"},
+        )
+        records = backend.fetch(client, ec2.list_resources, ["1", "2"], ["us-east-1", "us-west-2"])
+        stubber.add_response(
+            "select_aggregate_resource_config", {"Results": [ec2_result("1", "us-east-1", "i-1")]}, params
+        )
+        tagged = backend.fetch(client, ec2.list_resources, ["1"], ["us-east-1"], ResourceQuery(details=["Tags"]))
+
+    assert records[("1", "us-east-1")] == [{"InstanceId": "i-1", "State": "running", "Type": "t3.micro"}]
+    assert records[("1", "us-west-2")] == records[("2", "us-east-1")] == []
+    assert len(records) == 4
+    # Tags are only selected and kept when asked for, e.g. as an enrichment field
+    assert tagged[("1", "us-east-1")][0]["Tags"] == {"Team": "core"}
+
+
+def test_iter_inventory_routes_supported_plugins_through_aggregator():
+    """Test mapped plugins come from the aggregator in the usual slice shape, and the rest run directly."""
+    client = config_client()
+    bucket = {
+        "accountId": "1",
+        "awsRegion": "eu-west-1",
+        "resourceId": "b",
+        "resourceName": "b",
+        "resourceCreationTime": "2024-01-01T00:00:00.000Z",
+    }
+    rds_plugin = MagicMock(return_value=[{"DBInstanceIdentifier": "db-1", "Status": "available"}], filters=None)
+    extensions = {
+        "ec2": MagicMock(plugin=ec2.list_resources),
+        "s3": MagicMock(plugin=s3.list_resources),
+        "rds": MagicMock(plugin=rds_plugin),
+    }
+    plugins = MagicMock()
+    plugins.names.return_value = ["ec2", "s3", "rds"]
+    plugins.__getitem__.side_effect = extensions.__getitem__
+    config = {"accounts": [{"account_id": "1", "role_name": "R"}], "regions": ["us-east-1"], "backend": BACKEND}
+
+    with (
+        Stubber(client) as stubber,
+        patch("boto3.client", return_value=client),
+        patch("cloudylist.utils.assume_role", return_value={"AccessKeyId": "key"}),
+        patch("cloudylist.utils.get_boto3_client") as mock_client,
+    ):
+        stubber.add_response("select_aggregate_resource_config", {"Results": [ec2_result("1", "us-east-1", "i-1")]})
+        stubber.add_client_error("select_aggregate_resource_config", "NoSuchConfigurationAggregatorException")
+        inventory = list(iter_inventory(config, plugins))
+        stubber.add_response("select_aggregate_resource_config", {"Results": [json.dumps(bucket)]})
+        s3_only = list(iter_inventory(config, plugins, query=ResourceQuery(services=["s3"])))
+
+    assert {item["service"]: item["resources"] for item in inventory} == {
+        "ec2": [{"InstanceId": "i-1", "State": "running", "Type": "t3.micro"}],
+        "rds": [{"DBInstanceIdentifier": "db-1", "Status": "available"}],
+    }
+    # The aggregator failed for s3, so it ran directly and found no buckets behind the mocked client
+    assert rds_plugin.call_count == 1
+    assert [call.args[0] for call in mock_client.call_args_list] == ["s3", "rds"]
+    assert s3_only == [
+        {
+            "account": "1",
+            "region": "eu-west-1",
+            "service": "s3",
+            "resources": [{"Name": "b", "CreationDate": "2024-01-01 00:00:00+00:00", "Region": "eu-west-1"}],
+        }
+    ]
+
+
+def test_aggregated_tasks_need_no_role_unless_enriched():
+    """Test accounts read wholly from the aggregator aren't assumed, and a failed role doesn't fail their tasks."""
+    client = config_client()
+    plugins = MagicMock()
+    plugins.names.return_value = ["ec2", "s3"]
+    extensions = {"ec2": MagicMock(plugin=ec2.list_resources), "s3": MagicMock(plugin=s3.list_resources)}
+    plugins.__getitem__.side_effect = extensions.__getitem__
+    config = {"accounts": [{"account_id": "1", "role_name": "R"}], "regions": ["us-east-1"], "backend": BACKEND}
+    bucket = {"accountId": "1", "awsRegion": "us-east-1", "resourceId": "b", "resourceName": "b"}
+    tracker = MagicMock()
+
+    with (
+        Stubber(client) as stubber,
+        patch("boto3.client", return_value=client),
+        patch("cloudylist.utils.assume_role", side_effect=RuntimeError("AccessDenied")) as assume_role,
+        patch("cloudylist.utils.get_boto3_client") as mock_client,
+    ):
+        for _ in range(2):
+            stubber.add_response("select_aggregate_resource_config", {"Results": [ec2_result("1", "us-east-1", "i-1")]})
+            stubber.add_response("select_aggregate_resource_config", {"Results": [json.dumps(bucket)]})
+        list(iter_inventory(config, plugins))
+        assert assume_role.call_count == 0
+        # Bucket tags are looked up in the account, so now its role is needed, and failing it only skips the lookup
+        enrichment = {"fields": ["Tags"]}
+        inventory = list(iter_inventory({**config, "enrichment": enrichment}, plugins, trackers=[tracker]))
+
+    assert assume_role.call_count == 1 and mock_client.call_count == 0
+    assert [call.args[1] for call in tracker.finished.call_args_list] == [DONE, DONE]
+    assert [item["service"] for item in inventory] == ["s3", "ec2"]
+    assert "Tags" not in inventory[0]["resources"][0]
+    # EC2 tags come with the aggregator's records once enabled, needing no role
+    assert inventory[1]["resources"][0]["Tags"] == {"Team": "core"}
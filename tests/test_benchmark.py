@@ -0,0 +1,31 @@
+from benchmarks.bench_collect import compare, portable, run_benchmark
+
+
+def test_benchmark_smoke():
+    """Test the benchmark runs end to end on a tiny fleet and counts the expected API calls."""
+    results = run_benchmark(accounts=2, regions=1, instances=3, buckets=1, databases=0)
+
+    assert results["api_calls_by_operation"] == {
+        "ec2.DescribeInstances": 2,
+        "rds.DescribeDBInstances": 2,
+        "s3.ListBuckets": 2,
+        "sts.AssumeRole": 2,
+    }
+    assert results["wall_seconds"] > 0
+    assert results["peak_rss_mb"] > 0
+    assert "plugin.ec2" in results["stage_seconds"]
+    assert results["relative"]["wall"] == round(results["wall_seconds"] / results["calibration_seconds"], 2)
+    # Baselines keep only what holds across hosts
+    assert set(portable(results)) == {"fleet", "api_calls", "api_calls_by_operation", "relative"}
+
+
+def test_compare_flags_regressions():
+    """Test relative slowdowns or growth beyond the tolerance and any extra API calls are reported."""
+
+    def run(wall, peak_rss, api_calls):
+        return {"relative": {"wall": wall, "peak_rss": peak_rss}, "api_calls": api_calls}
+
+    baseline = run(10.0, 3.0, 18)
+    assert compare(run(12.0, 3.0, 18), baseline) == []
+    regressions = compare(run(13.0, 3.0, 19), baseline)
+    assert len(regressions) == 2
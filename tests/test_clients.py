@@ -0,0 +1,84 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+from cloudylist.clients import ClientPool, configure_client_pool, expected_clients, get_client_pool
+
+CREDENTIALS = {"AccessKeyId": "key-1", "SecretAccessKey": "secret", "SessionToken": "token"}
+OTHER_CREDENTIALS = {"AccessKeyId": "key-2", "SecretAccessKey": "secret", "SessionToken": "token"}
+
+
+def test_pool_reuses_clients():
+    """Test the same (credentials, service, region) gets the same client back."""
+    pool = ClientPool()
+    client = pool.get_client("ec2", CREDENTIALS, "us-east-1")
+    assert pool.get_client("ec2", CREDENTIALS, "us-east-1") is client
+    assert pool.get_client("ec2", CREDENTIALS, "us-west-2") is not client
+    assert pool.get_client("ec2", OTHER_CREDENTIALS, "us-east-1") is not client
+    assert len(pool) == 3
+
+
+def test_pool_shares_service_model_loader():
+    """Test sessions for different credentials share one botocore loader."""
+    pool = ClientPool()
+    pool.get_client("ec2", CREDENTIALS, "us-east-1")
+    pool.get_client("ec2", OTHER_CREDENTIALS, "us-east-1")
+    loaders = {id(session._session.get_component("data_loader")) for session in pool._sessions.values()}
+    assert len(loaders) == 1
+
+
+def test_pool_evicts_least_recently_used(mocker):
+    """Test the oldest client is dropped, without being closed under a thread still using it, once the pool is full."""
+    pool = ClientPool(max_clients=2)
+    first = pool.get_client("ec2", CREDENTIALS, "us-east-1")
+    second = pool.get_client("rds", CREDENTIALS, "us-east-1")
+    close = mocker.spy(second, "close")
+    pool.get_client("ec2", CREDENTIALS, "us-east-1")  # Touch so rds becomes the oldest
+    pool.get_client("s3", CREDENTIALS, "us-east-1")
+
+    assert len(pool) == 2 and ("key-1", "rds", "us-east-1") not in pool._clients
+    close.assert_not_called()
+    assert pool.get_client("ec2", CREDENTIALS, "us-east-1") is first
+
+
+def test_pool_evict_credentials():
+    """Test evicting one set of credentials drops its clients and session only."""
+    pool = ClientPool()
+    pool.get_client("ec2", CREDENTIALS, "us-east-1")
+    pool.get_client("ec2", OTHER_CREDENTIALS, "us-east-1")
+    pool.evict("key-1")
+    assert len(pool) == 1
+    assert list(pool._sessions) == ["key-2"]
+
+
+def test_configure_client_pool_keeps_matching_pool():
+    """Test reconfiguring with the same settings keeps the existing pool and its clients."""
+    pool = configure_client_pool({})
+    assert configure_client_pool(None) is pool is get_client_pool()
+    assert configure_client_pool({"max_clients": 5}) is pool and pool.max_clients == 5
+    assert configure_client_pool({}, expected_clients(tasks=20, accounts=2, regions=3)).max_clients == 28
+    assert configure_client_pool({"max_pool_connections": 2}) is not pool
+    configure_client_pool({})
+
+
+def test_pool_builds_each_client_once_outside_its_lock():
+    """Test concurrent requests for one client build it once, while the pool stays usable during the build."""
+    pool = ClientPool()
+    pool.get_client("ec2", OTHER_CREDENTIALS, "us-east-1")
+    build = pool._session(CREDENTIALS).client
+    built = []
+
+    def slow_build(*args, **kwargs):
+        # Another account's cached client is still served while this one is being built
+        assert pool.get_client("ec2", OTHER_CREDENTIALS, "us-east-1") is not None
+        time.sleep(0.05)
+        built.append(args)
+        return build(*args, **kwargs)
+
+    with (
+        patch.object(pool._sessions["key-1"], "client", side_effect=slow_build),
+        ThreadPoolExecutor(max_workers=4) as executor,
+    ):
+        clients = list(executor.map(lambda _: pool.get_client("s3", CREDENTIALS, "us-east-1"), range(4)))
+
+    assert len(built) == 1
+    assert all(client is clients[0] for client in clients)
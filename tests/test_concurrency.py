@@ -0,0 +1,69 @@
+import threading
+import time
+from cloudylist.concurrency import TaskLimiter, get_concurrency_settings, ordered_map
+
+
+def test_get_concurrency_settings_defaults():
+    """Test defaults are used when the config has no concurrency section."""
+    settings = get_concurrency_settings({})
+    assert settings["max_workers"] == 16
+    assert settings["per_account"] is None
+    assert settings["per_region"] is None
+    assert settings["window"] == 128
+
+
+def test_task_limiter_caps_accounts_and_regions():
+    """Test slots are refused once an account or region is at its cap."""
+    limiter = TaskLimiter(per_account=1, per_region=2)
+    assert limiter.try_acquire("111111111111", "us-east-1")
+    assert not limiter.try_acquire("111111111111", "us-west-2")
+    assert limiter.try_acquire("222222222222", "us-east-1")
+    assert not limiter.try_acquire("333333333333", "us-east-1")
+    limiter.release("111111111111", "us-east-1")
+    assert limiter.try_acquire("333333333333", "us-east-1")
+
+
+def test_ordered_map_keeps_task_order():
+    """Test results come back in task order even when later tasks finish first."""
+    tasks = [(0.05 - i * 0.01, i) for i in range(5)]
+
+    def work(delay, value):
+        time.sleep(delay)
+        return value
+
+    assert list(ordered_map(work, tasks, [("a", "r")] * 5, max_workers=5)) == [0, 1, 2, 3, 4]
+
+
+def test_ordered_map_respects_account_cap():
+    """Test no more than `per_account` tasks for one account run at once."""
+    lock = threading.Lock()
+    running = {"now": 0, "peak": 0}
+
+    def work(_):
+        with lock:
+            running["now"] += 1
+            running["peak"] = max(running["peak"], running["now"])
+        time.sleep(0.01)
+        with lock:
+            running["now"] -= 1
+
+    tasks = [(i,) for i in range(12)]
+    slots = [("123456789012", f"region-{i % 3}") for i in range(12)]
+    list(ordered_map(work, tasks, slots, max_workers=8, limiter=TaskLimiter(per_account=2)))
+
+    assert running["peak"] == 2
+
+
+def test_ordered_map_bounds_lookahead():
+    """Test tasks are never started more than `window` places past the oldest unfinished one."""
+    started = []
+
+    def work(index):
+        started.append(index)
+        time.sleep(0.05 if index == 0 else 0)
+        return index
+
+    results = ordered_map(work, [(i,) for i in range(20)], [("a", "r")] * 20, max_workers=4, window=3)
+    assert next(results) == 0
+    assert max(started) < 3
+    assert list(results) == list(range(1, 20))
@@ -0,0 +1,104 @@
+import os
+import stat
+from datetime import datetime, timedelta, timezone
+import pytest
+from cloudylist.credentials import CredentialCache, get_credential_cache, set_credential_cache
+from cloudylist.utils import assume_role
+
+ROLE_ARN = "arn:aws:iam::123456789012:role/CacheRole"
+CALLER = "AKIARUNNER"
+
+
+def make_credentials(expires_in=timedelta(hours=1)):
+    return {
+        "AccessKeyId": "mock-access-key",
+        "SecretAccessKey": "mock-secret-key",
+        "SessionToken": "mock-session-token",
+        "Expiration": datetime.now(timezone.utc) + expires_in,
+    }
+
+
+@pytest.fixture
+def fresh_cache():
+    """Swap in an empty process-wide cache for the duration of a test."""
+    previous = get_credential_cache()
+    cache = CredentialCache()
+    set_credential_cache(cache)
+    yield cache
+    set_credential_cache(previous)
+
+
+def test_cache_returns_live_credentials():
+    """Test credentials are served from the cache until they near expiry."""
+    cache = CredentialCache(refresh_margin=300)
+    cache.put(CALLER, ROLE_ARN, make_credentials())
+    assert cache.get(CALLER, ROLE_ARN)["AccessKeyId"] == "mock-access-key"
+
+    cache.put(CALLER, ROLE_ARN, make_credentials(expires_in=timedelta(minutes=4)))
+    assert cache.get(CALLER, ROLE_ARN) is None
+
+
+def test_cache_is_keyed_by_caller(tmp_path):
+    """Test credentials one caller obtained are never handed to another, in memory or on disk."""
+    path = tmp_path / "credentials.json"
+    CredentialCache(str(path)).put(CALLER, ROLE_ARN, make_credentials())
+
+    assert CredentialCache(str(path)).get("AKIAOTHER", ROLE_ARN) is None
+    assert CredentialCache(str(path)).get(CALLER, ROLE_ARN) is not None
+
+
+def test_cache_skips_credentials_without_expiration():
+    """Test credentials without an Expiration are never cached."""
+    cache = CredentialCache()
+    cache.put(CALLER, ROLE_ARN, {"AccessKeyId": "key"})
+    assert cache.get(CALLER, ROLE_ARN) is None
+
+
+def test_cache_persists_to_private_file(tmp_path):
+    """Test a second cache instance reads credentials written by the first, from an owner-only file."""
+    path = tmp_path / "cache" / "credentials.json"
+    CredentialCache(str(path)).put(CALLER, ROLE_ARN, make_credentials())
+
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    credentials = CredentialCache(str(path)).get(CALLER, ROLE_ARN)
+    assert credentials["SessionToken"] == "mock-session-token"
+    assert isinstance(credentials["Expiration"], datetime)
+
+
+def test_cache_ignores_world_readable_file(tmp_path):
+    """Test a cache file other users can read is not trusted."""
+    path = tmp_path / "credentials.json"
+    CredentialCache(str(path)).put(CALLER, ROLE_ARN, make_credentials())
+    os.chmod(path, 0o644)
+
+    assert CredentialCache(str(path)).get(CALLER, ROLE_ARN) is None
+
+
+def test_assume_role_reuses_cached_credentials(mocker, fresh_cache):
+    """Test STS is only called once while the assumed credentials are still live."""
+    mock_sts_client = mocker.Mock()
+    mock_sts_client.assume_role.return_value = {"Credentials": make_credentials()}
+    mocker.patch("boto3.client", return_value=mock_sts_client)
+    mocker.patch("cloudylist.utils._caller_identity", return_value=CALLER)
+
+    first = assume_role("123456789012", "CacheRole")
+    second = assume_role("123456789012", "CacheRole")
+
+    assert first == second
+    mock_sts_client.assume_role.assert_called_once()
+    assert fresh_cache.get(CALLER, ROLE_ARN) == first
+
+
+def test_assume_role_evicts_clients_of_expiring_credentials(mocker, fresh_cache):
+    """Test refreshing a role's credentials drops the pooled clients built from the old ones."""
+    fresh_cache.put(CALLER, ROLE_ARN, {**make_credentials(expires_in=timedelta(minutes=2)), "AccessKeyId": "old-key"})
+    mock_sts_client = mocker.Mock()
+    mock_sts_client.assume_role.return_value = {"Credentials": make_credentials()}
+    mocker.patch("boto3.client", return_value=mock_sts_client)
+    mocker.patch("cloudylist.utils._caller_identity", return_value=CALLER)
+    pool = mocker.patch("cloudylist.utils.get_client_pool").return_value
+
+    assert assume_role("123456789012", "CacheRole")["AccessKeyId"] == "mock-access-key"
+    pool.evict.assert_called_once_with("old-key")
+    assume_role("123456789012", "CacheRole")
+    pool.evict.assert_called_once()
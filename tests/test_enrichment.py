@@ -0,0 +1,114 @@
+import boto3
+from unittest.mock import MagicMock, patch
+from moto import mock_aws
+from cloudylist.enrichment import Enricher, configure_enrichment
+from cloudylist.resources import ResourceQuery, enrich, identity
+from cloudylist.resources.ec2 import list_resources as list_ec2_resources
+from cloudylist.resources.rds import list_resources as list_rds_resources
+from cloudylist.resources.s3 import list_resources as list_s3_resources
+from cloudylist.utils import iter_inventory
+
+
+def count_calls(client, operation):
+    calls = []
+    client.meta.events.register(f"before-call.*.{operation}", lambda **kwargs: calls.append(operation))
+    return calls
+
+
+def test_ec2_tags_come_with_the_instances():
+    """Test EC2 tags are read from DescribeInstances itself, only when asked for, with no tag lookups."""
+    with mock_aws():
+        client = boto3.client("ec2", region_name="us-east-1")
+        client.run_instances(ImageId="ami-12345678", MinCount=1, MaxCount=1)
+        client.run_instances(
+            ImageId="ami-12345678",
+            MinCount=2,
+            MaxCount=2,
+            TagSpecifications=[{"ResourceType": "instance", "Tags": [{"Key": "Team", "Value": "core"}]}],
+        )
+        calls = count_calls(client, "DescribeTags")
+        resources = list(list_ec2_resources(client, ResourceQuery(fields=["State", "Tags"])))
+        enriched = list(list_ec2_resources(client, ResourceQuery(details=["Tags"])))
+        plain = list(list_ec2_resources(client))
+
+    assert calls == [] and Enricher(["Tags"]).enrichments(list_ec2_resources) == []
+    assert sorted(str(resource["Tags"]) for resource in resources) == ["{'Team': 'core'}", "{'Team': 'core'}", "{}"]
+    assert set(resources[0]) == {"State", "Tags"}
+    assert all("Tags" in resource for resource in enriched)
+    assert not any("Tags" in resource for resource in plain)
+
+
+def test_rds_and_s3_tags_come_from_the_tagging_api():
+    """Test RDS and S3 tags are read with the Resource Groups Tagging API, not a call per resource."""
+    with mock_aws():
+        rds = boto3.client("rds", region_name="us-east-1")
+        for name in ("tagged-db", "plain-db"):
+            rds.create_db_instance(
+                DBInstanceIdentifier=name,
+                DBInstanceClass="db.t2.micro",
+                Engine="postgres",
+                Tags=[{"Key": "Team", "Value": "data"}] if name == "tagged-db" else [],
+            )
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket="log-bucket")
+        s3.put_bucket_tagging(Bucket="log-bucket", Tagging={"TagSet": [{"Key": "Env", "Value": "prod"}]})
+        tagging = boto3.client("resourcegroupstaggingapi", region_name="us-east-1")
+        calls = count_calls(tagging, "GetResources")
+        enricher = Enricher(["Tags"])
+
+        def get_client(service, region):
+            assert service == "resourcegroupstaggingapi"
+            return tagging
+
+        databases = [
+            {"account": "1", "region": "us-east-1", "service": "rds", "resources": list(list_rds_resources(rds))}
+        ]
+        enricher.enrich(databases, "rds", list_rds_resources, get_client, "us-east-1")
+        buckets = [{"account": "1", "region": "us-east-1", "service": "s3", "resources": list(list_s3_resources(s3))}]
+        enricher.enrich(buckets, "s3", list_s3_resources, get_client, "us-east-1")
+        enricher.close()
+
+    tags = {resource["DBInstanceIdentifier"]: resource["Tags"] for resource in databases[0]["resources"]}
+    assert tags == {"tagged-db": {"Team": "data"}, "plain-db": {}}
+    assert buckets[0]["resources"][0]["Tags"] == {"Env": "prod"}
+    assert calls == ["GetResources", "GetResources"]
+
+
+def test_lookups_are_deduplicated_batched_and_skipped_when_not_wanted():
+    """Test keys are de-duplicated and batched, failed lookups leave fields unset and unwanted ones don't run."""
+    lookup = MagicMock(side_effect=lambda client, keys: {key: key.upper() for key in keys})
+    broken = MagicMock(side_effect=RuntimeError("denied"))
+
+    @identity("Id")
+    @enrich("Upper", lookup, batch_size=2)
+    @enrich("Owner", broken)
+    def plugin(client):
+        return [{"Id": "a"}, {"Id": "b"}, {"Id": "a"}, {"Id": "c"}]
+
+    plugins = MagicMock()
+    plugins.names.return_value = ["ec2"]
+    plugins.__getitem__.return_value = MagicMock(plugin=plugin)
+    config = {
+        "accounts": [{"account_id": "123456789012", "role_name": "TestRole"}],
+        "regions": ["us-east-1"],
+        "enrichment": {"fields": ["Upper", "Owner"], "max_workers": 2},
+    }
+
+    with (
+        patch("cloudylist.utils.assume_role", return_value={"AccessKeyId": "key"}),
+        patch("cloudylist.utils.get_boto3_client"),
+    ):
+        [item] = iter_inventory(config, plugins)
+        assert sorted(len(call.args[1]) for call in lookup.call_args_list) == [1, 2]
+        assert [resource.get("Upper") for resource in item["resources"]] == ["A", "B", "A", "C"]
+        assert broken.call_count == 1 and "Owner" not in item["resources"][0]
+
+        lookup.reset_mock()
+        list(iter_inventory(config, plugins, query=ResourceQuery(fields=["Id"])))
+        assert lookup.call_count == 0
+
+        # The key a lookup needs is kept until it has run, even when the projection leaves it out
+        [item] = iter_inventory(config, plugins, query=ResourceQuery(fields=["Upper"]))
+        assert item["resources"] == [{"Upper": "A"}, {"Upper": "B"}, {"Upper": "A"}, {"Upper": "C"}]
+
+    assert configure_enrichment({"fields": []}) is None
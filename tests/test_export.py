@@ -0,0 +1,108 @@
+import csv
+import json
+import pytest
+from unittest.mock import patch
+from cloudylist.export import export_inventory, flatten
+from cloudylist.main import export
+
+INVENTORY = [
+    {
+        "account": "123456789012",
+        "region": "us-east-1",
+        "service": "ec2",
+        "resources": [
+            {"InstanceId": "i-1", "State": "running", "Type": "t3.micro"},
+            {"InstanceId": "i-2", "State": "stopped", "Type": "t3.large"},
+        ],
+    },
+    {
+        "account": "123456789012",
+        "region": "us-west-2",
+        "service": "ec2",
+        "resources": [{"InstanceId": "i-3", "State": "running", "Type": "m5.large"}],
+    },
+    {
+        "account": "123456789012",
+        "region": "global",
+        "service": "s3",
+        "resources": [{"Name": "my-bucket", "Tags": {"env": "prod"}}],
+    },
+]
+
+
+def test_flatten_adds_slice_columns():
+    """Test each resource becomes a row carrying its account, region and service."""
+    rows = list(flatten(INVENTORY[2]))
+    assert rows == [
+        {
+            "account": "123456789012",
+            "region": "global",
+            "service": "s3",
+            "Name": "my-bucket",
+            "Tags": json.dumps({"env": "prod"}),
+        }
+    ]
+
+
+def test_export_csv_one_file_per_service(tmp_path):
+    """Test CSV export writes a file per service, in small batches."""
+    counts = export_inventory(iter(INVENTORY), str(tmp_path), "csv", batch_size=1)
+
+    assert counts == {"ec2": 3, "s3": 1}
+    with open(tmp_path / "ec2.csv", newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert list(rows[0]) == ["account", "region", "service", "InstanceId", "State", "Type"]
+    assert [row["InstanceId"] for row in rows] == ["i-1", "i-2", "i-3"]
+    assert rows[2]["region"] == "us-west-2"
+
+
+def test_export_parquet(tmp_path):
+    """Test Parquet export infers a per-service schema and writes every batch."""
+    pyarrow_parquet = pytest.importorskip("pyarrow.parquet")
+
+    export_inventory(iter(INVENTORY), str(tmp_path), "parquet", batch_size=2)
+
+    table = pyarrow_parquet.read_table(tmp_path / "ec2.parquet")
+    assert table.num_rows == 3
+    assert table.column_names == ["account", "region", "service", "InstanceId", "State", "Type"]
+
+
+def test_export_command(tmp_path):
+    """Test the export command streams the collected inventory into the output directory."""
+    with (
+        patch("cloudylist.main.load_config", return_value={}),
+        patch("cloudylist.main.load_plugins"),
+        patch("cloudylist.main.iter_inventory", return_value=iter(INVENTORY)),
+    ):
+        export(config_file="config.yml", format="csv", output_dir=str(tmp_path), batch_size=100)
+
+    assert (tmp_path / "ec2.csv").exists()
+    assert (tmp_path / "s3.csv").exists()
+
+
+def test_export_parquet_types_empty_columns_as_strings(tmp_path):
+    """Test a column with no values in the first batch still takes later batches' values."""
+    pyarrow_parquet = pytest.importorskip("pyarrow.parquet")
+    resources = [{"Name": "a", "KmsKeyId": None, "Size": 1}, {"Name": "b", "KmsKeyId": "key", "Size": "large"}]
+    item = {"account": "1", "region": "us-east-1", "service": "ebs", "resources": resources}
+
+    with patch("cloudylist.export.logger.warning") as warning:
+        export_inventory(iter([item]), str(tmp_path), "parquet", batch_size=1)
+
+    table = pyarrow_parquet.read_table(tmp_path / "ebs.parquet")
+    assert table.column("KmsKeyId").to_pylist() == [None, "key"]
+    assert table.column("Size").to_pylist() == [1, None]
+    assert "Size" in warning.call_args.args[0]
+
+
+def test_export_warns_about_fields_dropped_after_the_first_batch(tmp_path):
+    """Test fields first seen after the header was written are named in a warning, once each."""
+    resources = [{"InstanceId": "i-1"}, {"InstanceId": "i-2", "Tags": "{}"}, {"InstanceId": "i-3", "Tags": "{}"}]
+    item = {"account": "1", "region": "us-east-1", "service": "ec2", "resources": resources}
+
+    with patch("cloudylist.export.logger.warning") as warning:
+        export_inventory(iter([item]), str(tmp_path), "csv", batch_size=1)
+
+    assert warning.call_count == 1 and "['Tags']" in warning.call_args.args[0]
+    with open(tmp_path / "ec2.csv", newline="") as f:
+        assert [row["InstanceId"] for row in csv.DictReader(f)] == ["i-1", "i-2", "i-3"]
@@ -0,0 +1,116 @@
+import json
+import tracemalloc
+import boto3
+import pytest
+from moto import mock_aws
+from cloudylist.inventory import Inventory
+from cloudylist.resources import ResourceQuery, ec2
+
+
+def fresh(value):
+    """Return an equal but distinct string, as parsing each API response would."""
+    return "".join(list(value))
+
+
+def ec2_fleet(accounts=10, regions=("us-east-1", "us-west-2", "eu-west-1"), instances=1000):
+    return [
+        {
+            "account": fresh(f"{account:012d}"),
+            "region": fresh(region),
+            "service": fresh("ec2"),
+            "resources": [
+                {
+                    "InstanceId": f"i-{account:04x}{index:013x}",
+                    "State": fresh("running" if index % 5 else "stopped"),
+                    "Type": fresh(("t3.micro", "t3.small", "m5.large")[index % 3]),
+                }
+                for index in range(instances)
+            ],
+        }
+        for account in range(accounts)
+        for region in regions
+    ]
+
+
+@pytest.fixture(scope="module")
+def ec2_records():
+    """What `ec2.list_resources` returns for 100 tagged instances under moto, with and without their tags."""
+    with mock_aws():
+        client = boto3.client("ec2", region_name="us-east-1")
+        for team in ("core", "data"):
+            tags = [{"Key": "Team", "Value": team}, {"Key": "Env", "Value": "prod"}]
+            client.run_instances(
+                ImageId="ami-12345678",
+                MinCount=50,
+                MaxCount=50,
+                InstanceType="t3.micro",
+                TagSpecifications=[{"ResourceType": "instance", "Tags": tags}],
+            )
+        return {
+            "plain": list(ec2.list_resources(client)),
+            "tagged": list(ec2.list_resources(client, ResourceQuery(details=["Tags"]))),
+        }
+
+
+def collected_fleet(records, accounts=5, regions=("us-east-1", "us-west-2", "eu-west-1"), copies=10):
+    """Copy collected records into a fleet, each through JSON as parsing each API response would."""
+    return [
+        {
+            "account": fresh(f"{account:012d}"),
+            "region": fresh(region),
+            "service": fresh("ec2"),
+            "resources": [
+                json.loads(json.dumps({**record, "InstanceId": f"{record['InstanceId']}{account:02d}{copy:02d}"}))
+                for copy in range(copies)
+                for record in records
+            ],
+        }
+        for account in range(accounts)
+        for region in regions
+    ]
+
+
+def compaction(build):
+    """Return how many times less memory the slices `build` returns take once held in an `Inventory`."""
+    tracemalloc.start()
+    try:
+        slices = build()
+        as_dicts = tracemalloc.get_traced_memory()[0]
+        inventory = Inventory(slices)
+        del slices
+        compact = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    assert inventory.resource_count() > 0
+    return as_dicts / compact
+
+
+def test_inventory_round_trips_slices():
+    """Test slices read back exactly as appended, including mixed fields, nested values and empty slices."""
+    slices = [
+        {
+            "account": "1",
+            "region": "global",
+            "service": "iam",
+            "resources": [{"Name": "a", "Tags": {"team": "x"}}, {"Name": "b", "Count": 3}, {"Name": "c"}],
+        },
+        {"account": "1", "region": "us-east-1", "service": "ec2", "resources": []},
+        ec2_fleet(accounts=1, regions=("us-east-1",), instances=5)[0],
+    ]
+    inventory = Inventory(slices)
+
+    assert len(inventory) == 3
+    assert inventory == slices
+    assert list(inventory) == slices
+    assert inventory[-1] == slices[-1]
+    assert inventory[1:] == slices[1:]
+    assert json.loads(json.dumps(list(inventory))) == slices
+
+
+def test_inventory_is_much_smaller_than_dicts(ec2_records):
+    """Test a large inventory of the records EC2 collection produces takes a fraction of the memory of dicts."""
+    assert "Tags" not in ec2_records["plain"][0] and ec2_records["tagged"][0]["Tags"]
+
+    assert compaction(ec2_fleet) >= 5
+    assert compaction(lambda: collected_fleet(ec2_records["plain"])) >= 5
+    assert compaction(lambda: collected_fleet(ec2_records["tagged"])) >= 5
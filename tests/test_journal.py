@@ -0,0 +1,107 @@
+import json
+import pytest
+from unittest.mock import MagicMock, patch
+from cloudylist.journal import Checkpoint, Journal, JournalError
+from cloudylist.main import show_inventory
+from cloudylist.tracking import DONE, FAILED
+from cloudylist.utils import iter_inventory
+
+CONFIG = {
+    "accounts": [{"account_id": "123456789012", "role_name": "TestRole"}],
+    "regions": ["us-east-1", "us-west-2", "eu-west-1"],
+}
+
+
+def make_plugins(failing=()):
+    """Plugins with one regional ec2 plugin returning an instance named after its region."""
+
+    def describe(client):
+        if client.region in failing:
+            raise RuntimeError("connection reset")
+        return [{"InstanceId": f"i-{client.region}"}]
+
+    plugin = MagicMock(side_effect=describe, filters=None)
+    plugins = MagicMock()
+    plugins.names.return_value = ["ec2"]
+    plugins.__getitem__.return_value = MagicMock(plugin=plugin)
+    return plugins, plugin
+
+
+def client_for(plugin_name, credentials, region):
+    return MagicMock(region=region)
+
+
+def regions_in(path):
+    return sorted(item["region"] for item in json.loads(path.read_text()))
+
+
+def test_resume_queries_only_what_the_interrupted_run_missed(tmp_path):
+    """Test --resume replays journaled tasks, ignores a half-written last entry and queries the rest."""
+    path = tmp_path / "journal.ndjson"
+    output = tmp_path / "inventory.json"
+    plugins, plugin = make_plugins()
+
+    with (
+        patch("cloudylist.main.load_config", return_value=CONFIG),
+        patch("cloudylist.main.load_plugins", return_value=plugins),
+        patch("cloudylist.utils.assume_role", return_value={"AccessKeyId": "key"}),
+        patch("cloudylist.utils.get_boto3_client", side_effect=client_for),
+    ):
+        journal = Journal(str(path), "all")
+        collected = iter_inventory(CONFIG, plugins, trackers=[journal])
+        next(collected)
+        collected.close()
+        journal.close()
+        with open(path, "a") as f:
+            f.write('{"key": ["123456789012", "us-')
+
+        plugin.reset_mock()
+        show_inventory(config_file="config.yml", format="json", output=str(output), journal=str(path), resume=True)
+
+    assert plugin.call_count == 2
+    assert regions_in(output) == ["eu-west-1", "us-east-1", "us-west-2"]
+    checkpoint = Checkpoint.load(str(path), "all")
+    assert [status for status, _ in checkpoint.outcomes.values()] == [DONE] * 3
+
+
+def test_retry_failed_queries_only_failed_tasks(tmp_path):
+    """Test --retry-failed queries just the tasks the journal has as failed, replaying the others."""
+    path = tmp_path / "journal.ndjson"
+    outputs = [tmp_path / f"inventory-{index}.json" for index in range(2)]
+
+    with (
+        patch("cloudylist.main.load_config", return_value=CONFIG),
+        patch("cloudylist.utils.assume_role", return_value={"AccessKeyId": "key"}),
+        patch("cloudylist.utils.get_boto3_client", side_effect=client_for),
+    ):
+        plugins, plugin = make_plugins(failing=("eu-west-1",))
+        with patch("cloudylist.main.load_plugins", return_value=plugins):
+            show_inventory(config_file="config.yml", format="json", output=str(outputs[0]), journal=str(path))
+        assert regions_in(outputs[0]) == ["us-east-1", "us-west-2"]
+        assert Checkpoint.load(str(path), "all").failed() == [("123456789012", "eu-west-1", "ec2")]
+
+        plugins, plugin = make_plugins()
+        with patch("cloudylist.main.load_plugins", return_value=plugins):
+            show_inventory(
+                config_file="config.yml", format="json", output=str(outputs[1]), journal=str(path), retry_failed=True
+            )
+
+    assert [call.args[0].region for call in plugin.call_args_list] == ["eu-west-1"]
+    assert regions_in(outputs[1]) == ["eu-west-1", "us-east-1", "us-west-2"]
+    assert Checkpoint.load(str(path), "all").failed() == []
+
+
+def test_journal_from_another_query_is_refused(tmp_path):
+    """Test a journal written for a different scope, or that isn't a journal, can't be resumed."""
+    path = tmp_path / "journal.ndjson"
+    journal = Journal(str(path), "all")
+    journal.start({}, [])
+    journal.finished(("1", "us-east-1", "ec2"), FAILED)
+    journal.close()
+
+    assert Checkpoint.load(str(path), "all").failed() == [("1", "us-east-1", "ec2")]
+    with pytest.raises(JournalError):
+        Checkpoint.load(str(path), '{"states": ["running"]}')
+    path.write_text("not a journal\n")
+    with pytest.raises(JournalError):
+        Checkpoint.load(str(path), "all")
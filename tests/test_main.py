@@ -1,3 +1,4 @@
+import json
 from unittest.mock import MagicMock, patch
 from cloudylist.utils import collect_inventory
 from cloudylist.main import show_inventory
@@ -39,9 +40,9 @@ def test_show_inventory_json():
 
     with (
         patch("cloudylist.main.load_config", return_value=mock_config),
-        patch("cloudylist.main.ExtensionManager", return_value=mock_plugins),
+        patch("cloudylist.main.load_plugins", return_value=mock_plugins),
         patch(
-            "cloudylist.main.collect_inventory",
+            "cloudylist.main.iter_inventory",
             return_value=[
                 {
                     "account": "123456789012",
@@ -51,10 +52,11 @@ def test_show_inventory_json():
                 }
             ],
         ),
-        patch("cloudylist.main.console.print_json") as mock_json_print,
+        patch("cloudylist.main._is_terminal", return_value=True),
+        patch("cloudylist.main.get_console") as mock_get_console,
     ):
         show_inventory(config_file="config.yml", format="json")
-        mock_json_print.assert_called_once()
+        mock_get_console.return_value.print_json.assert_called_once()
 
 
 def test_show_inventory_yaml():
@@ -67,9 +69,9 @@ def test_show_inventory_yaml():
 
     with (
         patch("cloudylist.main.load_config", return_value=mock_config),
-        patch("cloudylist.main.ExtensionManager", return_value=mock_plugins),
+        patch("cloudylist.main.load_plugins", return_value=mock_plugins),
         patch(
-            "cloudylist.main.collect_inventory",
+            "cloudylist.main.iter_inventory",
             return_value=[
                 {
                     "account": "123456789012",
@@ -79,17 +81,19 @@ def test_show_inventory_yaml():
                 }
             ],
         ),
-        patch("cloudylist.main.console.print") as mock_yaml_print,
+        patch("cloudylist.main._is_terminal", return_value=True),
+        patch("cloudylist.main.get_console") as mock_get_console,
     ):
         show_inventory(config_file="config.yml", format="yaml")
-        mock_yaml_print.assert_called()
+        mock_get_console.return_value.print.assert_called()
 
 
 def test_show_inventory_invalid_format():
     """Test show_inventory with invalid format."""
-    with patch("cloudylist.main.console.print") as mock_console:
+    with patch("cloudylist.main.get_console") as mock_get_console:
         show_inventory(config_file="config.yml", format="invalid")
-        mock_console.assert_called_once_with("[red]Invalid format:[/red] invalid", style="bold red")
+        mock_console = mock_get_console.return_value
+        mock_console.print.assert_called_once_with("[red]Invalid format:[/red] invalid", style="bold red")
 
 
 def test_show_inventory_table():
@@ -102,9 +106,9 @@ def test_show_inventory_table():
 
     with (
         patch("cloudylist.main.load_config", return_value=mock_config),
-        patch("cloudylist.main.ExtensionManager", return_value=mock_plugins),
+        patch("cloudylist.main.load_plugins", return_value=mock_plugins),
         patch(
-            "cloudylist.main.collect_inventory",
+            "cloudylist.main.iter_inventory",
             return_value=[
                 {
                     "account": "123456789012",
@@ -114,7 +118,52 @@ def test_show_inventory_table():
                 }
             ],
         ),
-        patch("cloudylist.main.console.print") as mock_table_print,
+        patch("cloudylist.main._is_terminal", return_value=False),
+        patch("cloudylist.main.get_console") as mock_get_console,
     ):
         show_inventory(config_file="config.yml", format="table")
-        mock_table_print.assert_called()
+        mock_get_console.return_value.print.assert_called()
+
+
+def test_show_inventory_ndjson_to_file(tmp_path):
+    """Test NDJSON output is streamed to a file, one slice per line, without going through rich."""
+    mock_config = {"accounts": [{"account_id": "123456789012", "role_name": "TestRole"}], "regions": ["us-east-1"]}
+    output = tmp_path / "inventory.ndjson"
+
+    with (
+        patch("cloudylist.main.load_config", return_value=mock_config),
+        patch("cloudylist.main.load_plugins"),
+        patch(
+            "cloudylist.main.iter_inventory",
+            return_value=iter(
+                [
+                    {"account": "123456789012", "region": "us-east-1", "service": "ec2", "resources": []},
+                    {"account": "123456789012", "region": "us-east-1", "service": "rds", "resources": []},
+                ]
+            ),
+        ),
+        patch("cloudylist.main.get_console") as mock_get_console,
+    ):
+        show_inventory(config_file="config.yml", format="ndjson", output=str(output))
+
+    mock_get_console.return_value.print_json.assert_not_called()
+    lines = output.read_text().splitlines()
+    assert [json.loads(line)["service"] for line in lines] == ["ec2", "rds"]
+
+
+def test_show_inventory_json_without_tty(capsys):
+    """Test JSON output bypasses rich and streams to stdout when no TTY is attached."""
+    mock_config = {"accounts": [{"account_id": "123456789012", "role_name": "TestRole"}], "regions": ["us-east-1"]}
+    inventory = [{"account": "123456789012", "region": "us-east-1", "service": "ec2", "resources": [{"id": "i-1"}]}]
+
+    with (
+        patch("cloudylist.main.load_config", return_value=mock_config),
+        patch("cloudylist.main.load_plugins"),
+        patch("cloudylist.main.iter_inventory", return_value=iter(inventory)),
+        patch("cloudylist.main._is_terminal", return_value=False),
+        patch("cloudylist.main.get_console") as mock_get_console,
+    ):
+        show_inventory(config_file="config.yml", format="json")
+
+    mock_get_console.return_value.print_json.assert_not_called()
+    assert json.loads(capsys.readouterr().out) == inventory
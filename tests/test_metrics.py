@@ -0,0 +1,115 @@
+import json
+from unittest.mock import MagicMock, patch
+from cloudylist.main import show_inventory
+from cloudylist.metrics import Histogram, Metrics, get_metrics
+from cloudylist.utils import collect_inventory
+
+
+def test_histogram_quantile():
+    """Test quantiles are estimated from the bucket bounds."""
+    histogram = Histogram((0.1, 1.0))
+    for value in (0.05, 0.05, 0.5, 5.0):
+        histogram.observe(value)
+    assert histogram.count == 4
+    assert histogram.quantile(0.5) == 0.1
+    assert histogram.quantile(0.75) == 1.0
+    assert histogram.quantile(1.0) == 1.0
+
+
+def test_attach_records_api_calls(mock_ec2_instances):
+    """Test the botocore hooks count, time and size each API call by account, region and service."""
+    metrics = Metrics()
+    metrics.attach(mock_ec2_instances, "123456789012", "ec2", "us-east-1")
+    mock_ec2_instances.describe_instances()
+    mock_ec2_instances.describe_instances()
+
+    labels = (
+        ("account", "123456789012"),
+        ("operation", "DescribeInstances"),
+        ("region", "us-east-1"),
+        ("service", "ec2"),
+    )
+    assert metrics.counters[("api_calls_total", labels)] == 2
+    assert metrics.counters[("api_response_bytes_total", labels)] > 0
+    assert metrics.histograms[("api_call_seconds", labels)].count == 2
+
+
+def test_attach_replaces_earlier_hooks(mock_ec2_instances):
+    """Test attaching the same client twice does not double count."""
+    metrics = Metrics()
+    metrics.attach(mock_ec2_instances, "123456789012", "ec2", "us-east-1")
+    metrics.attach(mock_ec2_instances, "123456789012", "ec2", "us-east-1")
+    mock_ec2_instances.describe_instances()
+    calls = [value for (name, _), value in metrics.counters.items() if name == "api_calls_total"]
+    assert calls == [1]
+
+
+def test_timed_iter_records_waiting_time():
+    """Test only the time spent waiting on the iterable is recorded for the stage."""
+    metrics = Metrics()
+    assert list(metrics.timed_iter(iter([1, 2, 3]), "collect")) == [1, 2, 3]
+    assert metrics.histograms[("stage_seconds", (("stage", "collect"),))].count == 1
+    assert metrics.stage_seconds("collect") >= 0.0
+
+
+def test_prometheus_and_json_reports():
+    """Test the Prometheus textfile and JSON report include counters and cumulative histogram buckets."""
+    metrics = Metrics()
+    metrics.inc("api_calls_total", 3, service="ec2", region="us-east-1")
+    metrics.observe("stage_seconds", 0.2, stage="plugin")
+    metrics.observe("stage_seconds", 0.02, stage="plugin")
+
+    text = metrics.to_prometheus()
+    assert "# TYPE cloudylist_api_calls_total counter" in text
+    assert 'cloudylist_api_calls_total{region="us-east-1",service="ec2"} 3' in text
+    assert 'cloudylist_stage_seconds_bucket{stage="plugin",le="0.25"} 2' in text
+    assert 'cloudylist_stage_seconds_bucket{stage="plugin",le="+Inf"} 2' in text
+    assert 'cloudylist_stage_seconds_count{stage="plugin"} 2' in text
+
+    report = json.loads(metrics.to_json())
+    assert report["counters"][0]["value"] == 3
+    assert report["histograms"][0]["labels"] == {"stage": "plugin"}
+
+
+def test_collect_inventory_records_stages():
+    """Test collection times roles, clients and plugins, and counts failed slices."""
+    mock_config = {"accounts": [{"account_id": "123456789012", "role_name": "TestRole"}], "regions": ["us-east-1"]}
+    mock_plugins = MagicMock()
+    mock_plugins.names.return_value = ["ec2"]
+    mock_plugins["ec2"].plugin.side_effect = Exception("PluginError")
+
+    with (
+        patch("cloudylist.utils.get_metrics", return_value=Metrics()) as mock_get_metrics,
+        patch("cloudylist.utils.assume_role", return_value={"AccessKeyId": "key"}),
+        patch("cloudylist.utils.get_boto3_client"),
+    ):
+        collect_inventory(mock_config, mock_plugins)
+
+    stages = {row["name"] for row in mock_get_metrics.return_value.summary() if row["kind"] == "stage"}
+    assert stages == {"assume_role", "client", "plugin"}
+    failed = (("account", "123456789012"), ("region", "us-east-1"), ("service", "ec2"))
+    assert mock_get_metrics.return_value.counters[("slices_failed_total", failed)] == 1
+
+
+def test_show_inventory_writes_prometheus_textfile(tmp_path):
+    """Test --metrics prometheus with --metrics-file writes a textfile including the output stage."""
+    mock_config = {"accounts": [{"account_id": "123456789012", "role_name": "TestRole"}], "regions": ["us-east-1"]}
+    metrics_file = tmp_path / "cloudylist.prom"
+
+    with (
+        patch("cloudylist.main.load_config", return_value=mock_config),
+        patch("cloudylist.main.load_plugins"),
+        patch("cloudylist.main.iter_inventory", return_value=iter([])),
+    ):
+        show_inventory(
+            config_file="config.yml",
+            format="ndjson",
+            output=str(tmp_path / "inventory.ndjson"),
+            metrics="prometheus",
+            metrics_file=str(metrics_file),
+        )
+
+    text = metrics_file.read_text()
+    assert 'cloudylist_stage_seconds_count{stage="collect"} 1' in text
+    assert 'cloudylist_stage_seconds_count{format="ndjson",stage="output"} 1' in text
+    assert get_metrics().stage_seconds("output") >= 0.0
@@ -0,0 +1,140 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+import boto3
+import pytest
+from botocore.exceptions import ClientError, EndpointConnectionError
+from unittest.mock import MagicMock, patch
+from moto import mock_aws
+from cloudylist.credentials import RoleFailures
+from cloudylist.organizations import OrganizationSource
+from cloudylist.tracking import FAILED
+from cloudylist.utils import iter_inventory, resolve_accounts
+
+
+def create_organization(client):
+    """Create an organization with an active account in a nested OU, a suspended one and one at the root."""
+    client.create_organization(FeatureSet="ALL")
+    root = client.list_roots()["Roots"][0]["Id"]
+    prod = client.create_organizational_unit(ParentId=root, Name="prod")["OrganizationalUnit"]["Id"]
+    team = client.create_organizational_unit(ParentId=prod, Name="team")["OrganizationalUnit"]["Id"]
+    ids = {}
+    for name, parent in (("active", team), ("closed", prod), ("other", root)):
+        status = client.create_account(AccountName=name, Email=f"{name}@example.com")["CreateAccountStatus"]
+        ids[name] = status["AccountId"]
+        if parent != root:
+            client.move_account(AccountId=ids[name], SourceParentId=root, DestinationParentId=parent)
+    client.close_account(AccountId=ids["closed"])
+    return prod, ids
+
+
+def test_discovers_active_accounts_scoped_to_ous():
+    """Test only ACTIVE accounts are kept, and OU scoping includes child OUs."""
+    with mock_aws():
+        client = boto3.client("organizations", region_name="us-east-1")
+        prod, ids = create_organization(client)
+
+        everything = OrganizationSource("Inventory").list_accounts(client)
+        scoped = OrganizationSource("Inventory", ous=[prod]).list_accounts(client)
+
+    assert ids["closed"] not in everything and {ids["active"], ids["other"]} <= set(everything)
+    assert scoped == [ids["active"]]
+
+
+def test_account_list_is_cached_until_its_ttl_passes(tmp_path):
+    """Test the cached list is reused within the TTL, refreshed after it, and kept when listing fails."""
+    path = str(tmp_path / "accounts.json")
+    client = MagicMock()
+    client.get_paginator.return_value.paginate.return_value = [
+        {"Accounts": [{"Id": "111", "State": "ACTIVE"}, {"Id": "222", "Status": "SUSPENDED"}]}
+    ]
+    get_client = MagicMock(return_value=client)
+    source = OrganizationSource("Inventory", path=path, ttl=3600)
+
+    assert source.accounts(get_client) == [{"account_id": "111", "role_name": "Inventory"}]
+    assert source.accounts(get_client) == [{"account_id": "111", "role_name": "Inventory"}]
+    assert get_client.call_count == 1
+
+    expired = OrganizationSource("Inventory", path=path, ttl=0)
+    get_client.side_effect = RuntimeError("AccessDenied")
+    assert [account["account_id"] for account in expired.accounts(get_client)] == ["111"]
+    with pytest.raises(RuntimeError):
+        OrganizationSource("Inventory", ous=["ou-1"], path=path).accounts(get_client)
+
+    organization = {"role_name": "Inventory", "cache_path": path}
+    config = {"accounts": [{"account_id": "111", "role_name": "Custom"}], "organization": organization}
+    assert resolve_accounts(config) == [{"account_id": "111", "role_name": "Custom"}]
+
+
+def test_role_failures_back_off_and_are_persisted(tmp_path):
+    """Test each failure doubles the time a role is skipped, up to the cap, and a success forgets it."""
+    path = tmp_path / "failures.json"
+    failures = RoleFailures(str(path), backoff=60, max_backoff=100)
+    with patch("cloudylist.credentials.time.time", return_value=1000.0):
+        failures.failed("arn:a")
+        assert failures.retry_at("arn:a") == 1060.0
+        failures.failed("arn:a")
+        failures.failed("arn:a")
+        assert failures.retry_at("arn:a") == 1100.0
+        assert RoleFailures(str(path)).retry_at("arn:a") == 1100.0
+    assert failures.retry_at("arn:a") is None  # Backoff over
+
+    failures.succeeded("arn:a")
+    assert json.loads(path.read_text()) == {}
+
+
+def test_caches_survive_concurrent_writers(tmp_path):
+    """Test threads writing the failure and account caches at once don't fail, or lose each other's updates."""
+    path = str(tmp_path / "failures.json")
+    first, second = RoleFailures(path), RoleFailures(path)
+    source = OrganizationSource("Inventory", path=str(tmp_path / "accounts.json"))
+
+    def write(index):
+        (first if index % 2 else second).failed(f"arn:{index}")
+        source._write([str(index)])
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(write, range(40)))
+
+    assert sorted(json.loads((tmp_path / "failures.json").read_text())) == sorted(f"arn:{i}" for i in range(40))
+    assert len(json.loads((tmp_path / "accounts.json").read_text())["accounts"]) == 1
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_unwritable_failure_cache_does_not_fail_collection(tmp_path):
+    """Test a failure cache that can't be written keeps its entries in memory and logs instead of raising."""
+    blocker = tmp_path / "file"
+    blocker.write_text("")
+    failures = RoleFailures(str(blocker / "failures.json"))
+    failures.failed("arn:a")
+    assert failures.retry_at("arn:a") is not None
+
+
+def test_accounts_that_failed_recently_are_skipped(tmp_path):
+    """Test a refused role is not assumed again on the next run, while network errors are retried."""
+    config = {
+        "accounts": [{"account_id": account, "role_name": "TestRole"} for account in ("111", "222", "333")],
+        "regions": ["us-east-1"],
+        "role_failures": {"path": str(tmp_path / "failures.json")},
+    }
+    plugins = MagicMock()
+    plugins.names.return_value = ["ec2"]
+    plugins.__getitem__.return_value = MagicMock(plugin=MagicMock(return_value=[], filters=None))
+
+    def assume(account_id, role_name):
+        if account_id == "222":
+            raise ClientError({"Error": {"Code": "AccessDenied"}}, "AssumeRole")
+        if account_id == "333":
+            raise EndpointConnectionError(endpoint_url="https://sts.amazonaws.com")
+        return {"AccessKeyId": "key"}
+
+    with (
+        patch("cloudylist.utils.assume_role", side_effect=assume) as assume_role,
+        patch("cloudylist.utils.get_boto3_client"),
+    ):
+        list(iter_inventory(config, plugins))
+        tracker = MagicMock()
+        list(iter_inventory(config, plugins, trackers=[tracker]))
+
+    assert sorted(call.args[0] for call in assume_role.call_args_list) == ["111", "111", "222", "333", "333"]
+    failed = [call.args[0] for call in tracker.finished.call_args_list if call.args[1] == FAILED]
+    assert failed == [("222", "us-east-1", "ec2"), ("333", "us-east-1", "ec2")]
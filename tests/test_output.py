@@ -0,0 +1,46 @@
+import io
+import json
+import yaml
+from cloudylist.output import write_json, write_ndjson, write_yaml
+
+INVENTORY = [
+    {"account": "123456789012", "region": "us-east-1", "service": "ec2", "resources": [{"InstanceId": "i-1"}]},
+    {"account": "123456789012", "region": "global", "service": "s3", "resources": []},
+]
+
+
+def slices():
+    """Yield the inventory one slice at a time, like iter_inventory."""
+    yield from INVENTORY
+
+
+def test_write_json_streams_valid_array():
+    """Test the incremental JSON writer produces the same document as json.dumps."""
+    stream = io.StringIO()
+    assert write_json(slices(), stream) == 2
+    assert json.loads(stream.getvalue()) == INVENTORY
+
+
+def test_write_json_empty():
+    """Test an empty inventory is written as an empty array."""
+    stream = io.StringIO()
+    write_json(iter([]), stream)
+    assert json.loads(stream.getvalue()) == []
+
+
+def test_write_ndjson_one_slice_per_line():
+    """Test NDJSON writes each slice as one line."""
+    stream = io.StringIO()
+    assert write_ndjson(slices(), stream) == 2
+    assert [json.loads(line) for line in stream.getvalue().splitlines()] == INVENTORY
+
+
+def test_write_yaml_streams_sequence():
+    """Test the incremental YAML writer produces one sequence."""
+    stream = io.StringIO()
+    write_yaml(slices(), stream)
+    assert yaml.safe_load(stream.getvalue()) == INVENTORY
+
+    empty = io.StringIO()
+    write_yaml(iter([]), empty)
+    assert yaml.safe_load(empty.getvalue()) == []
@@ -0,0 +1,64 @@
+import json
+from unittest.mock import MagicMock, patch
+from cloudylist.plugins import PluginIndex, get_plugin, load_plugins
+from cloudylist.utils import iter_inventory
+
+TARGETS = {"ec2": "cloudylist.resources.ec2:list_resources", "s3": "cloudylist.resources.s3:list_resources"}
+
+
+def test_plugin_index_loads_plugins_lazily():
+    """Test the index resolves entry point targets only when a plugin is used."""
+    index = PluginIndex(TARGETS)
+    assert index.names() == ["ec2", "s3"]
+    assert "rds" not in index
+    assert index["ec2"]._plugin is None
+    assert index["ec2"].plugin.__name__ == "list_resources"
+
+
+def test_load_plugins_uses_cached_index(tmp_path):
+    """Test entry points are scanned once, then served from the cache while the environment is unchanged."""
+    with patch("cloudylist.plugins._discover", return_value=TARGETS) as mock_discover:
+        first = load_plugins(cache_dir=str(tmp_path))
+        second = load_plugins(cache_dir=str(tmp_path))
+
+    mock_discover.assert_called_once_with("resources")
+    assert first.names() == second.names() == ["ec2", "s3"]
+
+
+def test_load_plugins_rescans_when_environment_changes(tmp_path):
+    """Test a stale fingerprint forces a rescan."""
+    (tmp_path / "plugins-resources.json").write_text(json.dumps({"fingerprint": "stale", "plugins": {}}))
+
+    with patch("cloudylist.plugins._discover", return_value=TARGETS) as mock_discover:
+        index = load_plugins(cache_dir=str(tmp_path))
+
+    mock_discover.assert_called_once()
+    assert index.names() == ["ec2", "s3"]
+
+
+def test_broken_cached_plugin_invalidates_index(tmp_path):
+    """Test a cached target that no longer imports removes the index so the next run rescans."""
+    with patch("cloudylist.plugins._discover", return_value={"gone": "cloudylist.resources.gone:list_resources"}):
+        index = load_plugins(cache_dir=str(tmp_path))
+
+    assert get_plugin(index, "gone") is None
+    assert not (tmp_path / "plugins-resources.json").exists()
+
+
+def test_iter_inventory_skips_plugins_that_no_longer_import():
+    """Test a cached plugin that fails to import is logged and left out while the others still run."""
+    index = PluginIndex({"gone": "cloudylist.resources.gone:list_resources", **TARGETS})
+    config = {"accounts": [{"account_id": "123456789012", "role_name": "TestRole"}], "regions": ["us-east-1"]}
+
+    with (
+        patch("cloudylist.utils.assume_role", return_value={"AccessKeyId": "key"}),
+        patch("cloudylist.utils.get_boto3_client"),
+        patch("cloudylist.plugins.logger.error") as mock_error,
+    ):
+        tracker = MagicMock()
+        inventory = list(iter_inventory(config, index, trackers=[tracker]))
+
+    workspace = tracker.start.call_args.args[0]
+    assert (workspace["account_plugins"], workspace["regional_plugins"]) == (["s3"], ["ec2"])
+    assert [item["service"] for item in inventory] == ["ec2"]  # The mocked client lists no buckets
+    assert "Skipping plugin gone" in mock_error.call_args.args[0]
@@ -0,0 +1,106 @@
+import os
+import queue
+from collections import deque
+from unittest.mock import MagicMock, patch
+from cloudylist.metrics import Metrics, set_metrics
+from cloudylist.processes import assign_accounts, process_map
+from cloudylist.throttle import RequestScheduler
+from cloudylist.tracking import FAILED
+from cloudylist.utils import iter_inventory
+
+CREDENTIALS = {"AccessKeyId": "key", "SecretAccessKey": "secret", "SessionToken": "token"}
+
+
+def list_instances(client):
+    """A plugin worker processes can import: reports the process and region it ran in."""
+    region = client.meta.region_name
+    if client._request_signer._credentials.access_key == os.environ.get("CLOUDYLIST_TEST_CRASH"):
+        os._exit(1)
+    return [{"InstanceId": f"i-{region}", "Pid": os.getpid()}]
+
+
+def make_plugins():
+    plugins = MagicMock()
+    plugins.names.return_value = ["ec2"]
+    plugins.__getitem__.return_value = MagicMock(plugin=list_instances)
+    return plugins
+
+
+def make_config(processes):
+    return {
+        "accounts": [{"account_id": account, "role_name": "TestRole"} for account in ("111", "222", "333")],
+        "regions": ["us-east-1", "eu-west-1"],
+        "concurrency": {"processes": processes, "max_workers": 2},
+    }
+
+
+def test_assign_accounts_balances_whole_accounts():
+    """Test each account's tasks go to one worker, largest accounts first to the least loaded worker."""
+    slots = [("a", "r")] * 4 + [("b", "r")] * 2 + [("c", "r")] * 2 + [("d", "r")]
+    assert assign_accounts(slots, 2) == [[0, 1, 2, 3, 8], [4, 5, 6, 7]]
+    assert assign_accounts(slots[:2], 4) == [[0, 1]]
+
+
+def test_worker_processes_match_threaded_collection():
+    """Test worker processes return the same slices in the same order, each account on a single process."""
+    with patch("cloudylist.utils.assume_role", return_value=CREDENTIALS):
+        threaded = list(iter_inventory(make_config(0), make_plugins()))
+        metrics = set_metrics(Metrics())
+        collected = list(iter_inventory(make_config(2), make_plugins()))
+
+    strip = [[{"InstanceId": r["InstanceId"]} for r in item["resources"]] for item in collected]
+    assert strip == [[{"InstanceId": r["InstanceId"]} for r in item["resources"]] for item in threaded]
+    pids = {item["account"]: {r["Pid"] for r in item["resources"]} for item in collected}
+    assert all(len(account_pids) == 1 for account_pids in pids.values())
+    assert len(set.union(*pids.values()) - {os.getpid()}) == 2
+    assert metrics.stage_seconds("plugin") > 0  # Merged from the workers
+
+
+def test_tasks_of_a_crashed_worker_fail(monkeypatch):
+    """Test a worker that dies fails its unfinished tasks instead of hanging the run."""
+    monkeypatch.setenv("CLOUDYLIST_TEST_CRASH", "key-222")
+    tracker = MagicMock()
+    with patch(
+        "cloudylist.utils.assume_role",
+        side_effect=lambda account_id, role_name: {**CREDENTIALS, "AccessKeyId": f"key-{account_id}"},
+    ):
+        collected = list(iter_inventory(make_config(3), make_plugins(), trackers=[tracker]))
+
+    assert [(item["account"], item["region"]) for item in collected] == [
+        ("111", "us-east-1"),
+        ("111", "eu-west-1"),
+        ("333", "us-east-1"),
+        ("333", "eu-west-1"),
+    ]
+    failed = [call.args[0] for call in tracker.finished.call_args_list if call.args[1] == FAILED]
+    assert failed == [("222", "us-east-1", "ec2"), ("222", "eu-west-1", "ec2")]
+
+
+def test_batches_sent_just_before_a_worker_exits_are_kept():
+    """Test a worker that exits between the parent's wait timing out and its liveness check isn't failed."""
+    messages = deque()
+
+    def get_nowait():
+        if not messages:
+            raise queue.Empty
+        return messages.popleft()
+
+    results = MagicMock(get=MagicMock(side_effect=queue.Empty), get_nowait=get_nowait)
+
+    def start_worker(target, args, name):
+        worker, _, _, _, assigned, _ = args
+        # The worker has already sent everything and exited by the time the parent looks
+        messages.append((worker, [(index, [f"slice-{index}"]) for index, _, _ in assigned], None))
+        messages.append((worker, None, (RequestScheduler().stats(), Metrics())))
+        return MagicMock(is_alive=MagicMock(return_value=False), exitcode=0, name=name)
+
+    context = MagicMock(Queue=MagicMock(return_value=results), Process=MagicMock(side_effect=start_worker))
+    settings = {"processes": 2, "start_method": "spawn"}
+    with patch("cloudylist.processes.multiprocessing.get_context", return_value=context):
+        outcomes = list(
+            process_map(
+                list_instances, [(), (), ()], [("1", "r"), ("2", "r"), ("1", "r")], {}, settings, RequestScheduler()
+            )
+        )
+
+    assert outcomes == [["slice-0"], ["slice-1"], ["slice-2"]]
@@ -0,0 +1,83 @@
+import time
+from unittest.mock import MagicMock, patch
+from cloudylist.regions import EMPTY, RegionIndex, configure_region_index, describe_opt_in
+from cloudylist.utils import collect_inventory, iter_inventory
+
+
+def test_select_skips_disabled_and_empty_regions():
+    """Test regions not opted in, or recently found empty, are skipped until they are due a re-probe."""
+    index = RegionIndex(reprobe_interval=3600)
+    index.set_opt_in("123456789012", {"us-east-1": "opt-in-not-required", "ap-east-1": "not-opted-in"})
+    index.record("123456789012", "us-west-2", active=False)
+    index.record("123456789012", "eu-west-1", active=True)
+    regions = ["us-east-1", "us-west-2", "eu-west-1", "ap-east-1"]
+    assert index.select("123456789012", regions) == ["us-east-1", "eu-west-1"]
+
+    index._accounts["123456789012"]["regions"]["us-west-2"]["checked"] = time.time() - 7200
+    assert index.select("123456789012", regions) == ["us-east-1", "us-west-2", "eu-west-1"]
+    assert index.select("987654321098", regions) == regions
+
+
+def test_index_persists_between_runs(tmp_path):
+    """Test opt-in status and region states survive a reload from the index file."""
+    path = str(tmp_path / "regions.json")
+    index = RegionIndex(path, opt_in_ttl=3600)
+    index.set_opt_in("123456789012", {"ap-east-1": "not-opted-in"})
+    index.record("123456789012", "us-west-2", active=False)
+    index.save()
+
+    reloaded = RegionIndex(path, opt_in_ttl=3600)
+    assert not reloaded.needs_opt_in("123456789012")
+    assert reloaded.needs_opt_in("987654321098")
+    assert reloaded._accounts["123456789012"]["regions"]["us-west-2"]["state"] == EMPTY
+    assert reloaded.select("123456789012", ["us-east-1", "us-west-2", "ap-east-1"]) == ["us-east-1"]
+
+
+def test_describe_opt_in(mock_ec2_instances):
+    """Test opt-in status is read for every region from DescribeRegions."""
+    statuses = describe_opt_in(mock_ec2_instances)
+    assert "us-east-1" in statuses
+    assert all(isinstance(status, str) for status in statuses.values())
+
+
+def test_collect_inventory_skips_empty_regions(tmp_path):
+    """Test a region where nothing was found is skipped on the next run unless all regions are requested."""
+    mock_config = {
+        "accounts": [{"account_id": "123456789012", "role_name": "TestRole"}],
+        "regions": ["us-east-1", "us-west-2", "ap-east-1"],
+        "region_index": {"path": str(tmp_path / "regions.json")},
+    }
+    mock_plugins = MagicMock()
+    mock_plugins.names.return_value = ["ec2"]
+    mock_plugins["ec2"].plugin.side_effect = lambda client: (
+        [{"InstanceId": "i-1"}] if client.region == "us-east-1" else []
+    )
+    mock_client = MagicMock()
+    mock_client.describe_regions.return_value = {
+        "Regions": [
+            {"RegionName": "us-east-1", "OptInStatus": "opt-in-not-required"},
+            {"RegionName": "us-west-2", "OptInStatus": "opt-in-not-required"},
+            {"RegionName": "ap-east-1", "OptInStatus": "not-opted-in"},
+        ]
+    }
+
+    def get_client(service, credentials, region):
+        if mock_client.describe_regions.call_count == 0:
+            return mock_client
+        return MagicMock(region=region)
+
+    try:
+        with (
+            patch("cloudylist.utils.assume_role", return_value={"AccessKeyId": "key"}),
+            patch("cloudylist.utils.get_boto3_client", side_effect=get_client),
+        ):
+            first = collect_inventory(mock_config, mock_plugins)
+            second = collect_inventory(mock_config, mock_plugins)
+            forced = list(iter_inventory(mock_config, mock_plugins, all_regions=True))
+    finally:
+        configure_region_index(None)
+
+    assert [item["region"] for item in first] == ["us-east-1", "us-west-2"]
+    assert [item["region"] for item in second] == ["us-east-1"]
+    assert [item["region"] for item in forced] == ["us-east-1", "us-west-2", "ap-east-1"]
+    mock_client.describe_regions.assert_called_once_with(AllRegions=True)
@@ -5,6 +5,7 @@ import boto3
 from cloudylist.resources.ec2 import list_resources as list_ec2_resources
 from cloudylist.resources.s3 import list_resources as list_s3_resources
 from cloudylist.resources.rds import list_resources as list_rds_resources
+from cloudylist.resources import PARTITIONED, REGIONAL, ResourceQuery, get_scope, scope
 
 
 @pytest.fixture
@@ -65,7 +66,7 @@ def mock_rds_client():
 
 def test_list_resources_ec2(mock_ec2_client):
     """Test EC2 list_resources."""
-    result = list_ec2_resources(mock_ec2_client)
+    result = list(list_ec2_resources(mock_ec2_client))
     assert len(result) == 1
     assert result[0]["InstanceId"] == "i-12345678"
     assert result[0]["State"] == "running"
@@ -74,7 +75,7 @@ def test_list_resources_ec2(mock_ec2_client):
 
 def test_list_resources_s3(mock_s3_client):
     """Test S3 list_resources."""
-    result = list_s3_resources(mock_s3_client)
+    result = list(list_s3_resources(mock_s3_client))
     print(result)
     assert len(result) == 1
     assert result[0]["Name"] == "my-bucket"
@@ -83,8 +84,109 @@ def test_list_resources_s3(mock_s3_client):
 
 def test_list_resources_rds(mock_rds_client):
     """Test RDS list_resources."""
-    result = list_rds_resources(mock_rds_client)
+    result = list(list_rds_resources(mock_rds_client))
     print(result)
     assert len(result) == 1
     assert result[0]["DBInstanceIdentifier"] == "test-db"
     assert result[0]["Status"] == "available"
+
+
+def test_list_resources_ec2_paginates():
+    """Test EC2 list_resources yields instances from every page, not just the first."""
+    client = MagicMock()
+    client.get_paginator.return_value.paginate.return_value = iter(
+        [
+            {
+                "Reservations": [
+                    {"Instances": [{"InstanceId": "i-1", "State": {"Name": "running"}, "InstanceType": "t3.micro"}]}
+                ]
+            },
+            {
+                "Reservations": [
+                    {"Instances": [{"InstanceId": "i-2", "State": {"Name": "stopped"}, "InstanceType": "t3.large"}]}
+                ]
+            },
+        ]
+    )
+
+    result = list_ec2_resources(client)
+
+    client.get_paginator.assert_not_called()  # Nothing is fetched until the generator is consumed
+    assert [instance["InstanceId"] for instance in result] == ["i-1", "i-2"]
+    client.get_paginator.assert_called_once_with("describe_instances")
+
+
+def test_plugin_scopes():
+    """Test plugins declare their scope and undeclared plugins default to regional."""
+    assert get_scope(list_s3_resources) == PARTITIONED
+    assert list_s3_resources.partition_key == "Region"
+    assert get_scope(list_ec2_resources) == REGIONAL
+    assert get_scope(MagicMock()) == REGIONAL
+    with pytest.raises(ValueError):
+        scope(PARTITIONED)
+
+
+def test_resource_query_parse_and_match():
+    """Test command line filters are parsed and matched against state, type and tags."""
+    query = ResourceQuery.parse(["running"], None, ["Team=core", "Backup"], "InstanceId, VpcId")
+    assert query.requested() == ("state", "tag")
+    assert query.fields == ["InstanceId", "VpcId"]
+    assert query.matches("running", "t3.micro", {"Team": "core", "Backup": ""})
+    assert not query.matches("running", "t3.micro", {"Team": "data", "Backup": ""})
+    assert not query.matches("stopped", "t3.micro", {"Team": "core", "Backup": ""})
+    assert query.project({"InstanceId": "i-1", "State": "running"}, {"VpcId": "vpc-1"}) == {
+        "InstanceId": "i-1",
+        "VpcId": "vpc-1",
+    }
+    assert query.supported_by(list_ec2_resources)
+    assert not query.supported_by(list_s3_resources)
+
+
+def test_list_resources_ec2_pushes_filters_down():
+    """Test EC2 filters and page size are sent to DescribeInstances rather than applied afterwards."""
+    client = MagicMock()
+    client.get_paginator.return_value.paginate.return_value = iter([])
+    query = ResourceQuery.parse(["running"], ["t3.micro"], ["Team=core", "Backup"], page_size=500)
+
+    list(list_ec2_resources(client, query))
+
+    client.get_paginator.return_value.paginate.assert_called_once_with(
+        Filters=[
+            {"Name": "instance-state-name", "Values": ["running"]},
+            {"Name": "instance-type", "Values": ["t3.micro"]},
+            {"Name": "tag:Team", "Values": ["core"]},
+            {"Name": "tag-key", "Values": ["Backup"]},
+        ],
+        PaginationConfig={"PageSize": 500},
+    )
+
+
+def test_list_resources_ec2_filters_with_moto():
+    """Test only tagged instances come back, projected onto the requested fields."""
+    with mock_aws():
+        client = boto3.client("ec2", region_name="us-east-1")
+        client.run_instances(ImageId="ami-12345678", MinCount=2, MaxCount=2, InstanceType="t2.micro")
+        client.run_instances(
+            ImageId="ami-12345678",
+            MinCount=1,
+            MaxCount=1,
+            InstanceType="t3.micro",
+            TagSpecifications=[{"ResourceType": "instance", "Tags": [{"Key": "Team", "Value": "core"}]}],
+        )
+
+        result = list(list_ec2_resources(client, ResourceQuery.parse(tags=["Team=core"], fields="Type,VpcId")))
+
+    assert len(result) == 1
+    assert result[0]["Type"] == "t3.micro"
+    assert result[0]["VpcId"].startswith("vpc-")
+    assert list(result[0]) == ["Type", "VpcId"]
+
+
+def test_list_resources_rds_filters_client_side(mock_rds_client):
+    """Test RDS filters are applied to each instance, since the API cannot filter on them."""
+    running = ResourceQuery.parse(["available"], ["db.t2.micro"], fields="DBInstanceIdentifier,DBInstanceClass")
+    assert list(list_rds_resources(mock_rds_client, running)) == [
+        {"DBInstanceIdentifier": "test-db", "DBInstanceClass": "db.t2.micro"}
+    ]
+    assert list(list_rds_resources(mock_rds_client, ResourceQuery.parse(["stopped"]))) == []
+    assert list(list_rds_resources(mock_rds_client, ResourceQuery.parse(tags=["Team"]))) == []
@@ -0,0 +1,105 @@
+import json
+import os
+import pytest
+import typer
+from unittest.mock import MagicMock, patch
+from cloudylist.main import query
+from cloudylist.search import InventoryIndex, index_path, parse_where
+
+INVENTORY = [
+    {
+        "account": "111111111111",
+        "region": "us-west-2",
+        "service": "ec2",
+        "resources": [
+            {"InstanceId": "i-0abc", "State": "stopped", "Type": "t3.micro"},
+            {"InstanceId": "i-0def", "State": "running", "Type": "t3.large"},
+            {"InstanceId": "i-0fed", "State": "stopped", "Type": "m5.large"},
+        ],
+    },
+    {
+        "account": "222222222222",
+        "region": "us-east-1",
+        "service": "ec2",
+        "resources": [{"InstanceId": "i-0123", "State": "stopped", "Type": "t3.small"}],
+    },
+    {
+        "account": "222222222222",
+        "region": "eu-west-1",
+        "service": "s3",
+        "resources": [{"Name": "logs", "CreationDate": "2024-01-01", "Region": "eu-west-1"}],
+    },
+]
+
+
+def write_ndjson(path):
+    path.write_text("".join(json.dumps(item) + "\n" for item in INVENTORY))
+    return str(path)
+
+
+def test_index_answers_lookups_and_filters(tmp_path):
+    """Test lookups by ID, slice fields and indexed or scanned resource fields, with wildcards."""
+    index = InventoryIndex(write_ndjson(tmp_path / "inventory.ndjson"), {"ec2": "InstanceId", "s3": "Name"}.get)
+    try:
+        [owner] = index.search(ids=["i-0abc"])
+        assert owner["account"] == "111111111111" and owner["service"] == "ec2"
+
+        stopped_t3 = index.search(regions=["us-west-2"], where={"State": "stopped", "Type": "t3.*"})
+        assert [row["InstanceId"] for row in stopped_t3] == ["i-0abc"]
+        assert [row["InstanceId"] for row in index.search(where={"State": "stopped"}, limit=2)] == ["i-0abc", "i-0fed"]
+        assert [row["Name"] for row in index.search(where={"CreationDate": "2024-*"})] == ["logs"]
+        assert list(index.search(accounts=["3*"])) == []
+    finally:
+        index.close()
+
+
+def test_index_sidecar_is_reused_until_the_inventory_changes(tmp_path):
+    """Test the sidecar is built once, reused while the file is unchanged and rebuilt when it changes."""
+    path = write_ndjson(tmp_path / "inventory.ndjson")
+    with patch.object(InventoryIndex, "_build", autospec=True, side_effect=InventoryIndex._build) as build:
+        InventoryIndex(path).close()
+        InventoryIndex(path).close()
+        assert build.call_count == 1
+        assert os.path.exists(index_path(path))
+
+        with open(path, "a") as f:
+            f.write(json.dumps({"account": "3", "region": "us-east-1", "service": "ec2", "resources": []}) + "\n")
+        index = InventoryIndex(path)
+        assert build.call_count == 2
+        assert list(index.search(accounts=["3"])) == []
+        index.close()
+
+
+def test_query_command_reads_json_inventories(tmp_path):
+    """Test the query command works on JSON inventories too, writing matching rows in the chosen format."""
+    path = tmp_path / "inventory.json"
+    path.write_text(json.dumps(INVENTORY))
+    output = tmp_path / "rows.json"
+    plugins = MagicMock()
+    plugins.names.return_value = []
+
+    with patch("cloudylist.main.load_plugins", return_value=plugins) as mock_load:
+        query(str(path), service=["ec2"], where=["State=stopped"], format="json", output=str(output))
+        query(str(path), service=["s3"], format="json", output=str(tmp_path / "buckets.json"))
+        assert mock_load.call_count == 2  # Once per service while indexing, not at all with a fresh sidecar
+
+    rows = json.loads(output.read_text())
+    assert [row["InstanceId"] for row in rows] == ["i-0abc", "i-0fed", "i-0123"]
+    assert [row["Name"] for row in json.loads((tmp_path / "buckets.json").read_text())] == ["logs"]
+    assert parse_where(["Type=t3.*"]) == {"Type": "t3.*"}
+
+
+def test_query_command_reports_unreadable_inventories(tmp_path):
+    """Test a missing or malformed inventory is reported on the console, leaving no temporary sidecar behind."""
+    broken = tmp_path / "broken.ndjson"
+    broken.write_text(json.dumps({"account": "1", "region": "us-east-1"}) + "\n")
+    console = MagicMock()
+
+    with patch("cloudylist.main.get_console", return_value=console):
+        for path in (tmp_path / "missing.ndjson", broken):
+            with pytest.raises(typer.Exit):
+                query(str(path))
+
+    messages = [call.args[0] for call in console.print.call_args_list]
+    assert "No inventory file at" in messages[0] and "Could not index" in messages[1]
+    assert os.listdir(tmp_path) == ["broken.ndjson"]
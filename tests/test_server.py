@@ -0,0 +1,161 @@
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+import boto3
+import pytest
+from moto import mock_aws
+from unittest.mock import MagicMock, patch
+from cloudylist import utils
+from cloudylist.plugins import PluginIndex
+from cloudylist.server import InventoryServer, InventoryStore
+
+
+def ec2_slice(account, region, instance_id):
+    return {"account": account, "region": region, "service": "ec2", "resources": [{"InstanceId": instance_id}]}
+
+
+def get(url, etag=None):
+    """Return (status, headers, body) for a GET, including error statuses."""
+    request = urllib.request.Request(url, headers={"If-None-Match": etag} if etag else {})
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, response.headers, json.loads(response.read() or b"null")
+    except urllib.error.HTTPError as e:
+        body = e.read()
+        return e.code, e.headers, json.loads(body) if body else None
+
+
+@pytest.fixture
+def serving():
+    """Start an HTTP server on a free port for an InventoryServer, and stop it afterwards."""
+    servers = []
+
+    def start(server):
+        httpd = server.http_server("127.0.0.1", 0)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        servers.append(httpd)
+        return f"http://127.0.0.1:{httpd.server_port}"
+
+    yield start
+    for httpd in servers:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def test_store_replace_keeps_failed_tasks_and_generations():
+    """Test a refresh only bumps the generation when slices change, and failed tasks keep their old slices."""
+    store = InventoryStore()
+    assert store.replace("ec2", [ec2_slice("1", "us-east-1", "i-1"), ec2_slice("1", "us-west-2", "i-2")])
+    assert not store.replace("ec2", [ec2_slice("1", "us-east-1", "i-1"), ec2_slice("1", "us-west-2", "i-2")])
+    assert store.generations["ec2"] == 1
+
+    assert store.replace("ec2", [ec2_slice("1", "us-east-1", "i-3")], failed={("1", "us-west-2", "ec2")})
+    _, slices = store.query({"account": [], "region": [], "service": []})
+    assert [item["resources"][0]["InstanceId"] for item in slices] == ["i-3", "i-2"]
+    assert store.generations["ec2"] == 2
+
+
+def test_http_filters_and_conditional_requests(serving):
+    """Test /inventory filters by account, region and service and answers If-None-Match with 304."""
+    plugins = MagicMock()
+    plugins.names.return_value = ["ec2", "rds"]
+    server = InventoryServer({"accounts": [], "regions": []}, plugins)
+    url = serving(server)
+
+    assert get(f"{url}/inventory")[0] == 503
+    server.store.replace("ec2", [ec2_slice("1", "us-east-1", "i-1"), ec2_slice("2", "us-west-2", "i-2")])
+    server.store.replace("rds", [])
+
+    status, headers, body = get(f"{url}/inventory?account=2&service=ec2,rds")
+    assert status == 200
+    assert body == [ec2_slice("2", "us-west-2", "i-2")]
+    etag = headers["ETag"]
+
+    assert get(f"{url}/inventory?account=2&service=ec2,rds", etag)[0] == 304
+    server.store.replace("rds", [])  # Unchanged, so the ETag still holds
+    assert get(f"{url}/inventory?account=2&service=ec2,rds", etag)[0] == 304
+    server.store.replace("ec2", [ec2_slice("2", "us-west-2", "i-9")])
+    assert get(f"{url}/inventory?account=2&service=ec2,rds", etag)[0] == 200
+
+    status, _, health = get(f"{url}/health")
+    assert health["ready"] and health["services"]["ec2"]["generation"] == 2
+    assert get(f"{url}/missing")[0] == 404
+
+
+def test_refresh_collects_one_service_from_moto(serving):
+    """Test a refresh collects only its own service across accounts and regions, against moto."""
+    config = {"accounts": [{"account_id": "123456789012", "role_name": "TestRole"}], "regions": ["us-east-1"]}
+    plugins = PluginIndex(
+        {"ec2": "cloudylist.resources.ec2:list_resources", "rds": "cloudylist.resources.rds:list_resources"}
+    )
+    with mock_aws():
+        boto3.client("ec2", region_name="us-east-1").run_instances(ImageId="ami-12345678", MinCount=2, MaxCount=2)
+        server = InventoryServer(config, plugins)
+        with patch("cloudylist.server.iter_inventory", wraps=utils.iter_inventory) as spy:
+            server.refresh("ec2")
+        assert spy.call_args.kwargs["query"].services == ["ec2"]
+
+    url = serving(server)
+    status, _, body = get(f"{url}/inventory?service=ec2")
+    assert status == 503  # rds has not been collected yet
+    server.store.replace("rds", [])
+    status, _, body = get(f"{url}/inventory?service=ec2&region=us-east-1")
+    assert status == 200
+    assert len(body[0]["resources"]) == 2
+
+
+def test_serve_against_moto_server(serving):
+    """Test the daemon end to end against a standalone moto server, as it would run locally."""
+    moto_server = pytest.importorskip("moto.server")
+    backend = moto_server.ThreadedMotoServer(port=0, verbose=False)
+    backend.start()
+    host, port = backend.get_host_and_port()
+    config = {"accounts": [{"account_id": "123456789012", "role_name": "TestRole"}], "regions": ["us-east-1"]}
+    environment = {
+        "AWS_ENDPOINT_URL": f"http://{host}:{port}",
+        "AWS_ACCESS_KEY_ID": "testing",
+        "AWS_SECRET_ACCESS_KEY": "testing",
+        "AWS_DEFAULT_REGION": "us-east-1",
+    }
+    try:
+        with patch.dict(os.environ, environment):
+            boto3.client("ec2").run_instances(ImageId="ami-12345678", MinCount=1, MaxCount=1)
+            server = InventoryServer(config, PluginIndex({"ec2": "cloudylist.resources.ec2:list_resources"}))
+            server.refresh("ec2")
+    finally:
+        backend.stop()
+
+    status, _, body = get(f"{serving(server)}/inventory")
+    assert status == 200
+    assert len(body[0]["resources"]) == 1
+
+
+def test_refreshes_share_one_scheduler_and_configuration():
+    """Test the process is configured once at start, and every refresh thread paces on the server's scheduler."""
+    config = {"accounts": [{"account_id": "123456789012", "role_name": "TestRole"}], "regions": ["us-east-1"]}
+    plugins = MagicMock()
+    plugins.names.return_value = ["ec2", "rds"]
+    plugins.__getitem__.return_value = MagicMock(plugin=MagicMock(return_value=[], filters=None))
+    server = InventoryServer(config, plugins)
+
+    with (
+        patch("cloudylist.utils.configure_client_pool") as configure_pool,
+        patch("cloudylist.utils.configure_credential_cache") as configure_cache,
+        patch("cloudylist.server.iter_inventory", wraps=utils.iter_inventory) as spy,
+        patch("cloudylist.utils.assume_role", return_value={"AccessKeyId": "key"}),
+        patch("cloudylist.utils.get_boto3_client"),
+    ):
+        server.start()
+        for _ in range(500):
+            if server.ready():
+                break
+            time.sleep(0.01)
+        server.stop()
+
+    assert server.ready()
+    assert configure_pool.call_count == configure_cache.call_count == 1
+    assert configure_pool.call_args.args[1] == 2 + 1 * (1 + 1)  # Two tasks, plus lookups for the account
+    assert {call.kwargs["scheduler"] for call in spy.call_args_list} == {server.scheduler}
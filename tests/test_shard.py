@@ -0,0 +1,119 @@
+import json
+import pytest
+import typer
+from unittest.mock import MagicMock, patch
+from cloudylist.main import merge, show_inventory
+from cloudylist.shard import (
+    ShardManifest,
+    in_shard,
+    merge_inventories,
+    overlapping_tasks,
+    parse_shard,
+    shard_of,
+    workspace_keys,
+)
+
+WORKSPACE = {
+    "accounts": ["111111111111", "222222222222", "333333333333"],
+    "regions": ["us-east-1", "us-west-2", "eu-west-1"],
+    "account_plugins": ["s3"],
+    "regional_plugins": ["ec2", "rds"],
+}
+
+
+def test_parse_shard():
+    """Test shards are parsed as i/N and out of range or malformed values are rejected."""
+    assert parse_shard("2/4") == (2, 4)
+    for value in ("0/4", "5/4", "2", "a/b"):
+        with pytest.raises(ValueError):
+            parse_shard(value)
+
+
+def test_shards_partition_the_work_space():
+    """Test every task lands in exactly one shard, the same one every time."""
+    keys = workspace_keys(WORKSPACE)
+    assert len(keys) == 3 * (1 + 3 * 2)
+    shards = [[key for key in keys if in_shard(key, (index, 3))] for index in (1, 2, 3)]
+    assert sorted(key for shard in shards for key in shard) == sorted(keys)
+    assert all(shards)
+    # Assignments must not change between hosts or releases, or shards from different runs won't merge
+    assert shard_of(("111111111111", "us-east-1", "ec2"), 3) == 2
+    assert shard_of(("111111111111", "us-east-1", "ec2"), 1000) == 57
+
+
+def test_merge_inventories_deduplicates(tmp_path):
+    """Test shards are streamed in order, each resource once by its ID, repeating a slice only for new resources."""
+    first = tmp_path / "a.ndjson"
+    second = tmp_path / "b.json"
+    slice_a = {"account": "1", "region": "us-east-1", "service": "ec2", "resources": [{"InstanceId": "i-1"}]}
+    slice_b = {
+        "account": "1",
+        "region": "us-east-1",
+        "service": "ec2",
+        "resources": [{"InstanceId": "i-1"}, {"InstanceId": "i-2"}],
+    }
+    first.write_text(json.dumps(slice_a) + "\n")
+    second.write_text(json.dumps([slice_b]))
+
+    merged = merge_inventories([str(first), str(second), str(first)], {"ec2": "InstanceId"}.get)
+
+    assert list(merged) == [slice_a, {**slice_a, "resources": [{"InstanceId": "i-2"}]}]
+    # Without an ID field, only identical resources are duplicates
+    second.write_text(json.dumps([{**slice_b, "resources": [{"InstanceId": "i-1", "State": "stopped"}]}]))
+    assert len(list(merge_inventories([str(first), str(second)]))) == 2
+
+
+def test_merge_inventories_keeps_keys_only_for_shared_tasks(tmp_path):
+    """Test only slices of tasks in several manifests are deduplicated across files."""
+    first = tmp_path / "a.ndjson"
+    second = tmp_path / "b.ndjson"
+    slices = [
+        {"account": "1", "region": "us-east-1", "service": "ec2", "resources": [{"InstanceId": "i-1"}]},
+        {"account": "1", "region": "eu-west-1", "service": "s3", "resources": [{"Name": "bucket"}]},
+    ]
+    for path in (first, second):
+        path.write_text("".join(json.dumps(item) + "\n" for item in slices))
+    manifests = [ShardManifest((1, 2)), ShardManifest((2, 2))]
+    manifests[0].tasks = {("1", "us-east-1", "ec2"): "done", ("1", "global", "s3"): "done"}
+    manifests[1].tasks = {("1", "global", "s3"): "done", ("1", "us-west-2", "ec2"): "done"}
+    shared = overlapping_tasks(manifests)
+    assert shared == {("1", "global", "s3")}
+
+    merged = list(merge_inventories([str(first), str(second)], {"ec2": "InstanceId", "s3": "Name"}.get, shared))
+
+    # The account-wide s3 task covers its regional slices; ec2 is trusted to come from one shard
+    assert merged == [*slices, slices[0]]
+
+
+def test_sharded_runs_merge_into_full_inventory(tmp_path):
+    """Test each shard writes a manifest, and merge checks every shard and task is present."""
+    mock_config = {
+        "accounts": [{"account_id": account, "role_name": "TestRole"} for account in WORKSPACE["accounts"]],
+        "regions": WORKSPACE["regions"],
+    }
+    mock_plugins = MagicMock()
+    mock_plugins.names.return_value = ["ec2", "rds"]
+    extensions = {
+        "ec2": MagicMock(plugin=MagicMock(return_value=[{"InstanceId": "i-1"}], filters=None)),
+        "rds": MagicMock(plugin=MagicMock(return_value=[], filters=None)),
+    }
+    mock_plugins.__getitem__.side_effect = extensions.__getitem__
+    outputs = [str(tmp_path / f"shard-{index}.ndjson") for index in (1, 2)]
+
+    with (
+        patch("cloudylist.main.load_config", return_value=mock_config),
+        patch("cloudylist.main.load_plugins", return_value=mock_plugins),
+        patch("cloudylist.utils.assume_role", return_value={"AccessKeyId": "key"}),
+        patch("cloudylist.utils.get_boto3_client"),
+    ):
+        for index, output in enumerate(outputs, start=1):
+            show_inventory(config_file="config.yml", format="ndjson", output=output, shard=f"{index}/2")
+
+        with pytest.raises(typer.Exit):
+            merge([outputs[0]], config_file="config.yml", format="json", output=str(tmp_path / "partial.json"))
+        merge(outputs, config_file="config.yml", format="json", output=str(tmp_path / "merged.json"))
+
+    merged = json.loads((tmp_path / "merged.json").read_text())
+    assert len(merged) == len(WORKSPACE["accounts"]) * len(WORKSPACE["regions"]) * 2
+    assert len({(item["account"], item["region"], item["service"]) for item in merged}) == len(merged)
+    assert not (tmp_path / "partial.json").exists()
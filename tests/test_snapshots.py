@@ -0,0 +1,92 @@
+import json
+from unittest.mock import MagicMock, patch
+from cloudylist.main import diff, show_inventory
+from cloudylist.snapshots import SnapshotRecorder, SnapshotStore
+from cloudylist.tracking import DONE, FAILED
+
+
+def ec2_slice(region, *instances):
+    return {"account": "1", "region": region, "service": "ec2", "resources": list(instances)}
+
+
+def record(store, slices, failed=()):
+    """Record a run through a SnapshotRecorder, as iter_inventory would drive it."""
+    recorder = SnapshotRecorder(store, "all", {"ec2": "InstanceId"})
+    recorder.start({}, [])
+    for item in slices:
+        recorder.finished(("1", item["region"], "ec2"), DONE, [item])
+    for key in failed:
+        recorder.finished(key, FAILED)
+    recorder.finish()
+    return recorder.run
+
+
+def test_diff_reports_added_removed_and_modified(tmp_path):
+    """Test resources are matched by ID across runs, and slices with unchanged hashes are not read."""
+    store = SnapshotStore(str(tmp_path / "snapshots.db"))
+    unchanged = ec2_slice("us-west-2", {"InstanceId": "i-9", "State": "running"})
+    first = record(
+        store, [ec2_slice("us-east-1", {"InstanceId": "i-1", "State": "running"}, {"InstanceId": "i-2"}), unchanged]
+    )
+    second = record(
+        store, [ec2_slice("us-east-1", {"InstanceId": "i-1", "State": "stopped"}, {"InstanceId": "i-3"}), unchanged]
+    )
+
+    with patch.object(store, "_resources", wraps=store._resources) as read:
+        changes = list(store.diff(first, second))
+
+    assert [(change["change"], change["id"]) for change in changes] == [
+        ("added", "i-3"),
+        ("removed", "i-2"),
+        ("modified", "i-1"),
+    ]
+    assert changes[2]["previous"]["State"] == "running" and changes[2]["resource"]["State"] == "stopped"
+    assert read.call_count == 2  # Only the us-east-1 slice of each run
+    assert list(store.diff(second, second)) == []
+
+
+def test_failed_tasks_keep_previous_slices_and_old_runs_are_pruned(tmp_path):
+    """Test a failed task does not show its resources as removed, and only the newest `keep` runs stay."""
+    store = SnapshotStore(str(tmp_path / "snapshots.db"), keep=2)
+    first = record(
+        store, [ec2_slice("us-east-1", {"InstanceId": "i-1"}), ec2_slice("us-west-2", {"InstanceId": "i-2"})]
+    )
+    second = record(store, [ec2_slice("us-east-1", {"InstanceId": "i-1"})], failed=[("1", "us-west-2", "ec2")])
+    assert list(store.diff(first, second)) == []
+
+    third = record(store, [ec2_slice("us-east-1")])
+    assert [run["id"] for run in store.runs()] == [third, second]
+    assert [change["change"] for change in store.diff(second, third)] == ["removed", "removed"]
+    assert store.latest("all", before=third) == second
+
+
+def test_changes_only_and_diff_command(tmp_path):
+    """Test --changes-only records each run and outputs only what changed, and `diff` compares the last two."""
+    config = {
+        "accounts": [{"account_id": "123456789012", "role_name": "TestRole"}],
+        "regions": ["us-east-1"],
+        "snapshots": {"path": str(tmp_path / "snapshots.db")},
+    }
+    plugin = MagicMock(filters=None, identity="InstanceId")
+    plugins = MagicMock()
+    plugins.names.return_value = ["ec2"]
+    plugins.__getitem__.return_value = MagicMock(plugin=plugin)
+    outputs = [tmp_path / f"changes-{index}.ndjson" for index in range(2)]
+
+    with (
+        patch("cloudylist.main.load_config", return_value=config),
+        patch("cloudylist.main.load_plugins", return_value=plugins),
+        patch("cloudylist.utils.assume_role", return_value={"AccessKeyId": "key"}),
+        patch("cloudylist.utils.get_boto3_client"),
+    ):
+        plugin.return_value = [{"InstanceId": "i-1"}]
+        show_inventory(config_file="config.yml", format="ndjson", output=str(outputs[0]), changes_only=True)
+        plugin.return_value = [{"InstanceId": "i-1"}, {"InstanceId": "i-2"}]
+        show_inventory(config_file="config.yml", format="ndjson", output=str(outputs[1]), changes_only=True)
+        diff(config_file="config.yml", format="json", output=str(tmp_path / "diff.json"))
+
+    first = [json.loads(line) for line in outputs[0].read_text().splitlines()]
+    second = [json.loads(line) for line in outputs[1].read_text().splitlines()]
+    assert [(change["change"], change["id"]) for change in first] == [("added", "i-1")]
+    assert [(change["change"], change["id"]) for change in second] == [("added", "i-2")]
+    assert json.loads((tmp_path / "diff.json").read_text()) == second
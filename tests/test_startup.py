@@ -0,0 +1,36 @@
+import json
+import os
+import subprocess
+import sys
+
+# Seconds `import cloudylist.main` may take in a fresh interpreter; override on slow machines
+STARTUP_BUDGET = float(os.environ.get("CLOUDYLIST_STARTUP_BUDGET", "0.5"))
+HEAVY_MODULES = ["boto3", "botocore", "rich", "stevedore", "yaml", "pyarrow"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import cloudylist.main
+elapsed = time.perf_counter() - start
+loaded = sorted({name.split(".")[0] for name in sys.modules} & set(json.loads(sys.argv[1])))
+print(json.dumps({"elapsed": elapsed, "loaded": loaded}))
+"""
+
+
+def probe_startup():
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE, json.dumps(HEAVY_MODULES)], capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout)
+
+
+def test_cli_import_defers_heavy_modules():
+    """Test importing the CLI doesn't import boto3, rich, yaml, stevedore or pyarrow."""
+    assert probe_startup()["loaded"] == []
+
+
+def test_cli_import_within_budget():
+    """Test a cold import of the CLI stays within the startup budget."""
+    # Take the best of a few runs so one slow interpreter start doesn't fail the suite
+    elapsed = min(probe_startup()["elapsed"] for _ in range(3))
+    assert elapsed < STARTUP_BUDGET, f"cloudylist.main took {elapsed:.3f}s to import (budget {STARTUP_BUDGET}s)"
@@ -0,0 +1,52 @@
+import pytest
+from unittest.mock import MagicMock, patch
+from cloudylist.main import show_inventory
+from cloudylist.summary import InventorySummary, parse_groups
+from cloudylist.tracking import DONE, FAILED
+
+
+def item(account, region, service, count):
+    return {"account": account, "region": region, "service": service, "resources": [{}] * count}
+
+
+def test_parse_groups():
+    """Test summary groups are parsed from a comma-separated list and unknown groups rejected."""
+    assert parse_groups("service, top") == ("service", "top")
+    assert parse_groups("") == ("account", "service", "top")
+    with pytest.raises(ValueError):
+        parse_groups("account,colour")
+
+
+def test_summary_groups_and_top_slices():
+    """Test counts per group, the largest slices and task progress are kept as slices arrive."""
+    summary = InventorySummary(top=2)
+    summary.start({}, [("1", "us-east-1", "ec2"), ("1", "us-west-2", "ec2"), ("2", "us-east-1", "ec2")])
+    for account, region, count in (("1", "us-east-1", 3), ("1", "us-west-2", 1), ("2", "us-east-1", 5)):
+        summary.add(item(account, region, "ec2", count))
+    summary.finished(("1", "us-east-1", "ec2"), DONE)
+    summary.finished(("1", "us-west-2", "ec2"), FAILED)
+
+    assert summary.rows("account") == ([("2", 1, 5), ("1", 2, 4)], 0)
+    assert summary.rows("region") == ([("us-east-1", 2, 8), ("us-west-2", 1, 1)], 0)
+    assert summary.rows("top") == ([("2/us-east-1/ec2", 1, 5), ("1/us-east-1/ec2", 1, 3)], 1)
+    assert summary.progress() == {"planned": 3, "done": 1, "failed": 1, "skipped": 0, "pending": 1}
+
+
+def test_show_inventory_table_summaries(capsys):
+    """Test the table format prints one bounded summary per group instead of a row per slice."""
+    mock_config = {"accounts": [{"account_id": "123456789012", "role_name": "TestRole"}], "regions": ["us-east-1"]}
+    inventory = [item(f"{index:012d}", "us-east-1", "ec2", index) for index in range(1, 31)]
+
+    with (
+        patch("cloudylist.main.load_config", return_value=mock_config),
+        patch("cloudylist.main.load_plugins", return_value=MagicMock()),
+        patch("cloudylist.main.iter_inventory", return_value=iter(inventory)),
+        patch("cloudylist.main._is_terminal", return_value=False),
+    ):
+        show_inventory(config_file="config.yml", format="table", group_by="account,top", top=5)
+
+    out = capsys.readouterr().out
+    assert "Resources by account" in out and "Largest 5 slices" in out
+    assert "000000000030" in out and "000000000001" not in out
+    assert "25 more not shown" in out
+    assert "465" in out
@@ -0,0 +1,91 @@
+from botocore.exceptions import ClientError
+from botocore.hooks import HierarchicalEmitter
+from unittest.mock import MagicMock, patch
+from cloudylist.throttle import RequestScheduler, TokenBucket, is_throttling_error
+from cloudylist.utils import collect_inventory
+
+
+def throttling_error(code="Throttling"):
+    return ClientError(error_response={"Error": {"Code": code, "Message": "Rate exceeded"}}, operation_name="Describe")
+
+
+def test_is_throttling_error():
+    """Test throttling error codes are recognised and other errors are not."""
+    assert is_throttling_error(throttling_error("RequestLimitExceeded"))
+    assert not is_throttling_error(throttling_error("AccessDenied"))
+    assert not is_throttling_error(Exception("Throttling"))
+
+
+def test_token_bucket_adapts_rate():
+    """Test the bucket halves its rate when throttled and recovers on success."""
+    bucket = TokenBucket(rate=8.0, min_rate=1.0)
+    bucket.throttled()
+    bucket.throttled()
+    assert bucket.rate == 2.0
+    for _ in range(100):
+        bucket.succeeded()
+    assert bucket.rate == 8.0
+    for _ in range(10):
+        bucket.throttled()
+    assert bucket.rate == 1.0
+
+
+def test_token_bucket_paces_requests():
+    """Test requests beyond the burst wait for tokens."""
+    bucket = TokenBucket(rate=100.0, burst=1)
+    assert bucket.acquire() == 0.0
+    assert bucket.acquire() > 0.0
+
+
+def test_retry_delay_respects_budget():
+    """Test retries stop once the shared retry budget is spent."""
+    scheduler = RequestScheduler({"retry_budget": 2, "max_attempts": 10, "base_delay": 0.01})
+    assert scheduler.retry_delay(throttling_error(), 0) is not None
+    assert scheduler.retry_delay(throttling_error(), 0) is not None
+    assert scheduler.retry_delay(throttling_error(), 0) is None
+
+
+def test_retry_delay_ignores_other_errors():
+    """Test non-throttling errors and exhausted attempts are not retried."""
+    scheduler = RequestScheduler({"max_attempts": 2})
+    assert scheduler.retry_delay(Exception("PluginError"), 0) is None
+    assert scheduler.retry_delay(throttling_error(), 1) is None
+
+
+def test_attach_counts_requests_and_throttles():
+    """Test the client hooks record each request and back off on throttling responses."""
+    scheduler = RequestScheduler({"rate": 50})
+    client = MagicMock()
+    client.meta.events = HierarchicalEmitter()
+    scheduler.attach(client, "123456789012", "ec2", "us-east-1")
+
+    client.meta.events.emit("before-send.ec2.DescribeInstances", request=None)
+    client.meta.events.emit(
+        "needs-retry.ec2.DescribeInstances", response=(None, {"Error": {"Code": "RequestLimitExceeded"}}), attempts=1
+    )
+
+    assert scheduler.stats()["requests"] == 1
+    assert scheduler.stats()["throttled"] == 1
+    assert scheduler.bucket("123456789012", "ec2", "us-east-1").rate == 25
+
+
+def test_collect_inventory_retries_throttled_plugin():
+    """Test a throttled plugin call is retried instead of dropping the slice."""
+    mock_config = {
+        "accounts": [{"account_id": "123456789012", "role_name": "TestRole"}],
+        "regions": ["us-east-1"],
+        "throttle": {"base_delay": 0.01},
+    }
+
+    mock_plugins = MagicMock()
+    mock_plugins.names.return_value = ["ec2"]
+    mock_plugins["ec2"].plugin.side_effect = [throttling_error(), [{"id": "resource-1"}]]
+
+    with (
+        patch("cloudylist.utils.assume_role", return_value={"AccessKeyId": "key"}),
+        patch("cloudylist.utils.get_boto3_client"),
+    ):
+        inventory = collect_inventory(mock_config, mock_plugins)
+
+    assert len(inventory) == 1
+    assert inventory[0]["resources"] == [{"id": "resource-1"}]
@@ -1,5 +1,7 @@
 import logging
-from cloudylist.utils import get_logger, collect_inventory, assume_role
+import time
+from cloudylist.utils import get_logger, collect_inventory, assume_role, iter_inventory
+from cloudylist.resources import GLOBAL, PARTITIONED, ResourceQuery, filters, scope
 from unittest.mock import patch, MagicMock
 
 
@@ -116,7 +118,7 @@ def test_assume_role_logger_on_client_error(mocker):
     from botocore.exceptions import ClientError
 
     # Mock boto3 STS client
-    mock_sts_client = mocker.patch("cloudylist.utils.boto3.client")
+    mock_sts_client = mocker.patch("boto3.client")
     mock_sts_client.return_value.assume_role.side_effect = ClientError(
         error_response={"Error": {"Code": "AccessDenied", "Message": "Access denied"}},
         operation_name="AssumeRole",
@@ -138,3 +140,148 @@ def test_assume_role_logger_on_client_error(mocker):
     mock_logger.assert_called_once_with(
         f"Failed to assume role {role_arn}: An error occurred (AccessDenied) when calling the AssumeRole operation: Access denied"
     )
+
+
+def test_collect_inventory_deterministic_order():
+    """Test results keep account, region, plugin order even when tasks finish out of order."""
+    mock_config = {
+        "accounts": [
+            {"account_id": "111111111111", "role_name": "TestRole"},
+            {"account_id": "222222222222", "role_name": "TestRole"},
+        ],
+        "regions": ["us-east-1", "us-west-2"],
+        "concurrency": {"max_workers": 8, "per_account": 2, "per_region": 3},
+    }
+
+    mock_plugins = MagicMock()
+    mock_plugins.names.return_value = ["ec2", "rds"]
+
+    def slow_first(client):
+        # Earlier tasks sleep longer so they finish last
+        time.sleep(client.delay)
+        return [{"id": client.delay}]
+
+    mock_plugins["ec2"].plugin.side_effect = slow_first
+    mock_plugins["rds"].plugin.side_effect = slow_first
+    delays = iter([0.08, 0.07, 0.06, 0.05, 0.04, 0.03, 0.02, 0.01])
+
+    with (
+        patch("cloudylist.utils.assume_role", return_value={"AccessKeyId": "key"}),
+        patch("cloudylist.utils.get_boto3_client", side_effect=lambda *args: MagicMock(delay=next(delays))),
+    ):
+        inventory = collect_inventory(mock_config, mock_plugins)
+
+    assert [(item["account"], item["region"], item["service"]) for item in inventory] == [
+        (account, region, service)
+        for account in ["111111111111", "222222222222"]
+        for region in ["us-east-1", "us-west-2"]
+        for service in ["ec2", "rds"]
+    ]
+
+
+def test_collect_inventory_consumes_generator_plugins():
+    """Test plugins that yield resources page by page are collected like list-returning ones."""
+    mock_config = {"accounts": [{"account_id": "123456789012", "role_name": "TestRole"}], "regions": ["us-east-1"]}
+
+    mock_plugins = MagicMock()
+    mock_plugins.names.return_value = ["ec2"]
+    mock_plugins["ec2"].plugin.side_effect = lambda client: (resource for resource in [{"id": "r-1"}, {"id": "r-2"}])
+
+    with (
+        patch("cloudylist.utils.assume_role", return_value={"AccessKeyId": "key"}),
+        patch("cloudylist.utils.get_boto3_client"),
+    ):
+        inventory = collect_inventory(mock_config, mock_plugins)
+
+    assert inventory[0]["resources"] == [{"id": "r-1"}, {"id": "r-2"}]
+
+
+def test_collect_inventory_global_and_partitioned_plugins():
+    """Test account-wide plugins run once per account and partitioned ones are split by region."""
+    mock_config = {
+        "accounts": [{"account_id": "123456789012", "role_name": "TestRole"}],
+        "regions": ["us-east-1", "us-west-2", "eu-west-1"],
+    }
+
+    @scope(GLOBAL)
+    def list_users(client):
+        return [{"UserName": "alice"}]
+
+    @scope(PARTITIONED, partition_key="Region")
+    def list_buckets(client):
+        return [{"Name": "b-1", "Region": "us-west-2"}, {"Name": "b-2", "Region": "eu-west-1"}, {"Name": "b-3"}]
+
+    mock_plugins = MagicMock()
+    mock_plugins.names.return_value = ["iam", "s3"]
+    extensions = {"iam": MagicMock(plugin=list_users), "s3": MagicMock(plugin=list_buckets)}
+    mock_plugins.__getitem__.side_effect = extensions.__getitem__
+
+    with (
+        patch("cloudylist.utils.assume_role", return_value={"AccessKeyId": "key"}),
+        patch("cloudylist.utils.get_boto3_client") as mock_get_client,
+    ):
+        inventory = collect_inventory(mock_config, mock_plugins)
+
+    assert mock_get_client.call_count == 2
+    assert [(item["region"], item["service"], len(item["resources"])) for item in inventory] == [
+        ("global", "iam", 1),
+        ("eu-west-1", "s3", 1),
+        ("global", "s3", 1),
+        ("us-west-2", "s3", 1),
+    ]
+
+
+def test_iter_inventory_applies_query():
+    """Test plugins that cannot filter are skipped, and partitioned resources keep the split field until split."""
+    mock_config = {"accounts": [{"account_id": "123456789012", "role_name": "TestRole"}], "regions": ["us-east-1"]}
+
+    @scope(PARTITIONED, partition_key="Region")
+    @filters()
+    def list_buckets(client, query):
+        return [query.project({"Name": "b-1", "Region": "us-west-2", "CreationDate": "2024-01-01"})]
+
+    @filters("state")
+    def list_instances(client, query):
+        return [{"InstanceId": "i-1", "State": "running"}] if query.matches("running") else []
+
+    mock_plugins = MagicMock()
+    mock_plugins.names.return_value = ["s3", "ec2"]
+    extensions = {"s3": MagicMock(plugin=list_buckets), "ec2": MagicMock(plugin=list_instances)}
+    mock_plugins.__getitem__.side_effect = extensions.__getitem__
+
+    with (
+        patch("cloudylist.utils.assume_role", return_value={"AccessKeyId": "key"}),
+        patch("cloudylist.utils.get_boto3_client"),
+    ):
+        projected = list(iter_inventory(mock_config, mock_plugins, query=ResourceQuery.parse(fields="Name")))
+        filtered = list(iter_inventory(mock_config, mock_plugins, query=ResourceQuery.parse(["running"])))
+
+    assert [(item["region"], item["resources"]) for item in projected] == [
+        ("us-west-2", [{"Name": "b-1"}]),
+        ("us-east-1", [{"InstanceId": "i-1", "State": "running"}]),
+    ]
+    assert [item["service"] for item in filtered] == ["ec2"]
+
+
+def test_iter_inventory_partitions_unfiltered_plugins_before_projecting():
+    """Test a partitioned plugin that takes no query keeps its split field until its resources are split."""
+    mock_config = {"accounts": [{"account_id": "123456789012", "role_name": "TestRole"}], "regions": ["us-east-1"]}
+
+    @scope(PARTITIONED, partition_key="Region")
+    def list_buckets(client):
+        return [{"Name": "b-1", "Region": "us-west-2"}, {"Name": "b-2", "Region": "eu-west-1"}]
+
+    mock_plugins = MagicMock()
+    mock_plugins.names.return_value = ["s3"]
+    mock_plugins.__getitem__.return_value = MagicMock(plugin=list_buckets)
+
+    with (
+        patch("cloudylist.utils.assume_role", return_value={"AccessKeyId": "key"}),
+        patch("cloudylist.utils.get_boto3_client"),
+    ):
+        projected = list(iter_inventory(mock_config, mock_plugins, query=ResourceQuery.parse(fields="Name")))
+
+    assert [(item["region"], item["resources"]) for item in projected] == [
+        ("eu-west-1", [{"Name": "b-2"}]),
+        ("us-west-2", [{"Name": "b-1"}]),
+    ]